@@ -0,0 +1,281 @@
+'''Harvests the DataONE catalog into a sharded Turtle graph of its datasets.
+
+Pages through the metadata documents of the CN Solr index (see d1solr.py)
+with a pool of worker threads and converts each document to the triples of
+one glbase:Dataset, in the shape of datasets.ttl, as soon as it is read.
+The triples are streamed to shards datasets-00001.ttl, datasets-00002.ttl,
+... of --shard-size datasets each, so memory stays flat however many
+datasets are harvested (stats.txt estimates 250k datasets, 11.5 million
+triples).
+
+Progress is checkpointed in datasets-harvest.json each time a shard is
+complete. An interrupted run resumes after the last complete shard, and a
+later run continues with the datasets uploaded since:
+
+    python3 create-d1-datasets-graph.py --outdir datasets
+    python3 create-d1-datasets-graph.py --outdir datasets --limit 5000   # at most 5000 more datasets
+    python3 create-d1-datasets-graph.py --outdir datasets --restart
+
+Creators are people URIs derived from the normalized name (same first and
+last name, same person), so they agree across shards and runs without any
+shared state; a person is described once per shard.
+'''
+import os
+import re
+import sys
+import json
+import uuid
+import argparse
+import urllib.parse
+from rdflib import URIRef, Literal, BNode, Namespace, RDF, RDFS
+from rdflib.namespace import FOAF, DCTERMS
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+import d1solr
+from geolink import serialize
+from geolink.metrics import Metrics
+
+
+glbase = Namespace('http://schema.geolink.org/dev/base/main#')
+doview = Namespace('http://schema.geolink.org/dev/doview#')
+datacite = Namespace('http://purl.org/spar/datacite/')
+prov = Namespace('http://www.w3.org/ns/prov#')
+d1node = Namespace('https://cn.dataone.org/cn/v1/node/')
+resolveuri = 'https://cn.dataone.org/cn/v1/resolve/'
+landingpage = 'https://search.dataone.org/#view/'
+personuri = 'http://data.geolink.org/id/dataone/'
+## names map to person URIs by uuid5 in this namespace
+personuuids = uuid.uuid5(uuid.NAMESPACE_URL, personuri)
+
+prefixes = {'rdf': RDF, 'rdfs': RDFS, 'foaf': FOAF, 'dcterms': DCTERMS, 'glbase': glbase,
+            'doview': doview, 'datacite': datacite, 'prov': prov, 'd1node': d1node}
+
+shardname = 'datasets-%05d.ttl'
+shardpattern = re.compile(r'^datasets-\d{5}\.ttl(\.tmp)?$')
+checkpointname = 'datasets-harvest.json'
+
+
+####### Conversion #######
+
+def datasetURI(identifier):
+    return URIRef(resolveuri + urllib.parse.quote(identifier, safe=":@!$&'()*+,;="))
+
+def personURI(name):
+    return URIRef(personuri + uuid.uuid5(personuuids, ' '.join(name.lower().split())).hex)
+
+def values(doc, field):
+    v = doc.get(field)
+    if v is None: return []
+    return [x for x in (v if isinstance(v, list) else [v]) if x]
+
+def first(doc, field):
+    v = values(doc, field)
+    return v[0] if v else None
+
+def geometry(doc):
+    '''WKT of the bounding box, a point if it has no extent. Coordinates are
+    latitude longitude, as in datasets.ttl.'''
+    try:
+        n, s, e, w = [float(first(doc, f + 'BoundCoord')) for f in ('north', 'south', 'east', 'west')]
+    except (TypeError, ValueError):
+        return None
+    if n == s and e == w:
+        return 'POINT (%r %r)' % (n, e)
+    return 'POLYGON ((%r %r, %r %r, %r %r, %r %r, %r %r))' % (n, w, n, e, s, e, s, w, n, w)
+
+def personTriples(person, name):
+    yield (person, RDF.type, glbase.Person)
+    yield (person, RDF.type, FOAF.Person)
+    yield (person, RDFS.label, Literal(name))
+    yield (person, FOAF.name, Literal(name))
+    yield (person, glbase.nameFull, Literal(name))
+
+def datasetTriples(doc, people):
+    '''Yields the triples of one index document: the dataset, its identifier
+    and, unless their URI is in `people` (to which it is added), its creators.'''
+    identifier = first(doc, 'identifier')
+    if identifier is None:
+        return
+    dataset = datasetURI(identifier)
+    title = first(doc, 'title')
+    creators = [(personURI(name), ' '.join(name.split())) for name in values(doc, 'origin')]
+    bn = BNode()
+
+    yield (dataset, RDF.type, glbase.Dataset)
+    if title:
+        yield (dataset, RDFS.label, Literal(title))
+        yield (dataset, glbase.title, Literal(title))
+    for abstract in values(doc, 'abstract'):
+        yield (dataset, glbase.description, Literal(abstract))
+    yield (dataset, glbase.hasIdentifier, bn)
+    for person, name in creators:
+        yield (dataset, glbase.hasCreator, person)
+    for person, name in creators:
+        yield (dataset, DCTERMS.creator, person)
+    yield (dataset, doview.hasLandingPage, Literal(landingpage + identifier))
+    for node in values(doc, 'authoritativeMN'):
+        yield (dataset, doview.hasAuthoritativeDigitalRepository, d1node[node])
+    for node in values(doc, 'datasource'):
+        yield (dataset, doview.hasOriginDigitalRepository, d1node[node])
+    for node in values(doc, 'replicaMN'):
+        yield (dataset, doview.hasReplicaDigitalRepository, d1node[node])
+    for date, prop in (('beginDate', doview.hasStartDate), ('endDate', doview.hasEndDate)):
+        if first(doc, date):
+            yield (dataset, prop, Literal(first(doc, date)))
+    wkt = geometry(doc)
+    if wkt:
+        yield (dataset, glbase.hasGeometryAsWktLiteral, Literal(wkt))
+    for older in values(doc, 'obsoletes'):
+        yield (dataset, prov.wasRevisionOf, datasetURI(older))
+
+    yield (bn, RDF.type, glbase.Identifier)
+    yield (bn, glbase.hasIdentifierValue, Literal(identifier))
+    yield (bn, glbase.hasIdentifierScheme, datacite['local-resource-identifier-scheme'])
+    yield (bn, RDFS.label, Literal(identifier))
+
+    for person, name in creators:
+        if person not in people:
+            people.add(person)
+            for t in personTriples(person, name):
+                yield t
+
+
+####### Shards and checkpoint #######
+
+class Shard(object):
+    '''Streams the triples of up to shardsize datasets to a shard, which
+    replaces any earlier file of that name on close().'''
+
+    def __init__(self, outdir, n):
+        self.path = os.path.join(outdir, shardname % n)
+        self.fout = open(self.path + '.tmp', 'w', encoding='utf-8')
+        self.out = serialize.TurtleWriter(self.fout, prefixes)
+        self.people = set()     # people described in this shard
+        self.datasets = 0
+
+    def add(self, doc):
+        for t in datasetTriples(doc, self.people):
+            self.out.add(t)
+        self.datasets += 1
+
+    def close(self):
+        self.out.close()
+        self.fout.close()
+        os.replace(self.path + '.tmp', self.path)
+
+    def abort(self):
+        self.fout.close()
+        os.remove(self.path + '.tmp')
+
+
+class SettingsChanged(Exception):
+    '''The checkpoint was written by a harvest with other settings.'''
+
+def loadCheckpoint(outdir):
+    path = os.path.join(outdir, checkpointname)
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def saveCheckpoint(outdir, state):
+    path = os.path.join(outdir, checkpointname)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def removeShards(outdir, temporaryOnly=False):
+    for name in os.listdir(outdir):
+        m = shardpattern.match(name)
+        if m and (m.group(1) or not temporaryOnly):
+            os.remove(os.path.join(outdir, name))
+
+
+def run(outdir='.', uri=d1solr.baseuri, rows=1000, workers=4, shardsize=10000, limit=None,
+        restart=False, metricspath=None, retries=d1solr.retries, backoff=d1solr.backoff):
+    '''Harvests the datasets after the checkpoint in outdir (all of them if
+    there is none, or with restart) into new shards, at most `limit` of them.
+    A page that still fails after `retries` retries stops the run, which
+    the next one resumes. Returns the checkpoint state.'''
+    metrics = Metrics('create-d1-datasets-graph')
+    os.makedirs(outdir, exist_ok=True)
+    settings = {'uri': uri, 'query': d1solr.query, 'sort': d1solr.sort, 'shardsize': shardsize}
+    state = None if restart else loadCheckpoint(outdir)
+    if state is not None and state['settings'] != settings:
+        raise SettingsChanged('%s was written with other settings %r; harvest with --restart'
+                         % (os.path.join(outdir, checkpointname), state['settings']))
+    if state is None:
+        removeShards(outdir)
+        state = {'settings': settings, 'next': 0, 'shards': 0, 'datasets': 0}
+    else:
+        ## a shard that was being written when the last run stopped
+        removeShards(outdir, temporaryOnly=True)
+    print('Harvesting from dataset %d (%d datasets in %d shards so far)'
+          % (state['next'], state['datasets'], state['shards']))
+
+    def commit(shard, nextoffset):
+        with metrics.stage('serialize') as st:
+            shard.close()
+            st.wrote(shard.path)
+            st.triples_out += shard.out.count
+        state['shards'] += 1
+        state['datasets'] += shard.datasets
+        state['next'] = nextoffset
+        saveCheckpoint(outdir, state)
+        print('Saved %s with %d datasets (%d so far)' % (shard.path, shard.datasets, state['datasets']))
+
+    meta = {}
+    shard = None
+    harvested = 0
+    try:
+        pages = d1solr.pages(uri, state['next'], rows, workers, meta=meta, retries=retries, backoff=backoff)
+        for start, docs in metrics.timed('fetch', pages):
+            if limit is not None:
+                docs = docs[:limit - harvested]
+            with metrics.stage('transform'):
+                for i, doc in enumerate(docs):
+                    if shard is None:
+                        shard = Shard(outdir, state['shards'] + 1)
+                    shard.add(doc)
+                    if shard.datasets == shardsize:
+                        commit(shard, start + i + 1)
+                        shard = None
+            harvested += len(docs)
+            if limit is not None and harvested >= limit:
+                break
+        if shard is not None:
+            commit(shard, start + len(docs))
+            shard = None
+    finally:
+        if shard is not None:
+            shard.abort()
+    state['numFound'] = meta.get('numFound')
+    saveCheckpoint(outdir, state)
+    print('Harvested %d datasets; %d of %s in %d shards'
+          % (harvested, state['datasets'], state['numFound'], state['shards']))
+    if metricspath:
+        metrics.info['datasets'] = harvested
+        metrics.info['numFound'] = state['numFound']
+        metrics.save(metricspath)
+    return state
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Harvests the DataONE catalog into sharded Turtle files of its datasets.')
+    parser.add_argument('--outdir', default='.', help='directory of the shards and the checkpoint')
+    parser.add_argument('--baseuri', default=d1solr.baseuri, help='Solr query endpoint to page through')
+    parser.add_argument('--rows', type=int, default=1000, help='index documents per request')
+    parser.add_argument('--workers', type=int, default=4, help='maximum number of concurrent requests')
+    parser.add_argument('--shard-size', dest='shardsize', type=int, default=10000, metavar='DATASETS',
+                        help='datasets per shard')
+    parser.add_argument('--limit', type=int, default=None, help='harvest at most this many datasets in this run')
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and harvest from the start')
+    parser.add_argument('--metrics', dest='metricspath', metavar='PATH',
+                        help='save per-stage timings, memory and sizes of the run as JSON to PATH')
+    args = parser.parse_args()
+    if args.rows < 1 or args.shardsize < 1 or args.workers < 1:
+        parser.error('--rows, --shard-size and --workers must be positive')
+    try:
+        run(args.outdir, args.baseuri, args.rows, args.workers, args.shardsize, args.limit, args.restart,
+            args.metricspath)
+    except SettingsChanged as e:
+        sys.exit(str(e))
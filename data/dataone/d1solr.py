@@ -0,0 +1,103 @@
+'''Paginated, concurrent reader of the DataONE CN Solr index.
+
+The CN answers /cn/v1/query/solr/?q=...&fl=...&start=M&rows=N with an XML
+document (see dataone-example.xml) holding the page of index documents
+under <result numFound="..."> as <doc> elements, one field per child: <str>,
+<date>, <float>, ... for single values and <arr> for lists. Pages are
+requested through a bounded pool of worker threads, each response is parsed
+incrementally from the socket with iterparse (a <doc> is cleared as soon as
+it has been read), and the documents are yielded in index order, so at most
+workers * rows documents are held in memory.
+
+A request that fails with 429 (too many requests), a 5xx status or a
+dropped connection is retried up to `retries` times with exponential
+backoff (see geolink/retry.py), so that one transient error does not stop
+a harvest of the whole catalog.
+
+Paging by offset needs an order that does not change while harvesting:
+sorting by upload date puts datasets uploaded meanwhile at the end, where a
+later run picks them up.
+'''
+import itertools
+import collections
+import urllib.request as req
+import urllib.parse
+import xml.etree.ElementTree as ET
+import concurrent.futures
+
+from geolink import retry
+
+
+baseuri = 'https://cn.dataone.org/cn/v1/query/solr/'
+query = 'formatType:METADATA'
+sort = 'dateUploaded asc,identifier asc'
+retries = retry.retries
+backoff = retry.backoff
+fields = ['identifier', 'title', 'abstract', 'origin', 'datasource', 'authoritativeMN', 'replicaMN',
+          'beginDate', 'endDate', 'northBoundCoord', 'southBoundCoord', 'eastBoundCoord', 'westBoundCoord',
+          'obsoletes', 'rightsHolder']
+
+
+def field_value(node):
+    if node.tag == 'arr':
+        return [child.text or '' for child in node]
+    return node.text or ''
+
+def iter_docs(stream, meta=None):
+    '''Yields each <doc> of a Solr XML response read from a binary stream as
+    a dict field name -> value (a list for <arr> fields). The attributes of
+    <result> (numFound, start) are stored in the dict `meta` if given.'''
+    root = None
+    for event, node in ET.iterparse(stream, events=('start', 'end')):
+        if root is None:
+            root = node
+        elif event == 'start' and node.tag == 'result' and meta is not None:
+            meta.update(node.attrib)
+        elif event == 'end' and node.tag == 'doc':
+            yield dict((child.get('name'), field_value(child)) for child in node)
+            node.clear()
+            root.clear()
+
+
+def page_uri(uri, start, rows, q=query, fl=fields, order=sort):
+    return uri + '?' + urllib.parse.urlencode({'q': q, 'fl': ','.join(fl), 'sort': order,
+                                               'start': start, 'rows': rows})
+
+def fetch_page(uri, start, rows, timeout=60, retries=retries, backoff=backoff, **params):
+    '''Fetches one page, retrying transient errors; returns (meta dict, list of docs).'''
+    def request():
+        meta = {}
+        with req.urlopen(page_uri(uri, start, rows, **params), timeout=timeout) as response:
+            docs = list(iter_docs(response, meta))
+        return meta, docs
+    return retry.call(request, retries, backoff)
+
+
+def pages(uri=baseuri, start=0, rows=1000, workers=4, timeout=60, meta=None, retries=retries, backoff=backoff,
+          **params):
+    '''Yields (start, docs) for each page of the index from offset `start`
+    on, in order, with at most `workers` requests in flight. The number of
+    documents found is stored in meta['numFound'] if a dict is given.'''
+    fetch = lambda offset: fetch_page(uri, offset, rows, timeout, retries, backoff, **params)
+    first, docs = fetch(start)
+    total = int(first.get('numFound', 0))
+    if meta is not None:
+        meta['numFound'] = total
+    yield start, docs
+    if 0 < len(docs) < min(rows, total - start):
+        ## the server caps the page size below what was asked for
+        rows = len(docs)
+    if not docs:
+        return
+    offsets = iter(range(start + len(docs), total, rows))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        ## keep at most `workers` pages in flight and consume them in order
+        pending = collections.deque((offset, pool.submit(fetch, offset))
+                                    for offset in itertools.islice(offsets, workers))
+        while pending:
+            offset, future = pending.popleft()
+            _, docs = future.result()
+            nextoffset = next(offsets, None)
+            if nextoffset is not None:
+                pending.append((nextoffset, pool.submit(fetch, nextoffset)))
+            yield offset, docs
@@ -16,9 +16,45 @@
     All URIs are on the base:
 
         http://schema.geolink.org/dev/voc/dataone/format#
+
+    Minted URIs are kept in formats-registry.db (SQLite, see
+    geolink/registry.py), so concurrent runs never mint conflicting URIs and
+    a crash cannot lose one. formats.csv is its readable export, and the
+    registry is created from it on first use.
+
+    The formats list rarely changes. The last response is kept in
+    formats-response.xml with its ETag and Last-Modified validators, so the
+    CN can answer "not modified" and the graph is then left as it is; use
+    --force to fetch and rebuild anyway.
+
+    The graph is built through a sink: by default a Redland model that is
+    serialized to formats.ttl and formats.xml at the end, or, with --output
+    ntriples or turtle, a file the statements are streamed to as they are
+    made (formats.nt or formats.ttl), which needs neither Redland nor memory
+    for the whole graph.
+
+    With --metrics PATH, the time, memory and sizes of the fetch, parse,
+    transform and serialize stages are saved as JSON (see geolink/metrics.py).
 """
 
 
+formats_url = "https://cn.dataone.org/cn/v1/formats"
+
+# The last formats list fetched and its HTTP validators
+response_path = "formats-response.xml"
+validators_path = "formats-response.json"
+
+# The registry of minted format URIs, and its export kept in the repository
+registry_path = "formats-registry.db"
+csv_path = "formats.csv"
+csv_fields = ['idx', 'id', 'type', 'name', 'uri']
+
+# The graph files each --output writes
+output_files = { 'redland': ["formats.ttl", "formats.xml"],
+                 'ntriples': ["formats.nt"],
+                 'turtle': ["formats.ttl"] }
+
+
 def createModel():
     """Creates an RDF Model to add triples to."""
 
@@ -48,102 +84,365 @@ def serializeModel(model, ns, filename, format):
     serializer.serialize_model_to_file(filename, model)
 
 
-def addStatement(model, s, p, o):
-    """Utility function to make adding RDF statements to the Model easier."""
+class RedlandSink(object):
+    """Adds statements to a Redland model in batches of `batchsize`, and
+    serializes the model to each (filename, format) of outputs on close()."""
 
-    # Assume subject is a URI string if it is not an RDF.Node
-    if (type(s) is not RDF.Node):
-        s_node = RDF.Uri(s)
-    else:
-        s_node = s
+    def __init__(self, model, ns, outputs, batchsize=1000):
+        self.model = model
+        self.ns = ns
+        self.outputs = outputs
+        self.batchsize = batchsize
+        self.batch = []
+        self.count = 0
+        self.paths = [filename for filename, format in outputs]
 
-    # Assume predicate is a URI string if it is not an RDF.Node
-    if (type(p) is not RDF.Node):
-        p_node = RDF.Uri(p)
-    else:
-        p_node = p
+    def uri(self, uri):
+        return RDF.Node(uri_string=uri)
 
-    # Assume object is a literal if it is not an RDF.Node
-    if (type(o) is not RDF.Node):
-        o_node = RDF.Node(o)
-    else:
-        o_node = o
-    statement=RDF.Statement(s_node, p_node, o_node)
+    def blank(self, id):
+        return RDF.Node(blank=id)
 
-    if statement is None:
-        raise Exception("new RDF.Statement failed")
+    def literal(self, text):
+        return RDF.Node(literal=text)
 
-    model.add_statement(statement)
+    def add(self, s, p, o):
+        self.batch.append(RDF.Statement(s, p, o))
+        if len(self.batch) >= self.batchsize:
+            self.flush()
+
+    def flush(self):
+        add_statement = self.model.add_statement
+        for statement in self.batch:
+            add_statement(statement)
+        self.count += len(self.batch)
+        self.batch = []
+
+    def close(self):
+        self.flush()
+        for filename, format in self.outputs:
+            serializeModel(self.model, self.ns, filename, format)
 
 
-def getFormats():
-    """Gets the formats list from the DataOne CN.
+def tempFile(path):
+    """Creates a new temporary file next to path, to be moved over it with
+    replaceFile() once complete, so that concurrent runs never write to the
+    same file. Returns its descriptor and path."""
 
-    Returns a Dict index by format id
-        Each element containing the ID, type, and name of the format.
+    return tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=os.path.dirname(path) or ".")
+
+def replaceFile(tmp, path):
+    """Moves a file made by tempFile() to path, with the permissions of a new file."""
+
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(tmp, 0o666 & ~umask)
+    os.rename(tmp, path)
+
+
+def escapeLiteral(text):
+    return text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class NTriplesSink(object):
+    """Streams statements to an N-Triples file, writing `batchsize` lines at
+    a time. Nodes are strings in N-Triples syntax, so the file needs no
+    Redland; blank node ids are replaced by short labels."""
+
+    def __init__(self, filename, batchsize=1000):
+        self.filename = filename
+        self.paths = [filename]
+        self.batchsize = batchsize
+        self.batch = []
+        self.blanks = {}
+        self.count = 0
+        fd, self.tmp = tempFile(filename)
+        self.f = os.fdopen(fd, "wb")
+
+    def uri(self, uri):
+        return "<%s>" % uri
+
+    def blank(self, id):
+        if id not in self.blanks:
+            self.blanks[id] = "_:b%d" % (len(self.blanks) + 1)
+        return self.blanks[id]
+
+    def literal(self, text):
+        return '"%s"' % escapeLiteral(text)
+
+    def line(self, s, p, o):
+        return "%s %s %s .\n" % (s, p, o)
+
+    def add(self, s, p, o):
+        line = self.line(s, p, o)
+        self.batch.append(line.encode("utf-8") if isinstance(line, unicode) else line)
+        if len(self.batch) >= self.batchsize:
+            self.flush()
+
+    def flush(self):
+        self.f.writelines(self.batch)
+        self.count += len(self.batch)
+        self.batch = []
+
+    def close(self):
+        self.flush()
+        self.f.close()
+        replaceFile(self.tmp, self.filename)
+
+
+class TurtleSink(NTriplesSink):
+    """Like NTriplesSink, but writes Turtle: URIs in the namespaces of ns are
+    abbreviated, and consecutive statements about one subject are grouped."""
+
+    localname = r"^[A-Za-z_][A-Za-z0-9_-]*$"
+
+    def __init__(self, filename, ns, batchsize=1000):
+        NTriplesSink.__init__(self, filename, batchsize)
+        self.ns = sorted(ns.items(), key=lambda item: -len(item[1]))
+        self.subject = None
+        for prefix in sorted(ns):
+            self.f.write("@prefix %s: <%s> .\n" % (prefix, ns[prefix]))
+
+    def uri(self, uri):
+        for prefix, base in self.ns:
+            if uri.startswith(base) and re.match(self.localname, uri[len(base):]):
+                return "%s:%s" % (prefix, uri[len(base):])
+        return "<%s>" % uri
+
+    def line(self, s, p, o):
+        if s == self.subject:
+            line = " ;\n    %s %s" % (p, o)
+        else:
+            line = "%s\n%s %s %s" % (" .\n" if self.subject else "", s, p, o)
+        self.subject = s
+        return line
+
+    def close(self):
+        if self.subject:
+            self.batch.append(" .\n")
+            self.count -= 1
+        NTriplesSink.close(self)
+
+
+def openSink(output, ns, batchsize):
+    """The sink for --output, writing the files of output_files[output]."""
+
+    files = output_files[output]
+
+    if output == "ntriples":
+        return NTriplesSink(files[0], batchsize)
+    if output == "turtle":
+        return TurtleSink(files[0], ns, batchsize)
+    return RedlandSink(createModel(), ns, zip(files, ["turtle", "rdfxml"]), batchsize)
+
+
+def compileVocabulary(sink, ns):
+    """The nodes of the constant predicates and classes of the formats graph,
+    made once by the sink instead of once per statement."""
+
+    return {
+        "type": sink.uri(ns["rdf"] + "type"),
+        "label": sink.uri(ns["rdfs"] + "label"),
+        "Format": sink.uri(ns["ecglvoc_format"] + "Format"),
+        "Identifier": sink.uri(ns["glbase"] + "Identifier"),
+        "description": sink.uri(ns["glbase"] + "description"),
+        "formatType": sink.uri(ns["glbase"] + "formatType"),
+        "hasIdentifier": sink.uri(ns["glbase"] + "hasIdentifier"),
+        "hasIdentifierValue": sink.uri(ns["glbase"] + "hasIdentifierValue"),
+        "hasIdentifierScheme": sink.uri(ns["glbase"] + "hasIdentifierScheme"),
+        "localScheme": sink.uri(ns["datacite"] + "local-resource-identifier-scheme")
+    }
+
+
+def openRegistry(base):
+    """Opens the registry of minted format URIs. A new registry is filled
+    from formats.csv, the record of the URIs minted before it existed. The
+    import is one transaction that first checks the registry is still
+    empty, so of two runs on a new registry one imports and the other
+    uses its import."""
+
+    registry = Registry(registry_path, base, width=3)
+
+    if registry.counter == 0 and os.path.isfile(csv_path):
+        with open(csv_path, "rU") as f:
+            rows = list(csv.DictReader(f))
+
+        counter = max([int(row['idx']) for row in rows] or [0])
+
+        if registry.load([dict([(k, v) for k, v in row.items() if k != 'id'], key=row['id']) for row in rows],
+                         meta={"csv_counter": counter}):
+            print "Imported %d minted formats from %s." % (len(rows), csv_path)
+
+    return registry
+
+
+def syncCsv(registry):
+    """Rewrites formats.csv from the registry if URIs were minted since it
+    was last written (also after a run that stopped before writing it)."""
+
+    if os.path.isfile(csv_path) and registry.meta("csv_counter") == str(registry.counter):
+        return
+
+    fd, tmp = tempFile(csv_path)
+
+    with os.fdopen(fd, "w") as f:
+        writer = csv.DictWriter(f, fieldnames=csv_fields)
+        writer.writeheader()
+
+        for record in registry.records():
+            row = dict(record, id=record['key'])
+            writer.writerow(dict((k, row[k].encode("utf-8") if isinstance(row[k], unicode) else row[k]) for k in csv_fields))
+
+    replaceFile(tmp, csv_path)
+    registry.set_meta("csv_counter", registry.counter)
+
+
+def fetchFormats(url, metrics, force=False):
+    """Downloads the formats list to formats-response.xml, unless the copy
+    there is still current: the ETag and Last-Modified validators of the last
+    response (kept in formats-response.json) are sent with the request, and
+    the CN answers 304 Not Modified if the list has not changed since.
+
+    Returns the validators of the new response if the list was downloaded,
+    False if it was not modified and None if it could not be fetched. The
+    new validators are only saved, by saveValidators(), once the graph has
+    been rebuilt from the list: if the rebuild fails, the next run sends the
+    old ones and gets the list again instead of a 304.
     """
 
+    validators = {}
+
+    if not force and os.path.isfile(response_path) and os.path.isfile(validators_path):
+        with open(validators_path) as f:
+            validators = json.load(f)
+
+        if validators.get("url") != url:
+            validators = {}
+
+    request = urllib2.Request(url)
+
+    if validators.get("etag"):
+        request.add_header("If-None-Match", validators["etag"])
+    if validators.get("last_modified"):
+        request.add_header("If-Modified-Since", validators["last_modified"])
+
     try:
-        req = urllib2.urlopen("https://cn.dataone.org/cn/v1/formats")
-    except:
+        response = urllib2.urlopen(request)
+    except urllib2.HTTPError as e:
+        if e.code == 304:
+            return False
+        print "Failed to open formats URL (HTTP %d). Exiting." % e.code
+        return
+    except Exception:
         print "Failed to open formats URL. Exiting."
         return
 
-    content = req.read()
-    xmldoc = ET.fromstring(content)
-    format_nodes = xmldoc.findall(".//objectFormat")
+    # Stream the body to disk; the last response is only replaced once complete
+    size = 0
+    fd, tmp = tempFile(response_path)
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter(lambda: response.read(1 << 16), ""):
+                f.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(tmp)
+        raise
+
+    replaceFile(tmp, response_path)
+
+    headers = response.info()
+
+    metrics.info['bytes_fetched'] = size
+    return { 'url': url,
+             'etag': headers.getheader("ETag"),
+             'last_modified': headers.getheader("Last-Modified") }
+
+
+def saveValidators(validators):
+    """Saves the validators of the formats list the graph was built from."""
+
+    fd, tmp = tempFile(validators_path)
+
+    with os.fdopen(fd, "w") as f:
+        json.dump(validators, f, indent=1)
+
+    replaceFile(tmp, validators_path)
+
+
+def parseFormats(path):
+    """Reads the formats list saved by fetchFormats().
+
+    Returns a Dict index by format id
+        Each element containing the ID, type, and name of the format.
+
+    The document is read with iterparse, and each objectFormat element is
+    dropped from the tree as soon as it has been read.
+    """
 
     formats = {}
+    root = None
 
-    for format_node in format_nodes:
-        format_id = format_node.find("./formatId").text
-        format_name = format_node.find("./formatName").text
-        format_type = format_node.find("./formatType").text
+    for event, node in ET.iterparse(path, events=("start", "end")):
+        if root is None:
+            root = node
+        elif event == "end" and node.tag == "objectFormat":
+            format_id = node.findtext("./formatId")
 
-        formats[format_id] = { 'id': format_id,
-                                'name': format_name,
-                                'type': format_type }
+            formats[format_id] = { 'id': format_id,
+                                    'name': node.findtext("./formatName"),
+                                    'type': node.findtext("./formatType") }
+            node.clear()
+            root.clear()
 
     return formats
 
 
-def createGraph(model, formats, ns):
-    """Adds formats to the RDF model"""
+def createGraph(sink, formats, vocab):
+    """Adds formats to the sink, using the nodes of compileVocabulary()."""
+
+    add = sink.add
 
     for fmt in formats:
         # Create this format's URI node
-        format_uri_node = RDF.Uri(formats[fmt]['uri'])
+        format_node = sink.uri(formats[fmt]['uri'])
+
+        # Name and Type, if the list gives them
+        add(format_node, vocab["type"], vocab["Format"])
 
-        # Name and Type
-        addStatement(model, formats[fmt]['uri'], RDF.Uri(ns["rdf"] + "type"), RDF.Uri(ns["ecglvoc_format"] + "Format"))
-        addStatement(model, formats[fmt]['uri'], RDF.Uri(ns["glbase"] + "description"), formats[fmt]['name'])
-        addStatement(model, formats[fmt]['uri'], RDF.Uri(ns["glbase"] + "formatType"), formats[fmt]['type'])
+        if formats[fmt]['name'] is not None:
+            add(format_node, vocab["description"], sink.literal(formats[fmt]['name']))
+        if formats[fmt]['type'] is not None:
+            add(format_node, vocab["formatType"], sink.literal(formats[fmt]['type']))
 
         # Identifier node
-        id_blank_node = RDF.Node(blank=formats[fmt]['uri'])
+        id_blank_node = sink.blank(formats[fmt]['uri'])
+        id_literal = sink.literal(fmt)
 
-        addStatement(model, id_blank_node, RDF.Uri(ns["rdf"]+"type"), RDF.Uri(ns["glbase"]+"Identifier"))
-        addStatement(model, id_blank_node, ns["glbase"]+"hasIdentifierValue", fmt)
-        addStatement(model, id_blank_node, ns["glbase"]+"hasIdentifierScheme", RDF.Uri(ns["datacite"] + "local-resource-identifier-scheme"))
-        addStatement(model, id_blank_node, ns["rdfs"]+"label", fmt)
+        add(id_blank_node, vocab["type"], vocab["Identifier"])
+        add(id_blank_node, vocab["hasIdentifierValue"], id_literal)
+        add(id_blank_node, vocab["hasIdentifierScheme"], vocab["localScheme"])
+        add(id_blank_node, vocab["label"], id_literal)
 
-        addStatement(model, formats[fmt]['uri'], RDF.Uri(ns["glbase"] + "hasIdentifier"), id_blank_node)
+        add(format_node, vocab["hasIdentifier"], id_blank_node)
 
 
-def main():
+def main(metricspath=None, output="redland", batchsize=1000, url=formats_url, force=False):
     """This method updates the DataOne formats in a few steps:
 
-        1. Load existing formats from disk
-        2. Check the official formats list on DataOne
-        3. Mint new URIs for formats on DataOne that are not already on disk
-        4. Serialize a TTL and RDF/XML graph to disk
-        5. Save the updated list of formats
+        1. Open the registry of minted format URIs
+        2. Check the official formats list on DataOne (and stop if it has
+           not changed since the last run and the graph files exist)
+        3. Mint new URIs for formats on DataOne that are not in the registry
+        4. Serialize the graph to disk (TTL and RDF/XML, or as streamed by --output)
+        5. Export the registry to formats.csv if it has changed
+        6. Save the validators of the formats list the graph was built from
     """
 
+    metrics = Metrics("create-d1-formats-graph")
 
     # Setup
-    model = createModel()
-
     ns = {
         "owl": "http://www.w3.org/2002/07/owl#",
         "xsd": "http://www.w3.org/2001/XMLSchema#",
@@ -155,87 +454,100 @@ def main():
     }
 
 
-    # Load in existing formats
-    formats = {}
+    # Open the registry of minted format URIs
+    registry = openRegistry(ns['ecglvoc_format'])
 
-    if os.path.isfile("formats.csv"):
-        print "Loading existing formats from disk..."
-
-        with open("formats.csv", "rU") as f:
-            reader = csv.DictReader(f)
-
-            for row in reader:
-                formats[row['id']] = { 'idx': row['idx'],
-                                              'id': row['id'],
-                                              'type':row['type'],
-                                              'name': row['name'],
-                                              'uri': row['uri'] }
-
-        print "  Loaded %d formats from disk." % len(formats)
+    print "  %d formats minted so far." % registry.counter
 
 
     # Get DataOne formats
     print "Querying DataOne for the formats list..."
 
-    format_list = getFormats()
+    with metrics.stage("fetch"):
+        fetched = fetchFormats(url, metrics, force)
 
-    print "  Found %d formats on DataOne." % len(format_list)
+    if fetched is None:
+        return
 
+    if fetched is False:
+        print "  The formats list has not changed since the last run."
 
-    # Find the formats not on disk
-    new_formats = {}
+        if all(os.path.isfile(path) for path in output_files[output] + [csv_path]):
+            print "The graph is up to date."
+            syncCsv(registry)
 
-    for fmt in format_list:
-        if fmt not in formats:
-            new_formats[fmt] = format_list[fmt]
+            if metricspath:
+                metrics.info['not_modified'] = True
+                metrics.save(metricspath)
+            return
 
-    print "Found %d new format(s)." % len(new_formats)
+    with metrics.stage("parse"):
+        format_list = parseFormats(response_path)
 
+    print "  Found %d formats on DataOne." % len(format_list)
 
-    # Find the highest idx
-    highest_idx = 0
 
-    for fmt in formats:
-        if int(formats[fmt]['idx']) > highest_idx:
-            highest_idx = int(formats[fmt]['idx'])
+    # Mint URIs for the formats not in the registry, all in one transaction
+    new_formats = registry.mint_all((fmt, { 'type': format_list[fmt]['type'],
+                                            'name': format_list[fmt]['name'] }) for fmt in format_list)
 
-    for fmt in new_formats:
-        highest_idx += 1
-        # Mint the new URI
-        formats[fmt] = { 'idx': highest_idx,
-                                'id': fmt,
-                                'type': new_formats[fmt]['type'],
-                                'name': new_formats[fmt]['name'],
-                                'uri': ns['ecglvoc_format'] + str(highest_idx).rjust(3, "0") }
-        print "Added format %s." % formats[fmt]['uri']
+    print "Found %d new format(s)." % len(new_formats)
 
-    createGraph(model, formats, ns)
+    for record in new_formats:
+        print "Added format %s." % record['uri']
 
+    formats = dict((record['key'], record) for record in registry.records())
 
-    # Serialize graph to disk
-    serializeModel(model, ns, "formats.ttl", "turtle")
-    serializeModel(model, ns, "formats.xml", "rdfxml")
+    with metrics.stage("transform"):
+        sink = openSink(output, ns, batchsize)
+        createGraph(sink, formats, compileVocabulary(sink, ns))
 
 
-    # Write the CSV to file
-    if formats:
-        with open("formats.csv", "w") as f:
-            field_names = ['idx', 'id', 'type', 'name', 'uri']
-            writer = csv.DictWriter(f, fieldnames=field_names)
-            writer.writeheader()
+    # Serialize graph to disk (a streaming sink has written all but the last batch)
+    with metrics.stage("serialize") as st:
+        sink.close()
+        st.triples_in += sink.count
+        st.wrote(*sink.paths)
 
-            sorted_formats = sorted(formats, key=lambda k: int(formats[k]['idx']))
 
-            for fmt in sorted_formats:
-                writer.writerow(formats[fmt])
+    # Update the CSV export of the registry
+    syncCsv(registry)
 
+    # Only now is the graph built from the list fetched
+    if fetched:
+        saveValidators(fetched)
+
+    if metricspath:
+        metrics.info['formats'] = len(formats)
+        metrics.info['new_formats'] = len(new_formats)
+        metrics.save(metricspath)
 
 
 if __name__ == "__main__":
     import os
-    import RDF
+    import sys
+    import re
+    import json
     import urllib2
+    import argparse
     import xml.etree.ElementTree as ET
     import csv
+    import tempfile
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, os.pardir))
+    from geolink.metrics import Metrics
+    from geolink.registry import Registry
+
+    parser = argparse.ArgumentParser(description="Creates an RDF graph of the DataOne formats.")
+    parser.add_argument("--url", default=formats_url, help="formats list to fetch (default: %(default)s)")
+    parser.add_argument("--force", action="store_true", help="fetch the formats list and rebuild the graph even if the list has not changed")
+    parser.add_argument("--output", choices=["redland", "ntriples", "turtle"], default="redland",
+                        help="redland: build a Redland model and serialize it to formats.ttl and formats.xml (default); ntriples, turtle: stream to formats.nt or formats.ttl")
+    parser.add_argument("--batch-size", dest="batchsize", type=int, default=1000, metavar="N", help="statements added or written at a time")
+    parser.add_argument("--metrics", dest="metricspath", metavar="PATH", help="save per-stage timings, memory and sizes of the run as JSON to PATH")
+    args = parser.parse_args()
+
+    if args.output == "redland":
+        import RDF
 
-    main()
+    main(args.metricspath, args.output, args.batchsize, args.url, args.force)
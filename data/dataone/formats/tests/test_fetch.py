@@ -0,0 +1,209 @@
+'''Tests of the conditional fetch and the parse of create-d1-formats-graph.py
+against a local stand-in for the CN formats endpoint, which serves the
+recorded formats list voc/dataone/format.xml with an ETag.
+
+The script runs on Python 2. It is run as a subprocess of the interpreter
+named by $PYTHON2, or of python2 or python2.7 on the PATH; the tests are
+skipped if there is none.
+
+    PYTHON2=/path/to/python2.7 python3 -m pytest data/dataone/formats/tests
+'''
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+import subprocess
+import xml.etree.ElementTree as ET
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+here = os.path.dirname(os.path.abspath(__file__))
+script = os.path.join(os.path.dirname(here), 'create-d1-formats-graph.py')
+recorded = os.path.join(here, os.pardir, os.pardir, os.pardir, os.pardir, 'voc', 'dataone', 'format.xml')
+etag = '"formats-v1"'
+
+
+def findPython2():
+    for candidate in (os.environ.get('PYTHON2'), 'python2', 'python2.7'):
+        if not candidate or not shutil.which(candidate):
+            continue
+        try:
+            out = subprocess.run([candidate, '-c', 'import sys; print(sys.version_info[0])'],
+                                 capture_output=True, text=True, timeout=30)
+        except OSError:
+            continue
+        if out.returncode == 0 and out.stdout.strip() == '2':
+            return candidate
+    return None
+
+python2 = findPython2()
+
+
+class Handler(BaseHTTPRequestHandler):
+    '''Answers 304 to a request that sends the server's current `etag`, else
+    its `body`: the recorded list unless a test changes it.'''
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == self.server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = self.server.body
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('ETag', self.server.etag)
+        self.send_header('Last-Modified', 'Tue, 06 Oct 2015 17:00:00 GMT')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def recordedFormats():
+    root = ET.parse(recorded).getroot()
+    return dict((f.findtext('formatId'), {'id': f.findtext('formatId'), 'name': f.findtext('formatName'),
+                                          'type': f.findtext('formatType')})
+                for f in root.iter('objectFormat'))
+
+
+@unittest.skipIf(python2 is None, 'no Python 2 interpreter (set PYTHON2)')
+class FetchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.requests = []
+        self.server.etag = etag
+        with open(recorded, 'rb') as f:
+            self.server.body = f.read()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:%d/cn/v1/formats' % self.server.server_port
+        self.dir = tempfile.mkdtemp()
+        shutil.copy(os.path.join(os.path.dirname(script), 'formats.csv'), self.dir)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.dir)
+
+    def run_script(self, *args, **kwargs):
+        out = subprocess.run([python2, script, '--url', self.url, '--output', 'ntriples'] + list(args),
+                             cwd=self.dir, capture_output=True, text=True, timeout=120)
+        if kwargs.get('fails'):
+            self.assertNotEqual(out.returncode, 0, out.stdout)
+        else:
+            self.assertEqual(out.returncode, 0, out.stdout + out.stderr)
+        return out.stdout
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def snapshot(self):
+        return dict((name, (os.stat(self.path(name)).st_mtime_ns, open(self.path(name), 'rb').read()))
+                    for name in ('formats-response.xml', 'formats-response.json', 'formats.nt', 'formats.csv'))
+
+    def test_200_then_304(self):
+        self.run_script()
+        self.assertNotIn('If-None-Match', self.server.requests[0])
+        with open(self.path('formats-response.xml'), 'rb') as f, open(recorded, 'rb') as g:
+            self.assertEqual(f.read(), g.read())
+        with open(self.path('formats-response.json')) as f:
+            validators = json.load(f)
+        self.assertEqual(validators['etag'], etag)
+        self.assertEqual(validators['url'], self.url)
+        with open(self.path('formats.csv')) as f:
+            minted = set(row.split(',')[1] for row in f.readlines()[1:])
+        self.assertTrue(set(recordedFormats()) <= minted)
+        with open(self.path('formats.nt')) as f:
+            ## 8 statements per format minted
+            self.assertEqual(len(f.readlines()), 8 * len(minted))
+        before = self.snapshot()
+
+        out = self.run_script()
+        self.assertEqual(self.server.requests[1].get('If-None-Match'), etag)
+        self.assertEqual(self.server.requests[1].get('If-Modified-Since'), 'Tue, 06 Oct 2015 17:00:00 GMT')
+        self.assertIn('has not changed', out)
+        self.assertIn('up to date', out)
+        ## the cached body is kept and nothing is rewritten
+        self.assertEqual(self.snapshot(), before)
+
+    def test_304_without_outputs_rebuilds_from_cached_body(self):
+        self.run_script()
+        os.remove(self.path('formats.nt'))
+        out = self.run_script()
+        self.assertIn('has not changed', out)
+        self.assertNotIn('up to date', out)
+        self.assertEqual(self.server.requests[1].get('If-None-Match'), etag)
+        self.assertTrue(os.path.isfile(self.path('formats.nt')))
+
+    def test_force_ignores_validators(self):
+        self.run_script()
+        self.run_script('--force')
+        self.assertNotIn('If-None-Match', self.server.requests[1])
+
+    def test_failed_rebuild_is_retried(self):
+        self.run_script()
+        ## the list changes, but the rebuild from it fails (here: a truncated body)
+        added = (b'<objectFormat><formatId>test/new-format</formatId><formatName>New format</formatName>'
+                 b'<formatType>DATA</formatType></objectFormat>')
+        changed = self.server.body.replace(b'</d1:objectFormatList>', added + b'</d1:objectFormatList>')
+        self.assertNotEqual(changed, self.server.body)
+        self.server.etag = '"formats-v2"'
+        self.server.body = changed[:len(changed) // 2]
+        self.run_script(fails=True)
+        with open(self.path('formats-response.json')) as f:
+            self.assertEqual(json.load(f)['etag'], etag)
+
+        ## the next run does not get a 304 for the list the graph was not built from
+        self.server.body = changed
+        out = self.run_script()
+        self.assertEqual(self.server.requests[2].get('If-None-Match'), etag)
+        self.assertNotIn('up to date', out)
+        with open(self.path('formats.nt')) as f:
+            self.assertIn('"test/new-format"', f.read())
+        with open(self.path('formats-response.json')) as f:
+            self.assertEqual(json.load(f)['etag'], '"formats-v2"')
+
+        out = self.run_script()
+        self.assertIn('up to date', out)
+
+    def test_format_without_name(self):
+        ## a format without formatName gets no description, but all else
+        added = b'<objectFormat><formatId>test/unnamed</formatId><formatType>DATA</formatType></objectFormat>'
+        self.server.body = self.server.body.replace(b'</d1:objectFormatList>', added + b'</d1:objectFormatList>')
+        for output, name in (('ntriples', 'formats.nt'), ('turtle', 'formats.ttl')):
+            self.run_script('--force', '--output', output)
+            with open(self.path(name)) as f:
+                text = f.read()
+            self.assertIn('"test/unnamed"', text)
+        with open(self.path('formats.nt')) as f:
+            lines = f.readlines()
+        with open(self.path('formats.csv')) as f:
+            minted = len(f.readlines()) - 1
+        self.assertEqual(len(lines), 8 * minted - 1)
+
+    def test_no_temporary_files_left(self):
+        self.run_script()
+        self.run_script('--force', '--output', 'turtle')
+        self.assertEqual([name for name in os.listdir(self.dir) if name.endswith('.tmp')], [])
+        ## written like files created without a temporary one
+        mode = os.stat(self.path('formats.ttl')).st_mode & 0o777
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(mode, 0o666 & ~umask)
+
+    def test_parse_recorded_list(self):
+        code = ('import imp, json, sys, xml.etree.ElementTree as ET\n'
+                'm = imp.load_source("formatsgraph", sys.argv[1])\n'
+                'm.ET = ET\n'
+                'print(json.dumps(m.parseFormats(sys.argv[2])))\n')
+        out = subprocess.run([python2, '-B', '-c', code, script, recorded], capture_output=True, text=True, timeout=60)
+        self.assertEqual(out.returncode, 0, out.stderr)
+        self.assertEqual(json.loads(out.stdout), recordedFormats())
+
+
+if __name__ == '__main__':
+    unittest.main()
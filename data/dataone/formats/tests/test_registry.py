@@ -0,0 +1,72 @@
+'''Tests of the first-run import of formats.csv into the registry of minted
+format URIs (geolink/registry.py), by runs that start at the same time.
+
+    python3 -m pytest data/dataone/formats/tests
+'''
+import os
+import csv
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, os.pardir, os.pardir, os.pardir, os.pardir))
+from geolink.registry import Registry
+
+base = 'http://schema.geolink.org/dev/voc/dataone/format#'
+
+with open(os.path.join(os.path.dirname(here), 'formats.csv')) as f:
+    rows = list(csv.DictReader(f))
+
+
+def csvRecords():
+    return [dict([(k, v) for k, v in row.items() if k != 'id'], key=row['id']) for row in rows]
+
+
+class LoadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'formats-registry.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_load_once(self):
+        registry = Registry(self.path, base, width=3)
+        self.assertTrue(registry.load(csvRecords(), meta={'csv_counter': len(rows)}))
+        self.assertFalse(registry.load(csvRecords(), meta={'csv_counter': 0}))
+        self.assertEqual(len(registry), len(rows))
+        self.assertEqual(registry.counter, max(int(row['idx']) for row in rows))
+        self.assertEqual(registry.meta('csv_counter'), str(len(rows)))
+        registry.close()
+
+    def test_concurrent_first_runs(self):
+        ## each run opens its own connection, sees an empty registry and loads it
+        results, errors, uris = [], [], []
+        start = threading.Barrier(4)
+
+        def run():
+            registry = Registry(self.path, base, width=3, timeout=30)
+            try:
+                empty = registry.counter == 0
+                start.wait()
+                results.append((empty, registry.load(csvRecords())))
+                uris.append([r['uri'] for r in registry.records()])
+            except Exception as e:
+                errors.append(e)
+            registry.close()
+
+        threads = [threading.Thread(target=run) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(results), [(True, False)] * 3 + [(True, True)])
+        self.assertEqual(uris, [[row['uri'] for row in rows]] * 4)
+
+if __name__ == '__main__':
+    unittest.main()
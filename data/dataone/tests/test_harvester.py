@@ -0,0 +1,207 @@
+'''Tests of create-d1-datasets-graph.py against a local stand-in for the CN
+Solr index, which serves numbered copies of the documents in
+dataone-example.xml page by page.
+
+    python3 -m pytest data/dataone/tests
+'''
+import os
+import sys
+import glob
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.parse
+import importlib.util
+import xml.etree.ElementTree as ET
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from rdflib import Graph, BNode, RDF, RDFS
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+import d1solr
+
+spec = importlib.util.spec_from_file_location('datasetsgraph', os.path.join(os.path.dirname(here), 'create-d1-datasets-graph.py'))
+harvester = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(harvester)
+
+examples = ET.parse(os.path.join(os.path.dirname(here), 'dataone-example.xml')).getroot().findall('.//doc')
+
+
+def exampleDoc(i):
+    '''The i-th document of the stand-in index: an example document with a
+    unique identifier, some with a bounding box, replicas or an older version.'''
+    doc = ET.fromstring(ET.tostring(examples[i % len(examples)]))
+    for field in doc:
+        if field.get('name') == 'identifier':
+            field.text = 'test.%d.1' % i
+    if i % 3 == 0:
+        for name, value in (('northBoundCoord', '68.6'), ('southBoundCoord', '68.4'),
+                            ('eastBoundCoord', '-149.5'), ('westBoundCoord', '-149.7')):
+            ET.SubElement(doc, 'float', name=name).text = value
+        replicas = ET.SubElement(doc, 'arr', name='replicaMN')
+        for node in ('urn:node:CN', 'urn:node:KNB'):
+            ET.SubElement(replicas, 'str').text = node
+    if i % 5 == 1:
+        ET.SubElement(doc, 'str', name='obsoletes').text = 'test.%d.0' % i
+    return ET.tostring(doc, encoding='unicode')
+
+
+class Handler(BaseHTTPRequestHandler):
+    '''Serves ?start=M&rows=N of the server's `numFound` documents. The
+    server's `faults` maps a start offset to statuses to answer with first.'''
+
+    def do_GET(self):
+        q = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        start, rows = int(q['start'][0]), int(q['rows'][0])
+        total = self.server.numFound
+        with self.server.lock:
+            faults = self.server.faults.get(start)
+            status = faults.pop(0) if faults else 200
+        if status != 200:
+            self.send_response(status)
+            self.end_headers()
+            return
+        body = ('<?xml version="1.0" encoding="UTF-8"?>\n<response><result name="response" numFound="%d" start="%d">'
+                % (total, start) + ''.join(exampleDoc(i) for i in range(start, min(start + rows, total)))
+                + '</result></response>').encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def shardTriples(path):
+    '''The triples of a shard, with each blank node (an identifier) replaced
+    by its label, so that two harvests can be compared.'''
+    g = Graph().parse(path, format='turtle')
+    label = lambda n: 'identifier:' + str(g.value(n, RDFS.label)) if isinstance(n, BNode) else n
+    return set((label(s), p, label(o)) for s, p, o in g)
+
+
+class HarvesterTest(unittest.TestCase):
+
+    rows = 10
+    shardsize = 25
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.numFound = 137
+        self.server.faults = {}
+        self.server.lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.uri = 'http://127.0.0.1:%d/cn/v1/query/solr/' % self.server.server_port
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.dir)
+
+    def harvest(self, name, **kwargs):
+        args = dict(rows=self.rows, workers=3, shardsize=self.shardsize)
+        args.update(kwargs)
+        return harvester.run(os.path.join(self.dir, name), self.uri, **args)
+
+    def shards(self, name):
+        return sorted(p for p in glob.glob(os.path.join(self.dir, name, 'datasets-*'))
+                      if harvester.shardpattern.match(os.path.basename(p)))
+
+    def checkpoint(self, name):
+        with open(os.path.join(self.dir, name, harvester.checkpointname)) as f:
+            return json.load(f)
+
+    def assertSameHarvest(self, a, b):
+        shardsA, shardsB = self.shards(a), self.shards(b)
+        self.assertEqual([os.path.basename(p) for p in shardsA], [os.path.basename(p) for p in shardsB])
+        for pa, pb in zip(shardsA, shardsB):
+            self.assertEqual(shardTriples(pa), shardTriples(pb), os.path.basename(pa))
+
+    def assertNoDuplicates(self, name, total):
+        datasets = []
+        for path in self.shards(name):
+            g = Graph().parse(path, format='turtle')
+            datasets.extend(g.subjects(RDF.type, harvester.glbase.Dataset))
+        self.assertEqual(len(datasets), total)
+        self.assertEqual(len(set(datasets)), total)
+
+    def test_uninterrupted(self):
+        state = self.harvest('full')
+        self.assertEqual(len(self.shards('full')), 6)
+        self.assertEqual(self.checkpoint('full'), state)
+        self.assertEqual((state['next'], state['datasets'], state['shards'], state['numFound']), (137, 137, 6, 137))
+        self.assertEqual(state['settings'], {'uri': self.uri, 'query': d1solr.query, 'sort': d1solr.sort,
+                                             'shardsize': self.shardsize})
+        self.assertNoDuplicates('full', 137)
+
+    def test_resume_after_interruption(self):
+        self.harvest('full')
+        ## the page at 60 keeps failing while the third shard (datasets 50 to 74) is being written
+        self.server.faults = {60: [500] * 3}
+        with self.assertRaises(urllib.error.HTTPError):
+            self.harvest('resumed', retries=2, backoff=0.01)
+        self.assertEqual(self.server.faults[60], [])
+        self.assertEqual([os.path.basename(p) for p in self.shards('resumed')],
+                         ['datasets-00001.ttl', 'datasets-00002.ttl'])
+        state = self.checkpoint('resumed')
+        self.assertEqual((state['next'], state['datasets'], state['shards']), (50, 50, 2))
+
+        state = self.harvest('resumed')
+        self.assertEqual((state['next'], state['datasets'], state['shards']), (137, 137, 6))
+        self.assertSameHarvest('full', 'resumed')
+        self.assertNoDuplicates('resumed', 137)
+
+    def test_transient_errors_are_retried(self):
+        self.harvest('full')
+        self.server.faults = {0: [503], 60: [500, 429], 130: [502]}
+        state = self.harvest('retried', backoff=0.01)
+        self.assertEqual((state['next'], state['datasets'], state['shards']), (137, 137, 6))
+        self.assertEqual(self.server.faults, {0: [], 60: [], 130: []})
+        self.assertSameHarvest('full', 'retried')
+        self.assertNoDuplicates('retried', 137)
+
+    def test_client_errors_are_not_retried(self):
+        self.server.faults = {20: [404]}
+        with self.assertRaises(urllib.error.HTTPError) as cm:
+            self.harvest('failed', backoff=0.01)
+        self.assertEqual(cm.exception.code, 404)
+        self.assertEqual(self.shards('failed'), [])
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'failed', harvester.checkpointname)))
+
+    def test_limited_runs(self):
+        self.harvest('full')
+        for n in (40, 40, 40):
+            self.harvest('limited', limit=n)
+        self.assertEqual(self.checkpoint('limited')['next'], 120)
+        self.harvest('limited', limit=40)
+        state = self.checkpoint('limited')
+        self.assertEqual((state['next'], state['datasets']), (137, 137))
+        self.assertNoDuplicates('limited', 137)
+        ## the shards end where each run stopped, but hold the same triples
+        union = lambda name: set().union(*[shardTriples(p) for p in self.shards(name)])
+        self.assertEqual(union('full'), union('limited'))
+
+    def test_new_datasets_are_appended(self):
+        self.harvest('grow')
+        self.server.numFound = 160
+        state = self.harvest('grow')
+        self.assertEqual((state['next'], state['datasets'], state['shards']), (160, 160, 7))
+        self.assertNoDuplicates('grow', 160)
+
+    def test_settings_changed(self):
+        self.harvest('full', limit=30)
+        with self.assertRaises(harvester.SettingsChanged):
+            self.harvest('full', shardsize=40)
+        state = self.harvest('full', shardsize=40, restart=True)
+        self.assertEqual((state['next'], state['shards']), (137, 4))
+        self.assertNoDuplicates('full', 137)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+'''Exports the generated data as gzip-compressed N-Quads for bulk loading.
+
+Each export in the `exports` table below collects the output files of the
+generators of one source and tags their triples with the named graph the
+source is loaded into. The quads are written to size-bounded chunks in
+--outdir with a manifest.json listing every chunk and its graph (see
+geolink/nquads.py), so a full reload can run in parallel loader threads:
+
+    python3 export-nquads.py                    # all exports, to nquads/
+    python3 export-nquads.py dataone sesar --chunk-size 64
+
+Exports run in parallel worker processes. An export whose source files
+have not changed since the manifest was written is skipped unless --force
+is given. Parsed sources are cached (geolink/graphcache.py). A source file
+that does not parse (e.g. bco-dmo/program.rdf, which uses an undeclared
+prefix) is left out of its export with a warning, and listed under
+"skipped" in the manifest entry until it is fixed.
+'''
+import os
+import sys
+import glob
+import argparse
+import collections
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from rdflib.util import guess_format
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from geolink import graphcache, nquads
+from geolink.metrics import Metrics
+
+
+datapath = os.path.dirname(os.path.abspath(__file__))
+
+## export name -> (named graph, source files relative to data/). A tuple of
+## patterns is a list of alternatives: the first one matching a file is used.
+exports = collections.OrderedDict([
+    ('bcodmo', ('bcodmo', ['bco-dmo/*.rdf'])),
+    ('dataone', ('dataone', [('dataone/datasets/datasets-*.ttl', 'dataone/datasets.ttl'),
+                             'dataone/people.ttl', 'dataone/organizations.ttl',
+                             'dataone/formats/formats.ttl'])),
+    ('iodp', ('iodp', ['iodp/IODPPeople.ttl', 'iodp/holeData.ttl'])),
+    ('sesar', ('sesar', ['sesar/*.ttl'])),
+    ('feature', ('feature', ['gebco/features.ttl', 'gvp/features.ttl'])),
+])
+
+
+def sourceFiles(patterns):
+    files = []
+    for pattern in patterns:
+        for alternative in (pattern if isinstance(pattern, tuple) else (pattern,)):
+            matches = sorted(glob.glob(os.path.join(datapath, alternative)))
+            if matches:
+                files.extend(matches)
+                break
+    return files
+
+def upToDate(entry, files, outdir, chunksize):
+    if entry is None or entry.get('chunksize') != chunksize:
+        return False
+    if [os.path.relpath(p, outdir) for p in files] != [s['path'] for s in entry['sources']]:
+        return False
+    if any(not os.path.isfile(os.path.join(outdir, c['file'])) for c in entry['chunks']):
+        return False
+    return all(graphcache.file_sha1(p) == s['sha1'] for p, s in zip(files, entry['sources']))
+
+def warnSkipped(name, entry):
+    for source in entry.get('skipped', ()):
+        print('Warning: left %s out of %s: %s' % (source['path'], name, source['error']))
+
+
+def exportJob(name, files, outdir, chunksize):
+    '''Writes the chunks of one export in a worker process, leaving out the
+    files that do not parse. Returns its manifest entry and the metrics of
+    its stages.'''
+    metrics = Metrics()
+    skipped = []
+    with nquads.Chunks(outdir, name, nquads.graph_uri(exports[name][0]), chunksize) as out:
+        for path in files:
+            with metrics.stage('parse', name) as st:
+                try:
+                    triples = graphcache.load_triples(path, guess_format(path))
+                except Exception as e:
+                    ## only the message: parser errors may hold their handler, which cannot be sent back from the worker
+                    skipped.append({'path': os.path.relpath(path, outdir), 'error': str(e)})
+                    continue
+                st.triples_in += len(triples)
+            with metrics.stage('serialize', name) as st:
+                for t in triples:
+                    out.add(t)
+                st.triples_out += len(triples)
+    metrics.get('serialize', name).bytes_written += sum(c['compressed'] for c in out.chunks)
+    return out.entry(files, chunksize=chunksize, skipped=skipped), [st.as_dict() for st in metrics.ordered()]
+
+
+def run(names=None, outdir='nquads', chunksize=256 << 20, jobs=None, force=False, metricspath=None):
+    '''Runs the given exports (all by default) and updates the manifest.
+    Returns (names exported, names failed).'''
+    names = list(names or exports)
+    metrics = Metrics('export-nquads')
+    manifest = nquads.Manifest(outdir)
+    pending = collections.OrderedDict()
+    for name in names:
+        files = sourceFiles(exports[name][1])
+        if not files:
+            print('Skipping %s: no source files' % name)
+        elif not force and upToDate(manifest.get(name), files, outdir, chunksize):
+            print('%s is up to date' % name)
+            warnSkipped(name, manifest.get(name))
+        else:
+            pending[name] = files
+
+    done, failed = [], []
+    with ProcessPoolExecutor(jobs) as pool:
+        futures = dict((pool.submit(exportJob, name, files, outdir, chunksize), name)
+                       for name, files in pending.items())
+        for f in as_completed(futures):
+            name = futures[f]
+            try:
+                entry, stages = f.result()
+            except Exception as e:
+                print('Failed to export %s: %s' % (name, e))
+                failed.append(name)
+                continue
+            metrics.merge(stages)
+            manifest.set(name, entry)
+            manifest.save()
+            done.append(name)
+            warnSkipped(name, entry)
+            print('Exported %d quads of %s to %d chunks' % (entry['quads'], entry['graph'], len(entry['chunks'])))
+    if metricspath:
+        metrics.info['jobs'] = jobs
+        metrics.info['exported'] = done
+        metrics.info['failed'] = failed
+        metrics.save(metricspath)
+    return done, failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exports the generated data as gzip-compressed N-Quads chunks for bulk loading.')
+    parser.add_argument('names', nargs='*', metavar='NAME', help='exports to run (default: all of %s)' % ', '.join(exports))
+    parser.add_argument('--outdir', default='nquads', help='directory of the chunks and manifest.json')
+    parser.add_argument('--chunk-size', dest='chunksize', type=int, default=256, metavar='MB',
+                        help='maximum size of a chunk in MB of N-Quads, before compression')
+    parser.add_argument('--jobs', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--force', action='store_true', help='export even if the sources did not change')
+    parser.add_argument('--metrics', dest='metricspath', metavar='PATH',
+                        help='save per-stage timings, memory and sizes of the run as JSON to PATH')
+    args = parser.parse_args()
+    unknown = [n for n in args.names if n not in exports]
+    if unknown:
+        parser.error('unknown export(s): ' + ', '.join(unknown))
+    if args.chunksize < 1:
+        parser.error('--chunk-size must be positive')
+    done, failed = run(args.names, args.outdir, args.chunksize << 20, args.jobs, args.force, args.metricspath)
+    if failed:
+        sys.exit('not exported: ' + ', '.join(failed))
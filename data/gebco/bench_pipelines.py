@@ -0,0 +1,269 @@
+'''Benchmarks the GEBCO CSV and REST converters on synthetic gazetteers.
+
+Synthetic inputs are generated at multiples of the size of features.csv
+(1x, 10x, 100x, ...): a CSV with the gazetteer columns for
+gebcofeatures-csvtordf.py, and a JSON document shaped like one page of the
+REST endpoint for gebcofeatures-restaccess.py. Geometry types are mixed as in
+the real gazetteer (mostly points), and non-point geometries get about
+--vertices vertices each.
+
+Each pipeline is run stage by stage with the converters' own functions,
+reporting wall time, peak traced memory and, where triples are produced,
+triples per second:
+
+    read       CSV rows / JSON items into dicts
+    parse      WKT strings into wkt.Geometry objects
+    centroid   vertex centroids of all features (geometry.centroids)
+    graph      deriving the triples and adding them to the converters' TripleBuffer
+    serialize  writing the graph to RDF/XML and Turtle (geolink.serialize)
+
+    python3 bench_pipelines.py                      # 1x and 10x, both pipelines
+    python3 bench_pipelines.py --scales 1 10 100 --vertices 200 --pipeline csv
+
+Memory is traced with tracemalloc, which slows the pure-Python stages down;
+pass --no-memory for timings without it.
+'''
+import os
+import sys
+import csv
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import importlib.util
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+import wkt
+import geometry
+import harvest
+from geolink import serialize
+from geolink.triplebuffer import TripleBuffer
+
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+## number of rows of features.csv, used as the 1x size when the file is not at hand
+base_rows = 3805
+
+headers = ['Specific Term', 'Generic Term', 'Associated Meeting', 'Proposer', 'Year of Proposal',
+           'Discoverer', 'Year of Discovery', 'Origin of Name', 'Additional Information',
+           'Coordinates', 'Secondary Coordinates']
+
+generic_terms = ['Seamount', 'Bank', 'Canyon', 'Ridge', 'Basin', 'Fracture Zone', 'Trough',
+                 'Guyot', 'Hill', 'Knoll', 'Plateau', 'Rise', 'Sea Valley', 'Abyssal Plain']
+
+## share of each geometry type among the synthetic features
+geometry_mix = [('POINT', 0.8), ('LINESTRING', 0.12), ('POLYGON', 0.06), ('MULTIPOLYGON', 0.02)]
+
+syllables = ['ma', 'ri', 'ko', 'la', 'ven', 'tor', 'sa', 'ne', 'gu', 'ho', 'ær', 'ñe', 'zé', 'ló']
+
+
+def load_module(name, fname):
+    '''Imports one of the hyphen-named converter scripts as a module.'''
+    spec = importlib.util.spec_from_file_location(name, os.path.join(here, fname))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+####### Synthetic inputs #######
+
+def base_size(fname=os.path.join(here, 'features.csv')):
+    if not os.path.isfile(fname):
+        return base_rows
+    with open(fname, newline='', encoding='utf-8') as f:
+        return sum(1 for _ in csv.reader(f)) - 1
+
+def synthName(rnd):
+    return ''.join(rnd.choice(syllables) for _ in range(rnd.randint(2, 4))).capitalize()
+
+def synthSequence(rnd, lon, lat, n, closed=False):
+    pts = []
+    for i in range(n - 1 if closed else n):
+        pts.append('%.6f %.6f' % (lon + rnd.uniform(-1, 1), max(-89.9, min(89.9, lat + rnd.uniform(-1, 1)))))
+    if closed:
+        pts.append(pts[0])
+    return '(' + ', '.join(pts) + ')'
+
+def synthWKT(rnd, vertices):
+    kind = rnd.choices([k for k, _ in geometry_mix], [w for _, w in geometry_mix])[0]
+    lon, lat = rnd.uniform(-179, 179), rnd.uniform(-80, 80)
+    n = max(4, int(rnd.gauss(vertices, vertices / 4)))
+    if kind == 'POINT':
+        return 'POINT (%.6f %.6f)' % (lon, lat)
+    if kind == 'LINESTRING':
+        return 'LINESTRING ' + synthSequence(rnd, lon, lat, n)
+    if kind == 'POLYGON':
+        return 'POLYGON (' + synthSequence(rnd, lon, lat, n, True) + ')'
+    parts = rnd.randint(2, 4)
+    return 'MULTIPOLYGON (' + ', '.join('(' + synthSequence(rnd, lon, lat, max(4, n // parts), True) + ')'
+                                        for _ in range(parts)) + ')'
+
+def synthFeatures(count, vertices, seed=0):
+    '''Yields synthetic gazetteer records (dicts with the CSV columns).'''
+    rnd = random.Random(seed)
+    for i in range(count):
+        rec = dict.fromkeys(headers, '')
+        rec['Specific Term'] = synthName(rnd)
+        rec['Generic Term'] = rnd.choice(generic_terms)
+        if rnd.random() < 0.3:
+            rec['Proposer'] = synthName(rnd) + ' Hydrographic Office'
+            rec['Year of Proposal'] = str(rnd.randint(1950, 2015))
+        if rnd.random() < 0.2:
+            rec['Origin of Name'] = 'Named after ' + synthName(rnd) + ' ' + synthName(rnd) + '.'
+        rec['Coordinates'] = synthWKT(rnd, vertices)
+        if rnd.random() < 0.03:
+            rec['Secondary Coordinates'] = synthWKT(rnd, vertices)
+        yield rec
+
+def writeCSV(fname, count, vertices, seed=0):
+    with open(fname, 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
+        w.writerow(headers)
+        for rec in synthFeatures(count, vertices, seed):
+            w.writerow([rec[h] for h in headers])
+
+def writeJSON(fname, count, vertices, seed=0):
+    '''Writes the records the way the REST endpoint pages them out.'''
+    with open(fname, 'w', encoding='utf-8') as f:
+        f.write('{"totalCount": %d, "items": [' % count)
+        for i, rec in enumerate(synthFeatures(count, vertices, seed)):
+            item = {'id': i + 1, 'name': rec['Specific Term'],
+                    'type': {'name': rec['Generic Term']} if i % 50 else None,
+                    'geometry': rec['Coordinates'], 'secondaryGeometry': rec['Secondary Coordinates'] or None}
+            f.write((',\n' if i else '\n') + json.dumps(item, ensure_ascii=False))
+        f.write('\n]}\n')
+
+
+####### Stages #######
+
+class Stages(object):
+    '''Times a sequence of stages, with peak traced memory per stage.'''
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.results = []
+
+    def run(self, name, func, *args):
+        if self.memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        peak = None
+        if self.memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.results.append([name, elapsed, peak, None])
+        return result
+
+    def triples(self, count):
+        '''Records the number of triples produced by the last stage.'''
+        self.results[-1][3] = count
+
+    def report(self, title):
+        print(title)
+        print('  %-10s %10s %10s %14s' % ('stage', 'wall s', 'peak MB', 'triples/s'))
+        for name, elapsed, peak, triples in self.results:
+            print('  %-10s %10.3f %10s %14s' % (name, elapsed,
+                  '-' if peak is None else '%.1f' % (peak / 2.0**20),
+                  '-' if triples is None else '%.0f' % (triples / elapsed if elapsed else 0)))
+        print('  %-10s %10.3f' % ('total', sum(r[1] for r in self.results)))
+
+
+def readCSV(fname):
+    with open(fname, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+def readJSON(fname):
+    with open(fname, encoding='utf-8') as f:
+        return list(harvest.iter_items(f))
+
+def parseAll(texts):
+    return [wkt.parse(t) if t else None for t in texts]
+
+def centroidsOf(geoms):
+    return geometry.centroids(geometry.batch(geoms))
+
+def serializeGraph(g, foutname, prefixes):
+    with serialize.Outputs(foutname, ['xml', 'turtle'], prefixes) as out:
+        serialize.write_graph(g, out)
+    return out.count
+
+def benchCSV(csvtordf, fname, memory=True):
+    stages = Stages(memory)
+    rows = stages.run('read', readCSV, fname)
+    geoms = stages.run('parse', parseAll, [r['Coordinates'] for r in rows])
+    cents = stages.run('centroid', centroidsOf, geoms).tolist()
+
+    def build():
+        g = TripleBuffer()
+        names = csvtordf.unicode_to_ascii.transliterate_all(
+            [(r['Specific Term'] + ' ' + r['Generic Term']).replace(' ', '_') for r in rows])
+        for r, c, n in zip(rows, cents, names):
+            for t in csvtordf.rowTriples(r, c, n):
+                g.add(t)
+        return g
+    g = stages.run('graph', build)
+    stages.triples(len(g))
+    n = stages.run('serialize', serializeGraph, g, fname[:fname.rfind('.')], csvtordf.prefixes)
+    stages.triples(n)
+    return stages
+
+def benchJSON(restaccess, fname, memory=True):
+    stages = Stages(memory)
+    items = stages.run('read', readJSON, fname)
+    geoms = stages.run('parse', parseAll, [i['geometry'] for i in items])
+    stages.run('centroid', centroidsOf, geoms)
+
+    def build():
+        g = TripleBuffer()
+        for item in items:
+            for t in restaccess.featureTriples(item):
+                g.add(t)
+        return g
+    g = stages.run('graph', build)
+    stages.triples(len(g))
+    n = stages.run('serialize', serializeGraph, g, fname[:fname.rfind('.')], restaccess.prefixes)
+    stages.triples(n)
+    return stages
+
+
+def run(scales, vertices, pipelines, workdir=None, memory=True, seed=0):
+    base = base_size()
+    tmpdir = None
+    if workdir is None:
+        workdir = tmpdir = tempfile.mkdtemp(prefix='gebco-bench-')
+    csvtordf = load_module('gebcofeatures_csvtordf', 'gebcofeatures-csvtordf.py')
+    restaccess = load_module('gebcofeatures_restaccess', 'gebcofeatures-restaccess.py')
+    try:
+        for scale in scales:
+            count = int(base * scale)
+            label = '%gx (%d features, ~%d vertices per non-point geometry)' % (scale, count, vertices)
+            if 'csv' in pipelines:
+                fname = os.path.join(workdir, 'synthetic-%g.csv' % scale)
+                writeCSV(fname, count, vertices, seed)
+                benchCSV(csvtordf, fname, memory).report('csvtordf ' + label)
+            if 'json' in pipelines:
+                fname = os.path.join(workdir, 'synthetic-%g.json' % scale)
+                writeJSON(fname, count, vertices, seed)
+                benchJSON(restaccess, fname, memory).report('restaccess ' + label)
+    finally:
+        if tmpdir: shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the GEBCO converters on synthetic gazetteers.')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10],
+                        help='input sizes as multiples of features.csv (e.g. 1 10 100)')
+    parser.add_argument('--vertices', type=int, default=50,
+                        help='mean number of vertices of non-point geometries')
+    parser.add_argument('--pipeline', choices=['csv', 'json', 'both'], default='both')
+    parser.add_argument('--workdir', help='keep the synthetic inputs and outputs here instead of a temporary directory')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='do not trace memory')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    pipelines = ['csv', 'json'] if args.pipeline == 'both' else [args.pipeline]
+    run(args.scales, args.vertices, pipelines, args.workdir, args.memory, args.seed)
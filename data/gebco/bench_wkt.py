@@ -0,0 +1,152 @@
+'''Benchmarks the linear-time WKT parser (wkt.py) against the recursive-descent
+parser the GEBCO scripts used before, over the geometries of features.csv.
+
+    python3 bench_wkt.py [features.csv] [repeat]
+
+The legacy parser is kept here only as a reference for timing and for
+checking that both parsers produce the same coordinates.
+'''
+import sys
+import csv
+import re
+import time
+import collections
+import wkt
+
+
+####### Legacy recursive-descent WKT parser (reference only) #######
+
+Token = collections.namedtuple('Token', ['name','value'])
+RuleMatch = collections.namedtuple('RuleMatch', ['name','matched'])
+
+token_map = { '(':'LPAR', ')':'RPAR', ',':'COMMA', 'POINT':'POINT','LINESTRING':'LINESTRING', 'POLYGON':'POLYGON',
+            'MULTIPOINT':'MULTIPOINT','MULTILINESTRING':'MULTILINESTRING', 'MULTIPOLYGON':'MULTIPOLYGON'}
+signed_exact_num_pattern = r'[-+]?\d*\.?\d+'
+signed_approx_num_pattern = signed_exact_num_pattern + r'E[-+]?\d*'
+escape = (lambda x : '\\'+x if x == '(' or x == ')' else x)
+token_regex_pattern = '|'.join([signed_exact_num_pattern, signed_approx_num_pattern]) +'|' + '|'.join(map(escape,token_map))
+
+rule_map = { 'atom'          : ['NUM'],
+             'pair'          : ['atom atom'],
+             'pairs'         : ['pair COMMA pairs', 'pair'],
+             'geom'          : ['pointtag', 'linestringtag', 'polygontag','multipointtag','multilinestringtag','multipolygontag'],
+             'pointtag'      : ['POINT point'],
+             'point'         : ['LPAR pair RPAR'],
+             'points'        : ['point COMMA points', 'point'],
+             'linestringtag' : ['LINESTRING linestring'],
+             'linestring'    : ['LPAR pairs RPAR'],
+             'linestrings'   : ['linestring COMMA linestrings', 'linestring'],
+             'polygontag'    : ['POLYGON polygon'],
+             'polygon'       : ['LPAR linestrings RPAR'],
+             'polygons'      : ['polygon COMMA polygons', 'polygon'],
+             'multipointtag' : ['MULTIPOINT multipoint'],
+             'multipoint'    : ['LPAR points RPAR'],
+             'multilinestringtag' : ['MULTILINESTRING multilinestring'],
+             'multilinestring' : ['LPAR linestrings RPAR'],
+             'multipolygontag' : ['MULTIPOLYGON multipolygon'],
+             'multipolygon' : ['LPAR polygons RPAR']
+             }
+
+calc_map = { 'NUM' : float,
+             'atom' : lambda x : (list(x))[0],
+             'pair' : lambda x : tuple(x),
+             'pairs' : lambda x : (lambda y : y if len(y)<=1 else [y[0]]+y[2])(list(x)),
+             'geom' : lambda x : (list(x))[0],
+             'pointtag' : lambda x : (list(x))[1],
+             'point' : lambda x : [(list(x))[1]],
+             'points' : lambda x : (lambda y : y if len(y)<=1 else [y[0]]+y[2])(list(x)),
+             'linestringtag' : lambda x : (list(x))[1],
+             'linestring' : lambda x : (list(x))[1],
+             'linestrings' : lambda x : (lambda y : y if len(y)<=1 else [y[0]]+y[2])(list(x)),
+             'polygontag' : lambda x : (list(x))[1],
+             'polygon' : lambda x : (list(x))[1],
+             'polygons' : lambda x : (lambda y : y if len(y)<=1 else [y[0]]+y[2])(list(x)),
+             'multipointtag' : lambda x : (list(x))[1],
+             'multipoint' : lambda x : (list(x))[1],
+             'multilinestringtag': lambda x : (list(x))[1],
+             'multilinestring' : lambda x : (list(x))[1],
+             'multipolygontag': lambda x : (list(x))[1],
+             'multipolygon' : lambda x : (list(x))[1]}
+
+def match(rule_name, tokens):
+    '''Credit to Erez at http://blog.erezsh.com/how-to-write-a-calculator-in-70-python-lines-by-writing-a-recursive-descent-parser/ '''
+    if tokens and rule_name == tokens[0].name:      # Match a token?
+        return RuleMatch(tokens[0], tokens[1:])
+    for expansion in rule_map.get(rule_name, ()):   # Match a rule?
+        remaining_tokens = tokens
+        matched_subrules = []
+        for subrule in expansion.split():
+            matched, remaining_tokens = match(subrule, remaining_tokens)
+            if not matched:
+                break   # no such luck. next expansion!
+            matched_subrules.append(matched)
+        else:
+            return RuleMatch(rule_name, matched_subrules), remaining_tokens
+    return None, None   # match not found
+
+def _recurse_tree(tree,func):
+    return map(func, tree.matched) if tree.name in rule_map else tree[1]
+
+def evaluate(tree):
+    solutions = _recurse_tree(tree,evaluate)
+    return calc_map.get(tree.name, lambda x:x)(solutions)
+
+tokenizer = re.compile(token_regex_pattern, flags=re.IGNORECASE)
+def legacy_getPoints(expr):
+    split_expr = tokenizer.findall(expr)
+    tokens = [Token(token_map.get(x, 'NUM'), x) for x in split_expr]
+    tree = match('geom', tokens)[0]
+    return evaluate(tree)
+
+### End legacy WKT parser #######
+
+
+def load_geometries(fname):
+    geoms = []
+    with open(fname, newline='', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            for h in ('Coordinates', 'Secondary Coordinates'):
+                if row[h].strip() != '':
+                    geoms.append(row[h])
+    return geoms
+
+def timeit(func, geoms, repeat):
+    best = None
+    failed = 0
+    for r in range(repeat):
+        failed = 0
+        start = time.perf_counter()
+        for g in geoms:
+            try:
+                func(g)
+            except RecursionError:
+                failed += 1
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best: best = elapsed
+    return best, failed
+
+def run(fname, repeat):
+    geoms = load_geometries(fname)
+    ncoords = sum(len(wkt.parse(g).coords)//2 for g in geoms)
+    print('%d geometries, %d coordinate pairs, longest WKT %d chars' % (len(geoms), ncoords, max(map(len, geoms))))
+
+    ## check that both parsers agree wherever the legacy one succeeds
+    mismatches = 0
+    for g in geoms:
+        try:
+            old = legacy_getPoints(g)
+        except RecursionError:
+            continue
+        if old != wkt.to_nested(wkt.parse(g)): mismatches += 1
+    print('coordinate mismatches against legacy parser:', mismatches)
+
+    legacy, legacyfailed = timeit(legacy_getPoints, geoms, repeat)
+    linear, linearfailed = timeit(wkt.parse, geoms, repeat)
+    print('legacy recursive-descent: %8.3f s  (%d hit the recursion limit)' % (legacy, legacyfailed))
+    print('linear wkt.parse:         %8.3f s  (%d hit the recursion limit)' % (linear, linearfailed))
+    print('speedup: %.1fx' % (legacy/linear))
+
+if __name__ == '__main__':
+    finput = sys.argv[1] if len(sys.argv) > 1 else 'features.csv'
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    run(finput, repeat)
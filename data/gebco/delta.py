@@ -0,0 +1,109 @@
+'''Delta rebuilds of line-based RDF outputs, keyed by gazetteer feature id.
+
+A manifest (JSON, feature id -> content hash of the source record) is kept
+next to the output. On the next run only features whose hash changed, new
+features and removed features are touched: the output, written one
+statement per line (N-Triples or flat Turtle), is copied line by line while
+the statements of changed and removed features are dropped, and the freshly
+derived statements of changed and new features are appended.
+
+The manifest also records the SHA-1 of each output as delta mode left it.
+An output that is missing or was rewritten since cannot be patched line by
+line, and the manifest does not describe it: then all features are derived
+again and the outputs are written from scratch. Outputs that group
+statements (features.ttl and features.rdf) are not patched, but written
+again from the patched N-Triples file by the caller.
+'''
+import os
+import json
+import hashlib
+
+from geolink import serialize
+
+
+def feature_hash(record):
+    '''Content hash of a source record (any JSON-serializable value).'''
+    text = json.dumps(record, sort_keys=True, ensure_ascii=False, separators=(',',':'))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_manifest(path, outputs):
+    '''Returns the id -> hash mapping of the last run, or {} if there is
+    none or any of the output paths is not as that run left it.'''
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        written = manifest['outputs']
+        features = manifest['features']
+    except (ValueError, KeyError, TypeError):
+        return {}
+    for p in outputs:
+        if not os.path.isfile(p) or written.get(os.path.basename(p)) != file_sha1(p):
+            return {}
+    return features
+
+def save_manifest(hashes, path, outputs):
+    '''Saves the id -> hash mapping with the SHA-1 of the output paths.'''
+    manifest = {'features': hashes, 'outputs': dict((os.path.basename(p), file_sha1(p)) for p in outputs)}
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, sort_keys=True, indent=0)
+    os.replace(tmp, path)
+
+
+def diff(manifest, hashes):
+    '''Compares an old manifest with the new id -> hash mapping;
+    returns the (added, changed, removed) sets of ids.'''
+    added = set(hashes) - set(manifest)
+    removed = set(manifest) - set(hashes)
+    changed = set(i for i in hashes if i in manifest and manifest[i] != hashes[i])
+    return added, changed, removed
+
+
+def _writer(out, format, prefixes, header):
+    if format == 'nt':
+        return serialize.NTriplesWriter(out)
+    return serialize.TurtleWriter(out, prefixes, group=False, header=header)
+
+def patch(path, format, prefixes, lineid, triples, drop, removedpath=None, fresh=False):
+    '''Patches the line-based output file `path` in place.
+
+    lineid(line) returns the feature id a statement line belongs to (None for
+    header or blank lines, which are kept); lines of ids in `drop` are
+    removed, and are also written to `removedpath` if given; then the
+    statements in `triples` (id -> list of triples) are appended. With
+    fresh, any existing file is replaced by the statements in `triples`.
+    Returns (lines removed, triples added).'''
+    tmp = path + '.tmp'
+    nremoved = 0
+    removedfile = open(removedpath, 'w', encoding='utf-8') if removedpath else None
+    try:
+        with open(tmp, 'w', encoding='utf-8') as out:
+            if not fresh and os.path.isfile(path):
+                with open(path, encoding='utf-8') as old:
+                    for line in old:
+                        if lineid(line) in drop:
+                            nremoved += 1
+                            if removedfile: removedfile.write(line)
+                        else:
+                            out.write(line)
+                writer = _writer(out, format, prefixes, False)
+            else:
+                writer = _writer(out, format, prefixes, True)
+            for i in sorted(triples):
+                for t in triples[i]:
+                    writer.add(t)
+    finally:
+        if removedfile: removedfile.close()
+    os.replace(tmp, path)
+    return nremoved, writer.count
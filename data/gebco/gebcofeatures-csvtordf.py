@@ -1,12 +1,19 @@
 from rdflib import Graph, Literal, BNode, Namespace, RDF, URIRef
 from rdflib.namespace import RDF,RDFS,OWL,XSD,FOAF,DCTERMS
-from rdflib.plugins.stores.regexmatching import REGEXTerm
-import re
+import os
+import sys
 import csv
-import uuid
-import unicodedata
-import collections
+import argparse
 import itertools
+import wkt
+import translit
+import geometry
+import spatialindex
+import geomcache
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from geolink import serialize
+from geolink.triplebuffer import TripleBuffer
+from geolink.metrics import Metrics
 
 
 featureNs = Namespace('http://data.geolink.org/id/feature/gebco/')
@@ -15,20 +22,10 @@ featuretypeNs = Namespace('http://schema.geolink.org/dev/voc/gebco/featuretype#'
 geosparqlNs = Namespace('http://www.opengis.net/ont/geosparql#')
 geosfNs = Namespace('http://www.opengis.net/ont/sf#')
 
-def unicode_to_ascii(text):
-    table = {}
-    for c in text:
-        n = unicodedata.name(c[0][0])
-        prog = re.compile(r"(CAPITAL|SMALL)\s+LETTER\s+(\w+)\s+\w+")
-        result = prog.search(n)
-        if result != None:
-            table[c] = result.group(2)
-            if result.group(1) == 'SMALL': table[c] = table[c].lower()
-
-    return text.translate(str.maketrans(table))
+unicode_to_ascii = translit.Transliterator()
 
 def getGeometry(wktText):
-    ## This may not work if the wktText is preceded with the URI of a coordinate reference system (CRS)    
+    ## the WKT may be preceded with the URI of a coordinate reference system (CRS) in <...>
     types = {'multipoint':geosfNs.MultiPoint,
              'multilinestring':geosfNs.MultiLineString,
              'multipolygon':geosfNs.MultiPolygon,
@@ -40,212 +37,178 @@ def getGeometry(wktText):
              'triangle':geosfNs.Triangle,
              'tin':geosfNs.TIN}
     endCRSURIpos = wktText.find('>')
-    if endCRSURIpos > -1: wktText = wktText[:endCRSURI+1]
+    if endCRSURIpos > -1: wktText = wktText[endCRSURIpos+1:]
     wktText = wktText.strip().lower()
     for t in types:
         if wktText.startswith(t): return types[t]
     return None
 
-geomtypes = {'multipoint':0, 'multilinestring':0, 'multipolygon':0,
-         'geometrycollection':0, 'point':0, 'linestring':0, 'polygon':0,
-         'polyhedralsurface':0, 'triangle':0, 'tin':0}
-
-Token = collections.namedtuple('Token', ['name','value'])
-RuleMatch = collections.namedtuple('RuleMatch', ['name','matched'])
-
-## limited wkt grammar
-## atom : NUM
-## geom : point 
-## point: POINT LPAR atom atom RPAR
-## points : point | point COMMA points
-## linestring : LINESTRING LPAR points RPAR
-
-token_map = { '(':'LPAR', ')':'RPAR', ',':'COMMA', 'POINT':'POINT',
-            'LINESTRING':'LINESTRING', 'POLYGON':'POLYGON',
-            'MULTIPOINT':'MULTIPOINT','MULTILINESTRING':'MULTILINESTRING', 'MULTIPOLYGON':'MULTIPOLYGON'}
-signed_exact_num_pattern = '[-+]?\d*\.?\d+'
-signed_approx_num_pattern = signed_exact_num_pattern + 'E[-+]?\d*'
-escape = (lambda x : '\\'+x if x == '(' or x == ')' else x)
-token_regex_pattern = '|'.join([signed_exact_num_pattern, signed_approx_num_pattern]) +'|' + '|'.join(map(escape,token_map))
-
-rule_map = { 'atom'          : ['NUM'],
-             'pair'          : ['atom atom'],
-             'pairs'         : ['pair COMMA pairs', 'pair'],
-             'geom'          : ['pointtag', 'linestringtag', 'polygontag','multipointtag','multilinestringtag','multipolygontag'],
-             'pointtag'      : ['POINT point'],
-             'point'         : ['LPAR pair RPAR'],
-             'points'        : ['point COMMA points', 'point'],
-             'linestringtag' : ['LINESTRING linestring'],
-             'linestring'    : ['LPAR pairs RPAR'],
-             'linestrings'   : ['linestring COMMA linestrings', 'linestring'],
-             'polygontag'    : ['POLYGON polygon'],
-             'polygon'       : ['LPAR linestrings RPAR'],
-             'polygons'      : ['polygon COMMA polygons', 'polygon'],
-             'multipointtag' : ['MULTIPOINT multipoint'],
-             'multipoint'    : ['LPAR points RPAR'],
-             'multilinestringtag' : ['MULTILINESTRING multilinestring'],
-             'multilinestring' : ['LPAR linestrings RPAR'],
-             'multipolygontag' : ['MULTIPOLYGON multipolygon'],
-             'multipolygon' : ['LPAR polygons RPAR']
-             }
-
-    
-calc_map = { 'NUM' : float,
-             'atom' : lambda x : (list(x))[0],
-             'pair' : lambda x : tuple(x),
-             'pairs' : lambda x : (lambda y : y if len(y)<=1 else [y[0]]+y[2])(list(x)),
-             'geom' : lambda x : (list(x))[0],
-             'pointtag' : lambda x : (list(x))[1],
-             'point' : lambda x : [(list(x))[1]],
-             'points' : lambda x : (lambda y : y if len(y)<=1 else [y[0]]+y[2])(list(x)),
-             'linestringtag' : lambda x : (list(x))[1],
-             'linestring' : lambda x : (list(x))[1],
-             'linestrings' : lambda x : (lambda y : y if len(y)<=1 else [y[0]]+y[2])(list(x)),
-             'polygontag' : lambda x : (list(x))[1],
-             'polygon' : lambda x : (list(x))[1],
-             'polygons' : lambda x : (lambda y : y if len(y)<=1 else [y[0]]+y[2])(list(x)),
-             'multipointtag' : lambda x : (list(x))[1],
-             'multipoint' : lambda x : (list(x))[1],             
-             'multilinestringtag': lambda x : (list(x))[1],
-             'multilinestring' : lambda x : (list(x))[1],
-             'multipolygontag': lambda x : (list(x))[1],
-             'multipolygon' : lambda x : (list(x))[1]} 
-
-def match(rule_name, tokens):
-    '''Credit to Erez at http://blog.erezsh.com/how-to-write-a-calculator-in-70-python-lines-by-writing-a-recursive-descent-parser/ '''
-    if tokens and rule_name == tokens[0].name:      # Match a token?
-        return RuleMatch(tokens[0], tokens[1:])
-    for expansion in rule_map.get(rule_name, ()):   # Match a rule?
-        remaining_tokens = tokens
-        matched_subrules = []
-        for subrule in expansion.split():
-            matched, remaining_tokens = match(subrule, remaining_tokens)
-            if not matched:
-                break   # no such luck. next expansion!
-            matched_subrules.append(matched)
-        else:
-            return RuleMatch(rule_name, matched_subrules), remaining_tokens
-    return None, None   # match not found
-
-def _recurse_tree(tree,func):
-    '''Credit to Erez at http://blog.erezsh.com/how-to-write-a-calculator-in-70-python-lines-by-writing-a-recursive-descent-parser/ '''
-    return map(func, tree.matched) if tree.name in rule_map else tree[1]
-
-def evaluate(tree):
-    '''Credit to Erez at http://blog.erezsh.com/how-to-write-a-calculator-in-70-python-lines-by-writing-a-recursive-descent-parser/ '''
-    solutions = _recurse_tree(tree,evaluate)
-##    print('eval', tree.name, list(solutions), str(solutions), calc_map.get(tree.name, lambda x:x))
-    return calc_map.get(tree.name, lambda x:x)(solutions)
-
-tokenizer = re.compile(token_regex_pattern, flags=re.IGNORECASE)
 def getPoints(expr):
-    split_expr = tokenizer.findall(expr)
-    tokens = [Token(token_map.get(x, 'NUM'), x) for x in split_expr]    
-    tree = match('geom', tokens)[0]
-##    print(tokens)
-##    print(tree)    
-    sol = evaluate(tree)
-    return sol
-
-def getCentroid(wktText):    
-    if wktText.strip() == '': return RuntimeError
-
-    wkt = wktText
-##    if (not wkt.startswith('POINT')) and (not wkt.startswith('LINESTRING')) and (not wkt.startswith('POLYGON')):
-##        print(wkt) 
-    points = getPoints(wkt)
-##    if (not wkt.startswith('POINT')) and (not wkt.startswith('LINESTRING')) and (not wkt.startswith('POLYGON')):
-##        print(points)
-    points = flatten(points)
-    acc = itertools.accumulate(points, lambda p,q : (p[0] + q[0], p[1]+q[1]))
-    sumpoint = list(acc)[-1]
-    centroid = (sumpoint[0]/len(points), sumpoint[1]/len(points))
-##    print(points, centroid)
-    return centroid
-
-
-def flatten(xs):
-    if xs == [] or isinstance(xs[0],tuple):
-        return xs
-    else:
-        return flatten(xs[0]) + flatten(xs[1:])
-        
-    
+    return wkt.parse(expr)
 
 gebcoURI = 'http://www.gebco.net/data_and_products/undersea_feature_names/'
 
-def run(fname):
-    g = Graph()
+prefixes = {'rdf':RDF, 'rdfs':RDFS, 'dcterms':DCTERMS, 'glview':glview,
+            'data_gebco':featureNs, 'glvoc_gebco':featuretypeNs,
+            'geosparql':geosparqlNs, 'geosf':geosfNs}
+
+def readRows(fname, chunksize=1000, parse=getPoints, metrics=None):
+    """Yields (row dict, centroid, ASCII base name, parsed primary geometry) for
+    each CSV row; centroids and base names are computed one chunk at a time.
+    Geometries are parsed with `parse`, e.g. geomcache.GeometryCache.get.
+    Reading, parsing and the per-chunk work are timed as the fetch, parse
+    and transform stages of `metrics`."""
+    if metrics is None: metrics = Metrics()
     with open(fname, newline='', encoding='utf-8') as csvfile:
         spamreader = csv.reader(csvfile, delimiter=',', quotechar='"')
         ## headers1 = [ str(c.encode(encoding='ascii', errors='xmlcharrefreplace')) for c in next(spamreader) ]
         headers = next(spamreader)
-        dct = {}
-        for h in headers:
-            dct[h] = ''
-        uridict = {}
-        count = 0
-        for row in spamreader:
-            count += 1
-            ## line = [ str(c.encode(encoding='ascii', errors='xmlcharrefreplace')) for c in row ]            
-            for h,i in zip(headers, row):
-                dct[h] = i
-            label = dct['Specific Term'] + ' ' + dct['Generic Term']
-            if label not in uridict: uridict[label] = 1
-            else: uridict[label] += 1
-            baseName = label.replace(' ', '_') ##+ '_' + str(uridict[label])            
-            
-            centroid = getCentroid(dct['Coordinates'])
-            print(label, centroid, centroid.__class__.__name__)
-            
-            xx = str(round(centroid[0],2))
-            yy = str(round(centroid[1],2))
-            baseName = unicode_to_ascii(baseName) + '_' + xx.replace('.','_') + '_' + yy.replace('.','_')
-            print(baseName)
-            featureURI = featureNs[baseName]
-            theClass = featuretypeNs[dct['Generic Term'].replace(' ', '_')]
-            g.add( (featureURI, RDF.type, theClass) )
-            g.add( (featureURI, RDF.type, glview.Feature) )
-            g.add( (featureURI, glview.hasFeatureType, theClass) )
-            g.add( (featureURI, RDFS.label, Literal(label)) )
-            g.add( (featureURI, RDFS.seeAlso, URIRef(gebcoURI)) )
-##            if dct['Origin of Name'] != '':
-##                g.add( (featureURI, DCTERMS.description, Literal(dct['Origin of Name'])) )
-##            if dct['Additional Information'] != '':
-##                g.add( (featureURI, DCTERMS.description, Literal(dct['Additional Information'])) )
-            if dct['Coordinates'] != '':
-                geom = baseName + '_geom1'
-                geomURI = featureNs[geom]
-                wkt = dct['Coordinates']
-                g.add( (featureURI, geosparqlNs.hasGeometry, geomURI) )
-                g.add( (geomURI, RDF.type, getGeometry(wkt)) )
-                g.add( (geomURI, geosparqlNs.asWKT, Literal(wkt, datatype=geosparqlNs.wktLiteral)) )
-            if dct['Secondary Coordinates'] != '':
-                geom = baseName + '_geom2'
-                geomURI = featureNs[geom]
-                wkt = dct['Secondary Coordinates']
-                g.add( (featureURI, geosparqlNs.hasGeometry, geomURI) )
-                g.add( (geomURI, RDF.type, getGeometry(wkt)) )
-                g.add( (geomURI, geosparqlNs.asWKT, Literal(wkt, datatype=geosparqlNs.wktLiteral)) )
-        g.bind('rdf', RDF)
-        g.bind('rdfs', RDFS)        
-        g.bind('dcterms', DCTERMS)
-        g.bind('glview', glview)
-        g.bind('data_gebco', featureNs)
-        g.bind('glvoc_gebco', featuretypeNs)        
-        g.bind('geosparql', geosparqlNs)
-        g.bind('geosf', geosfNs)
+        coordcol = headers.index('Coordinates')
+        while True:
+            with metrics.stage('fetch'):
+                rows = list(itertools.islice(spamreader, chunksize))
+            if not rows: break
+            with metrics.stage('parse'):
+                geoms = [parse(row[coordcol]) if len(row) > coordcol and row[coordcol].strip() != '' else None for row in rows]
+            with metrics.stage('transform'):
+                ## centroids of the whole chunk in one vectorized call; the URIs are minted from them
+                centroids = geometry.centroids(geometry.batch(geoms))
+                dcts = []
+                for row in rows:
+                    ## line = [ str(c.encode(encoding='ascii', errors='xmlcharrefreplace')) for c in row ]
+                    dct = dict.fromkeys(headers, '')
+                    dct.update(zip(headers, row))
+                    dcts.append(dct)
+                ## transliterate the names of the whole chunk in one call
+                names = unicode_to_ascii.transliterate_all([(dct['Specific Term'] + ' ' + dct['Generic Term']).replace(' ', '_') for dct in dcts])
+            for dct, centroid, name, geom in zip(dcts, centroids.tolist(), names, geoms):
+                yield dct, centroid, name, geom
+
+def rowTriples(dct, centroid, asciiName, geom=None, index=None):
+    """Yields the triples of one row; if a spatialindex.IndexBuilder is given,
+    the row's geometries are added to it under the feature URI."""
+    label = dct['Specific Term'] + ' ' + dct['Generic Term']
+    if dct['Coordinates'].strip() != '':
+        xx = str(round(centroid[0],2))
+        yy = str(round(centroid[1],2))
+        baseName = asciiName + '_' + xx.replace('.','_') + '_' + yy.replace('.','_')
+    else:
+        ## no geometry, hence no centroid to disambiguate the name with
+        baseName = asciiName
+    featureURI = featureNs[baseName]
+    theClass = featuretypeNs[dct['Generic Term'].replace(' ', '_')]
+    yield (featureURI, RDF.type, theClass)
+    yield (featureURI, RDF.type, glview.Feature)
+    yield (featureURI, glview.hasFeatureType, theClass)
+    yield (featureURI, RDFS.label, Literal(label))
+    yield (featureURI, RDFS.seeAlso, URIRef(gebcoURI))
+##    if dct['Origin of Name'] != '':
+##        yield (featureURI, DCTERMS.description, Literal(dct['Origin of Name']))
+##    if dct['Additional Information'] != '':
+##        yield (featureURI, DCTERMS.description, Literal(dct['Additional Information']))
+    if index is not None:
+        index.add(featureURI, geom)
+        if dct['Secondary Coordinates'].strip() != '':
+            index.add(featureURI, dct['Secondary Coordinates'])
+    if dct['Coordinates'] != '':
+        geomURI = featureNs[baseName + '_geom1']
+        wkt = dct['Coordinates']
+        yield (featureURI, geosparqlNs.hasGeometry, geomURI)
+        yield (geomURI, RDF.type, getGeometry(wkt))
+        yield (geomURI, geosparqlNs.asWKT, Literal(wkt, datatype=geosparqlNs.wktLiteral))
+    if dct['Secondary Coordinates'] != '':
+        geomURI = featureNs[baseName + '_geom2']
+        wkt = dct['Secondary Coordinates']
+        yield (featureURI, geosparqlNs.hasGeometry, geomURI)
+        yield (geomURI, RDF.type, getGeometry(wkt))
+        yield (geomURI, geosparqlNs.asWKT, Literal(wkt, datatype=geosparqlNs.wktLiteral))
+
+def run(fname, streamformat=None, progress=500, indexpath=None, cachepath=None, metricspath=None):
+    """Converts the gazetteer CSV to RDF/XML and Turtle next to the input file.
+
+    With streamformat 'nt' or 'ttl' the triples are instead written row by row
+    to a single N-Triples or flat Turtle file, in constant memory.
+    Deriving the triples of each row and adding them to the file or buffer
+    is timed as the write stage; readRows times its own fetch, parse and
+    transform stages, which pause it.
+    With indexpath, a spatial index of the feature geometries is saved there.
+    With cachepath, parsed geometries are read from and added to a
+    geomcache.GeometryCache, so a rerun on the same gazetteer parses nothing.
+    With metricspath, the per-stage metrics (geolink/metrics.py) are saved there."""
+    foutname = fname[:fname.rfind('.')]
+    count = 0
+    metrics = Metrics('gebcofeatures-csvtordf')
+    cache = geomcache.GeometryCache(cachepath) if cachepath else None
+    parse = cache.get if cache is not None else getPoints
+    index = spatialindex.IndexBuilder(parse) if indexpath else None
+    if streamformat:
+        with open(foutname+'.'+streamformat, mode='w', encoding='utf-8') as rdffile:
+            if streamformat == 'nt':
+                writer = serialize.NTriplesWriter(rdffile)
+            else:
+                writer = serialize.TurtleWriter(rdffile, prefixes, group=False)
+            with metrics.stage('write') as st:
+                for dct, centroid, name, geom in readRows(fname, parse=parse, metrics=metrics):
+                    count += 1
+                    for t in rowTriples(dct, centroid, name, geom, index):
+                        writer.add(t)
+                    if count % progress == 0: print(count, 'rows converted')
+        st.triples_out = writer.count
+        st.wrote(foutname+'.'+streamformat)
+        print(writer.count, 'triples from', count, 'rows')
+        print(foutname+'.'+streamformat+' generated')
+    else:
+        g = TripleBuffer()
+        with metrics.stage('write') as st:
+            for dct, centroid, name, geom in readRows(fname, parse=parse, metrics=metrics):
+                count += 1
+                for t in rowTriples(dct, centroid, name, geom, index):
+                    g.add(t)
+                if count % progress == 0: print(count, 'rows converted')
+            st.triples_out = len(g)
         print (len(g))
         print(count)
-        print(geomtypes)
-        foutname = fname[:fname.rfind('.')]
-        with open(foutname+'.rdf', mode='w',encoding='utf-8') as rdffile:            
-            print(g.serialize(format='xml').decode(), file=rdffile)
-        print(foutname+'.rdf generated')
-        with open(foutname+'.ttl', mode='w',encoding='utf-8') as rdffile:            
-            print(g.serialize(format='turtle').decode(), file=rdffile)
-        print(foutname+'.ttl generated')
+        with metrics.stage('serialize') as st:
+            with serialize.Outputs(foutname, ['xml', 'turtle'], prefixes) as out:
+                serialize.write_graph(g, out)
+            st.triples_in = len(g)
+            st.triples_out = out.count * len(out.names)
+            st.wrote(*out.names)
+        for name in out.names:
+            print(name+' generated')
+    metrics.info['rows'] = count
+    if index is not None or cache is not None:
+        with metrics.stage('index'):
+            saveIndex(index, indexpath)
+            saveCache(cache, metrics)
+    if metricspath:
+        metrics.save(metricspath)
+        print(metricspath+' generated')
+
+def saveIndex(index, indexpath):
+    if index is None: return
+    index.build().save(indexpath)
+    print(indexpath+' generated with', len(index.uris), 'geometries')
+
+def saveCache(cache, metrics=None):
+    if cache is None: return
+    cache.save()
+    cache.close()
+    print('geometry cache:', cache.hits, 'hits,', cache.misses, 'parsed,', len(cache), 'cached')
+    if metrics is not None:
+        metrics.info['geometry cache'] = {'hits': cache.hits, 'parsed': cache.misses, 'cached': len(cache)}
        
 if __name__ == '__main__':
-    finput = 'features.csv'    
-    run(finput)    
+    parser = argparse.ArgumentParser(description='Converts the GEBCO gazetteer CSV export to RDF.')
+    parser.add_argument('finput', nargs='?', default='features.csv')
+    parser.add_argument('--stream', choices=['nt', 'ttl'], dest='streamformat',
+                        help='write triples row by row to one N-Triples or flat Turtle file')
+    parser.add_argument('--index', dest='indexpath', metavar='PATH',
+                        help='also save a spatial index of the geometries (.npz, see spatialindex.py)')
+    parser.add_argument('--geomcache', dest='cachepath', metavar='PATH',
+                        help='cache of parsed geometries reused across runs (PATH.bin and PATH.idx.npy)')
+    parser.add_argument('--metrics', dest='metricspath', metavar='PATH',
+                        help='save wall/CPU time, peak RSS, triples and bytes written per stage as JSON')
+    args = parser.parse_args()
+    run(args.finput, args.streamformat, indexpath=args.indexpath, cachepath=args.cachepath,
+        metricspath=args.metricspath)
@@ -1,133 +1,27 @@
-import json
-import urllib.request as req
-import http.client as htclient
-import codecs
+import os
+import sys
+import argparse
 from rdflib import Graph, Literal, BNode, Namespace, RDF, URIRef
 from rdflib.namespace import RDF,RDFS,OWL,XSD,FOAF,DCTERMS
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser
 import re
-import unicodedata
-import collections
-
-
-
-####### WKT Parser #######
-
-Token = collections.namedtuple('Token', ['name','value'])
-RuleMatch = collections.namedtuple('RuleMatch', ['name','matched'])
-
-token_map = { '(':'LPAR', ')':'RPAR', ',':'COMMA', 'POINT':'POINT','LINESTRING':'LINESTRING', 'POLYGON':'POLYGON',
-            'MULTIPOINT':'MULTIPOINT','MULTILINESTRING':'MULTILINESTRING', 'MULTIPOLYGON':'MULTIPOLYGON'}
-signed_exact_num_pattern = '[-+]?\d*\.?\d+'
-signed_approx_num_pattern = signed_exact_num_pattern + 'E[-+]?\d*'
-escape = (lambda x : '\\'+x if x == '(' or x == ')' else x)
-token_regex_pattern = '|'.join([signed_exact_num_pattern, signed_approx_num_pattern]) +'|' + '|'.join(map(escape,token_map))
-
-rule_map = { 'atom'          : ['NUM'],
-             'pair'          : ['atom atom'],
-             'pairs'         : ['pair COMMA pairs', 'pair'],
-             'geom'          : ['pointtag', 'linestringtag', 'polygontag','multipointtag','multilinestringtag','multipolygontag'],
-             'pointtag'      : ['POINT point'],
-             'point'         : ['LPAR pair RPAR'],
-             'points'        : ['point COMMA points', 'point'],
-             'linestringtag' : ['LINESTRING linestring'],
-             'linestring'    : ['LPAR pairs RPAR'],
-             'linestrings'   : ['linestring COMMA linestrings', 'linestring'],
-             'polygontag'    : ['POLYGON polygon'],
-             'polygon'       : ['LPAR linestrings RPAR'],
-             'polygons'      : ['polygon COMMA polygons', 'polygon'],
-             'multipointtag' : ['MULTIPOINT multipoint'],
-             'multipoint'    : ['LPAR points RPAR'],
-             'multilinestringtag' : ['MULTILINESTRING multilinestring'],
-             'multilinestring' : ['LPAR linestrings RPAR'],
-             'multipolygontag' : ['MULTIPOLYGON multipolygon'],
-             'multipolygon' : ['LPAR polygons RPAR']
-             }
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+import wkt
+import translit
+import harvest
+import delta
+import spatialindex
+import geomcache
+from geolink import serialize
+from geolink.triplebuffer import TripleBuffer
+from geolink.metrics import Metrics
 
-    
-def match(rule_name, tokens):
-    '''Credit to Erez at http://blog.erezsh.com/how-to-write-a-calculator-in-70-python-lines-by-writing-a-recursive-descent-parser/ '''
-    if tokens and rule_name == tokens[0].name:      # Match a token?
-        return RuleMatch(tokens[0], tokens[1:])
-    for expansion in rule_map.get(rule_name, ()):   # Match a rule?
-        remaining_tokens = tokens
-        matched_subrules = []
-        for subrule in expansion.split():
-            matched, remaining_tokens = match(subrule, remaining_tokens)
-            if not matched:
-                break   # no such luck. next expansion!
-            matched_subrules.append(matched)
-        else:
-            return RuleMatch(rule_name, matched_subrules), remaining_tokens
-    return None, None   # match not found
-
-def _recurse_tree(tree,func):
-    '''Credit to Erez at http://blog.erezsh.com/how-to-write-a-calculator-in-70-python-lines-by-writing-a-recursive-descent-parser/ '''
-    return map(func, tree.matched) if tree.name in rule_map else tree[1]
-
-tokenizer = re.compile(token_regex_pattern, flags=re.IGNORECASE)
-def parse_wkt(wkt):
-##    print('parse_wkt', wkt)
-    split_expr = tokenizer.findall(wkt)
-    tokens = [Token(token_map.get(x, 'NUM'), x) for x in split_expr]    
-    tree = match('geom', tokens)[0]
-    return tree
-
-
-calc_map = { 'NUM' : float,
-             'atom' : lambda x : (list(x))[0],
-             'pair' : lambda x : tuple(x),
-             'pairs' : lambda x : (lambda y : y if len(y)<=1 else [y[0]]+y[2])(list(x)),
-             'geom' : lambda x : (list(x))[0],
-             'pointtag' : lambda x : (list(x))[1],
-             'point' : lambda x : [(list(x))[1]],
-             'points' : lambda x : (lambda y : y if len(y)<=1 else [y[0]]+y[2])(list(x)),
-             'linestringtag' : lambda x : (list(x))[1],
-             'linestring' : lambda x : (list(x))[1],
-             'linestrings' : lambda x : (lambda y : y if len(y)<=1 else [y[0]]+y[2])(list(x)),
-             'polygontag' : lambda x : (list(x))[1],
-             'polygon' : lambda x : (list(x))[1],
-             'polygons' : lambda x : (lambda y : y if len(y)<=1 else [y[0]]+y[2])(list(x)),
-             'multipointtag' : lambda x : (list(x))[1],
-             'multipoint' : lambda x : (list(x))[1],             
-             'multilinestringtag': lambda x : (list(x))[1],
-             'multilinestring' : lambda x : (list(x))[1],
-             'multipolygontag': lambda x : (list(x))[1],
-             'multipolygon' : lambda x : (list(x))[1]} 
-
-def get_points_evaluate(tree):
-    '''Credit to Erez at http://blog.erezsh.com/how-to-write-a-calculator-in-70-python-lines-by-writing-a-recursive-descent-parser/ '''
-    solutions = _recurse_tree(tree,get_points_evaluate)
-    return calc_map.get(tree.name, lambda x:x)(solutions)
-
-
-get_geom_map = { 'geom' : lambda x: x,
-                 'pointtag': lambda x: geosfNs.Point,
-                 'linestringtag': lambda x: geosfNs.LineString,
-                 'polygontag': lambda x: geosfNs.Polygon,
-                 'multipointtag': lambda x: geosfNs.MultiPoint,
-                 'multilinestringtag': lambda x: geosfNs.MultiLineString,
-                 'multipolygontag': lambda x: geosfNs.MultiPolygon }
-
-def get_geometry_evaluate(tree):
-    solutions = _recurse_tree(tree,get_geometry_evaluate)
-    return get_geom_map.get(tree.name, lambda x:x)(solutions)
-
-### End WKT Parser #######
-
-
-
-
-def unicode_to_ascii(text):
-    table = {'&':'and'}
-    for c in text:
-        n = unicodedata.name(c[0][0])
-        prog = re.compile(r"(CAPITAL|SMALL)\s+LETTER\s+(\w+)\s+\w+")
-        result = prog.search(n)
-        if result != None:
-            table[c] = result.group(2)
-            if result.group(1) == 'SMALL': table[c] = table[c].lower()
-
-    return text.translate(str.maketrans(table))
+
+
+## featureTriples uses `wkt` as a local name for the WKT text
+sniff_type = wkt.sniff_type
+
+unicode_to_ascii = translit.Transliterator({'&':'and'})
 
 featureNs = Namespace('http://data.geolink.org/id/feature/gebco/')
 glview = Namespace('http://schema.geolink.org/dev/view#')
@@ -136,24 +30,122 @@ geosparqlNs = Namespace('http://www.opengis.net/ont/geosparql#')
 geosfNs = Namespace('http://www.opengis.net/ont/sf#')
 geoNs = Namespace('http://www.w3.org/2003/01/geo/wgs84_pos#')
 bibliotext = 'IHO-IOC GEBCO Gazetteer of Undersea Feature Names, www.gebco.net'
-
-def run():
-    gebcoURI = 'http://www.gebco.net/data_and_products/undersea_feature_names/'
-
-    baseuri = 'http://www.ngdc.noaa.gov/gazetteer/rest/feature'
-    requri = baseuri + '?max=5000'
-    print('opening', requri, '...')
-    response = req.urlopen(requri)
-    print('opened')
-    reader = codecs.getreader('utf-8')
-    print('loading JSON raw data ...')
-    jsondata = json.load(reader(response))
-    print('loaded')
-
-##    prettyprint = json.dumps(jsondata, sort_keys=True, indent=3, separators=(',',': '))
-##    print(prettyprint)
+gebcoURI = 'http://www.gebco.net/data_and_products/undersea_feature_names/'
+
+def featureTriples(feature, index=None):
+    """Yields the triples of one gazetteer feature; if a spatialindex.IndexBuilder
+    is given, the parsed geometries are added to it under the feature URI."""
+    feat_name = ' '.join(feature['name'].strip().split())
+    feat_name_in_uri = feat_name.replace(' ', '_')
+    if feature['type']:
+        type_name = feature['type']['name'].strip()
+    else:
+        type_name = ''
+    type_name_in_uri = type_name.replace(' ', '_').strip()
+    feat_id = feature['id']
+    
+    label = ' '.join([feat_name,type_name]).strip()
+##    name_in_uri = '_'.join([feat_name_in_uri,type_name_in_uri, str(feat_id)])
+##    name_in_uri = unicode_to_ascii(name_in_uri)
+    name_in_uri = 'feature'+str(feat_id)
+    featureURI = featureNs[name_in_uri]        
+    if feature['type']:
+        typeURI = featuretypeNs[type_name_in_uri]
+    else:
+        typeURI = glview.Feature
+
+    yield (featureURI, RDF.type, typeURI)
+    yield (featureURI, RDF.type, glview.Feature)
+    yield (featureURI, glview.hasFeatureType, typeURI)
+    yield (featureURI, RDFS.label, Literal(label))
+    yield (featureURI, RDFS.seeAlso, URIRef(gebcoURI))
+    yield (featureURI, DCTERMS.bibliographicCitation, Literal(bibliotext))
+    jsonaddress = harvest.baseuri + '/' + str(feat_id)
+    yield (featureURI, DCTERMS.isVersionOf, URIRef(jsonaddress))
+
+    ## Note that we assume that all wktLiterals use the default coordinate reference system given by the URI:
+    ## <http://www.opengis.net/def/crs/OGC/1.3/CRS84>,        
+    ## The aforementioned URI denotes WGS84 longitude-latitude (Note that long value precedes the lat value)
     
-    g = Graph()
+    if feature['geometry']:
+        geom = name_in_uri + '_geom1'
+        geomURI = featureNs[geom]
+        wkt = feature['geometry']
+        ## the sf: type is read off the leading tag; the coordinates are only parsed for the index
+        sftype = geosfNs[sniff_type(wkt)]
+        if index is not None: index.add(featureURI, wkt)
+        yield (featureURI, geosparqlNs.hasGeometry, geomURI)
+        yield (geomURI, RDF.type, sftype)
+        yield (geomURI, geosparqlNs.asWKT, Literal(wkt, datatype=geosparqlNs.wktLiteral))
+    if feature['secondaryGeometry']:
+        geom = name_in_uri + '_geom2'
+        geomURI = featureNs[geom]
+        wkt = feature['secondaryGeometry']
+        sftype = geosfNs[sniff_type(wkt)]
+        if index is not None: index.add(featureURI, wkt)
+        yield (featureURI, geosparqlNs.hasGeometry, geomURI)
+        yield (geomURI, RDF.type, sftype)
+        yield (geomURI, geosparqlNs.asWKT, Literal(wkt, datatype=geosparqlNs.wktLiteral))
+
+def indexFeature(index, feature):
+    """Adds the geometries of a feature to the index without deriving its triples."""
+    featureURI = featureNs['feature'+str(feature['id'])]
+    for key in ('geometry', 'secondaryGeometry'):
+        if feature[key]: index.add(featureURI, feature[key])
+
+def newIndex(indexpath, cachepath):
+    """Returns (spatial index builder or None, geometry cache or None); the
+    builder parses through the cache, so geometries parsed in an earlier run
+    are read back instead of parsed again."""
+    cache = geomcache.GeometryCache(cachepath) if cachepath else None
+    if not indexpath: return None, cache
+    return spatialindex.IndexBuilder(cache.get if cache is not None else wkt.parse), cache
+
+def saveIndex(index, indexpath, cache=None, metrics=None):
+    if index is None: return
+    with (metrics or Metrics()).stage('index'):
+        index.build().save(indexpath)
+        print(indexpath+' generated with', len(index.uris), 'geometries')
+        if cache is not None:
+            cache.save()
+            cache.close()
+            print('geometry cache:', cache.hits, 'hits,', cache.misses, 'parsed,', len(cache), 'cached')
+            if metrics is not None:
+                metrics.info['geometry cache'] = {'hits': cache.hits, 'parsed': cache.misses, 'cached': len(cache)}
+
+def writeGraph(g, foutname, st):
+    """Writes the triples of g to foutname.rdf and foutname.ttl, grouped by
+    subject, and counts them in the stage st."""
+    with serialize.Outputs(foutname, ['xml', 'turtle'], prefixes) as out:
+        serialize.write_graph(g, out)
+    st.triples_out += out.count * len(out.names)
+    st.wrote(*out.names)
+    return out.names
+
+class BufferSink(object):
+    """Sink of the N-Triples parser that adds the triples to a TripleBuffer."""
+    def __init__(self, g):
+        self.g = g
+    def triple(self, s, p, o):
+        self.g.add((s, p, o))
+
+def readNTriples(path):
+    g = TripleBuffer()
+    with open(path, 'rb') as f:
+        W3CNTriplesParser(BufferSink(g)).parse(f)
+    return g
+
+def finish(metrics, metricspath):
+    if metricspath:
+        metrics.save(metricspath)
+        print(metricspath+' generated')
+
+def run(baseuri=harvest.baseuri, pagesize=500, workers=4, indexpath=None, cachepath=None, metricspath=None):
+    """Harvests all features into features.rdf and features.ttl. Fetching
+    pages, deriving triples and serializing are timed as the fetch,
+    transform and serialize stages; with metricspath they are saved there."""
+    metrics = Metrics('gebcofeatures-restaccess')
+    g = TripleBuffer()
     g.bind('rdf', RDF)
     g.bind('rdfs', RDFS)        
     g.bind('dcterms', DCTERMS)
@@ -163,74 +155,120 @@ def run():
     g.bind('geosparql', geosparqlNs)
     g.bind('geosf', geosfNs)
 
-    print('populating',jsondata['totalCount'],'features to graph ... ')
-
-    for feature in jsondata['items']:    
-        feat_name = ' '.join(feature['name'].strip().split())
-        feat_name_in_uri = feat_name.replace(' ', '_')
-        if feature['type']:
-            type_name = feature['type']['name'].strip()
-        else:
-            type_name = ''
-        type_name_in_uri = type_name.replace(' ', '_').strip()
-        feat_id = feature['id']
-        
-        label = ' '.join([feat_name,type_name]).strip()
-##        name_in_uri = '_'.join([feat_name_in_uri,type_name_in_uri, str(feat_id)])
-##        name_in_uri = unicode_to_ascii(name_in_uri)
-        name_in_uri = 'feature'+str(feat_id)
-        featureURI = featureNs[name_in_uri]        
-        if feature['type']:
-            typeURI = featuretypeNs[type_name_in_uri]
-        else:
-            typeURI = glview.Feature
-##        print(featureURI)        
-
-        g.add( (featureURI, RDF.type, typeURI) )
-        g.add( (featureURI, RDF.type, glview.Feature) )
-        g.add( (featureURI, glview.hasFeatureType, typeURI) )
-        g.add( (featureURI, RDFS.label, Literal(label)) )
-        g.add( (featureURI, RDFS.seeAlso, URIRef(gebcoURI)) )
-        g.add( (featureURI, DCTERMS.bibliographicCitation, Literal(bibliotext)) )
-        jsonaddress = baseuri + '/' + str(feat_id)
-        g.add( (featureURI, DCTERMS.isVersionOf, URIRef(jsonaddress)) )
-
-        ## Note that we assume that all wktLiterals use the default coordinate reference system given by the URI:
-        ## <http://www.opengis.net/def/crs/OGC/1.3/CRS84>,        
-        ## The aforementioned URI denotes WGS84 longitude-latitude (Note that long value precedes the lat value)
-        
-        if feature['geometry']:
-            geom = name_in_uri + '_geom1'
-            geomURI = featureNs[geom]
-            wkt = feature['geometry']
-            wktparsetree = parse_wkt(wkt)
-            geom = get_geometry_evaluate(wktparsetree)
-            sftype = (list(geom))[0]            
-            g.add( (featureURI, geosparqlNs.hasGeometry, geomURI) )
-            g.add( (geomURI, RDF.type, sftype) )
-            g.add( (geomURI, geosparqlNs.asWKT, Literal(wkt, datatype=geosparqlNs.wktLiteral)) )
-        if feature['secondaryGeometry']:
-            geom = name_in_uri + '_geom2'
-            geomURI = featureNs[geom]
-            wkt = feature['secondaryGeometry']
-            wktparsetree = parse_wkt(wkt)
-            geom = get_geometry_evaluate(wktparsetree)
-            sftype = (list(geom))[0]            
-            g.add( (featureURI, geosparqlNs.hasGeometry, geomURI) )
-            g.add( (geomURI, RDF.type, sftype) )
-            g.add( (geomURI, geosparqlNs.asWKT, Literal(wkt, datatype=geosparqlNs.wktLiteral)) )
-
-##    print(g.serialize(format='turtle').decode(encoding='utf-8'))
+    print('harvesting', baseuri, '...')
+    index, cache = newIndex(indexpath, cachepath)
+    count = 0
+    with metrics.stage('transform') as st:
+        for feature in metrics.timed('fetch', harvest.features(baseuri, pagesize, workers)):
+            count += 1
+            for t in featureTriples(feature, index):
+                g.add(t)
+            if count % 1000 == 0: print(count, 'features added to graph')
+        st.triples_out = len(g)
+    print('populated', count, 'features to graph')
+    metrics.info['features'] = count
+
     print('serializing to files..')
     foutname = 'features'
-    with open(foutname+'.rdf', mode='w',encoding='utf-8') as rdffile:            
-        print(g.serialize(format='xml').decode(), file=rdffile)
-    print(foutname+'.rdf generated')
-    with open(foutname+'.ttl', mode='w',encoding='utf-8') as rdffile:            
-        print(g.serialize(format='turtle').decode(), file=rdffile)
-    print(foutname+'.ttl generated')
-
+    with metrics.stage('serialize') as st:
+        st.triples_in = len(g)
+        names = writeGraph(g, foutname, st)
+    for name in names:
+        print(name+' generated')
+    saveIndex(index, indexpath, cache, metrics)
+    finish(metrics, metricspath)
+
+
+prefixes = {'rdf':RDF, 'rdfs':RDFS, 'dcterms':DCTERMS, 'glview':glview,
+            'data_gebco':featureNs, 'glvoc_gebco':featuretypeNs,
+            'geosparql':geosparqlNs, 'geosf':geosfNs}
+
+## subject of a statement line in N-Triples or flat Turtle -> gazetteer feature id
+featureLineRe = re.compile(r'^(?:<' + re.escape(str(featureNs)) + r'|data_gebco:)feature(\d+)(?:_geom\d+)?>?\s')
+
+def lineFeatureId(line):
+    m = featureLineRe.match(line)
+    return m.group(1) if m else None
+
+def runDelta(baseuri=harvest.baseuri, pagesize=500, workers=4, foutname='features', indexpath=None, cachepath=None,
+             metricspath=None):
+    """Brings features.nt (one statement per line) up to date, deriving
+    triples only for features that are new or changed since the last run
+    according to features.manifest.json, then writes features.rdf and
+    features.ttl from it as run() does. A full run leaves features.nt and
+    the manifest alone, so the two modes can alternate.
+
+    The dropped statements are also written to features-removed.nt, and the
+    appended ones to features-added.nt, so that a triplestore can be patched
+    with the same change set. The spatial index, if requested, always covers
+    all features."""
+    metrics = Metrics('gebcofeatures-restaccess --delta')
+    manifestpath = foutname + '.manifest.json'
+    outputs = [foutname+'.nt']
+    manifest = delta.load_manifest(manifestpath, outputs)
+    fresh = not manifest
+    if fresh:
+        print('no previous delta output, rebuilding all features')
+
+    print('harvesting', baseuri, '...')
+    index, cache = newIndex(indexpath, cachepath)
+    hashes = {}
+    triples = {}
+    with metrics.stage('transform') as st:
+        for feature in metrics.timed('fetch', harvest.features(baseuri, pagesize, workers)):
+            fid = str(feature['id'])
+            hashes[fid] = delta.feature_hash(feature)
+            if manifest.get(fid) != hashes[fid]:
+                ## dict.fromkeys drops duplicates, e.g. rdf:type glview:Feature for untyped features
+                triples[fid] = list(dict.fromkeys(featureTriples(feature, index)))
+                st.triples_out += len(triples[fid])
+            elif index is not None:
+                indexFeature(index, feature)
+    added, changed, removed = delta.diff(manifest, hashes)
+    print(len(added), 'new,', len(changed), 'changed,', len(removed), 'removed of', len(hashes), 'features')
+    metrics.info.update([('features', len(hashes)), ('added', len(added)), ('changed', len(changed)),
+                         ('removed', len(removed))])
+
+    drop = changed | removed
+    with metrics.stage('serialize') as st:
+        nremoved, nadded = delta.patch(foutname+'.nt', 'nt', prefixes, lineFeatureId, triples, drop,
+                                       removedpath=foutname+'-removed.nt', fresh=fresh)
+        with open(foutname+'-added.nt', mode='w', encoding='utf-8') as addfile:
+            writer = serialize.NTriplesWriter(addfile)
+            for fid in sorted(triples):
+                for t in triples[fid]:
+                    writer.add(t)
+        delta.save_manifest(hashes, manifestpath, outputs)
+        st.triples_in = nadded
+        st.triples_out = nadded
+        st.wrote(foutname+'.nt', foutname+'-removed.nt', foutname+'-added.nt')
+    print(nremoved, 'statements removed,', nadded, 'added to', foutname+'.nt')
+    with metrics.stage('serialize') as st:
+        g = readNTriples(foutname+'.nt')
+        st.triples_in += len(g)
+        names = writeGraph(g, foutname, st)
+    for name in names:
+        print(name+' generated')
+    saveIndex(index, indexpath, cache, metrics)
+    finish(metrics, metricspath)
 
 
 if __name__ == '__main__':
-    run()    
+    parser = argparse.ArgumentParser(description='Harvests the GEBCO gazetteer REST service into RDF.')
+    parser.add_argument('--baseuri', default=harvest.baseuri, help='feature endpoint to page through')
+    parser.add_argument('--pagesize', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=4, help='maximum number of concurrent requests')
+    parser.add_argument('--delta', action='store_true',
+                        help='only re-derive new, changed and removed features, patch features.nt and write features.rdf/.ttl from it')
+    parser.add_argument('--index', dest='indexpath', metavar='PATH',
+                        help='also save a spatial index of the geometries (.npz, see spatialindex.py)')
+    parser.add_argument('--geomcache', dest='cachepath', metavar='PATH',
+                        help='cache of parsed geometries reused across runs (PATH.bin and PATH.idx.npy)')
+    parser.add_argument('--metrics', dest='metricspath', metavar='PATH',
+                        help='save wall/CPU time, peak RSS, triples and bytes written per stage as JSON')
+    args = parser.parse_args()
+    if args.delta:
+        runDelta(args.baseuri, args.pagesize, args.workers, indexpath=args.indexpath, cachepath=args.cachepath,
+                 metricspath=args.metricspath)
+    else:
+        run(args.baseuri, args.pagesize, args.workers, args.indexpath, args.cachepath, args.metricspath)
@@ -0,0 +1,139 @@
+'''Persistent cache of parsed WKT geometries, keyed by the hash of the text.
+
+Two files are kept side by side:
+
+    <path>.bin      parsed geometries, one record after the other; each record
+                    is four int64 (type code, number of ordinates, rings,
+                    parts) followed by the float64 ordinates and the int64
+                    ring and part offsets, so every field is 8-byte aligned
+    <path>.idx.npy  sorted (sha1 of the WKT text, record offset) pairs
+
+The data file is memory-mapped when the cache is opened and the index is
+loaded into a dict; a lookup returns a wkt.Geometry whose arrays are views on
+the mapped data file, so nothing is parsed or copied. Geometries not yet in the cache
+are parsed with wkt.parse and appended to the files by save().
+
+    cache = GeometryCache('features.geomcache')
+    geom = cache.get(text)
+    ...
+    cache.save()
+    cache.close()
+'''
+import os
+import mmap
+import struct
+import hashlib
+import numpy as np
+
+import wkt
+
+
+type_names = sorted(wkt.sf_types.values())
+type_codes = dict((t, i) for i, t in enumerate(type_names))
+
+## hex digests, since fixed-width byte strings in NumPy drop trailing NUL bytes
+index_dtype = np.dtype([('key', 'S40'), ('offset', '<i8')])
+header = struct.Struct('<4q')
+
+
+def key(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest().encode('ascii')
+
+
+def _record(geom):
+    coords = np.asarray(geom.coords, dtype='<f8')
+    rings = np.asarray(geom.rings, dtype='<i8')
+    parts = np.asarray(geom.parts, dtype='<i8')
+    head = header.pack(type_codes[geom.type], len(coords), len(rings), len(parts))
+    return head + b''.join(a.tobytes() for a in (coords, rings, parts))
+
+
+class GeometryCache(object):
+
+    def __init__(self, path):
+        self.datapath = path + '.bin'
+        self.indexpath = path + '.idx.npy'
+        self.pending = {}       # key -> parsed geometry not yet saved
+        self.hits = self.misses = 0
+        self.data = None
+        self._open()
+
+    def close(self):
+        '''Unmaps the data file. Geometries read from it stay valid: if any
+        are still referenced, the mapping is released when the last is freed.'''
+        if self.data is not None:
+            try:
+                self.data.close()
+            except BufferError:
+                ## exported to the arrays of geometries returned by get()
+                pass
+            self.data = None
+
+    def _open(self):
+        self.close()
+        if os.path.isfile(self.indexpath) and os.path.isfile(self.datapath) and os.path.getsize(self.datapath) > 0:
+            index = np.load(self.indexpath)
+            with open(self.datapath, 'rb') as f:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            index = np.empty(0, dtype=index_dtype)
+        self.index = index
+        self.offsets = dict(zip(index['key'].tolist(), index['offset'].tolist()))
+
+    def __len__(self):
+        return len(self.offsets) + len(self.pending)
+
+    def _read(self, offset):
+        code, ncoords, nrings, nparts = header.unpack_from(self.data, offset)
+        pos = offset + header.size
+        coords = np.frombuffer(self.data, '<f8', ncoords, pos)
+        pos += 8*ncoords
+        rings = np.frombuffer(self.data, '<i8', nrings, pos)
+        pos += 8*nrings
+        parts = np.frombuffer(self.data, '<i8', nparts, pos)
+        return wkt.Geometry(type_names[code], coords, rings, parts)
+
+    def lookup(self, text):
+        '''Returns the cached Geometry for a WKT string, or None.'''
+        k = key(text)
+        if k in self.pending:
+            return self.pending[k]
+        offset = self.offsets.get(k)
+        return None if offset is None else self._read(offset)
+
+    def get(self, text):
+        '''Returns the parsed Geometry of a WKT string, parsing it only if
+        it is not in the cache yet. Raises ValueError like wkt.parse.'''
+        geom = self.lookup(text)
+        if geom is not None:
+            self.hits += 1
+            return geom
+        self.misses += 1
+        geom = wkt.parse(text)
+        self.pending[key(text)] = geom
+        return geom
+
+    def save(self):
+        '''Appends the newly parsed geometries to the cache files.'''
+        if not self.pending:
+            return
+        offset = os.path.getsize(self.datapath) if os.path.isfile(self.datapath) else 0
+        ## a data file without its index (e.g. an interrupted save) is started over
+        if len(self.index) == 0:
+            offset = 0
+        keys = sorted(self.pending)
+        entries = np.empty(len(keys), dtype=index_dtype)
+        with open(self.datapath, 'r+b' if offset else 'wb') as f:
+            f.seek(offset)
+            for i, k in enumerate(keys):
+                rec = _record(self.pending[k])
+                entries[i] = (k, offset)
+                f.write(rec)
+                offset += len(rec)
+        index = np.concatenate([self.index, entries])
+        index.sort(order='key')
+        tmp = self.indexpath[:-len('.npy')] + '.tmp.npy'
+        np.save(tmp, index)
+        os.replace(tmp, self.indexpath)
+        self.pending = {}
+        self._open()
@@ -0,0 +1,159 @@
+'''Paginated, concurrent harvester for the NGDC gazetteer REST endpoint.
+
+The endpoint answers ?max=N&offset=M with a JSON object holding the page
+of features under "items" and the size of the whole gazetteer under
+"totalCount". Pages are requested through a bounded pool of worker
+threads, each response is decoded incrementally from the socket (one
+feature object at a time), and the features are yielded in gazetteer
+order, so at most workers * pagesize features are held in memory.
+
+A request that fails with 429 (too many requests), a 5xx status or a
+dropped connection is retried up to `retries` times with exponential
+backoff (see geolink/retry.py).
+'''
+import json
+import codecs
+import itertools
+import collections
+import urllib.request as req
+import urllib.parse
+import concurrent.futures
+
+from geolink import retry
+
+
+baseuri = 'http://www.ngdc.noaa.gov/gazetteer/rest/feature'
+retries = retry.retries
+backoff = retry.backoff
+
+_decoder = json.JSONDecoder()
+_whitespace = ' \t\n\r'
+
+
+class _Buffer(object):
+    '''Text read from a stream on demand, with a cursor into it.'''
+
+    def __init__(self, stream, chunksize):
+        self.stream = stream
+        self.chunksize = chunksize
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def more(self):
+        '''Drops the consumed text and reads the next chunk; False at end of stream.'''
+        if self.eof: return False
+        chunk = self.stream.read(self.chunksize)
+        if not chunk:
+            self.eof = True
+            return False
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def skip(self):
+        '''Skips whitespace and returns the next character ('' at end of stream).'''
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _whitespace:
+                self.pos += 1
+            if self.pos < len(self.text): return self.text[self.pos]
+            if not self.more(): return ''
+
+    def expect(self, chars):
+        c = self.skip()
+        if c == '' or c not in chars:
+            raise ValueError('malformed JSON: expected one of %r, got %r' % (chars, c))
+        self.pos += 1
+        return c
+
+    def value(self):
+        '''Decodes the next complete JSON value, reading more text as needed.'''
+        self.skip()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.text, self.pos)
+            except ValueError:
+                if not self.more(): raise
+                continue
+            if end == len(self.text) and not self.eof and isinstance(obj, (int, float)):
+                ## a number at the end of the buffer may continue in the next chunk
+                if self.more(): continue
+            self.pos = end
+            return obj
+
+
+def iter_items(stream, meta=None, key='items', chunksize=65536):
+    '''Yields the elements of the top-level array member `key` of the JSON
+    object read from a text stream, decoding one element at a time.
+
+    The other top-level members are stored in the dict `meta` if given.'''
+    buf = _Buffer(stream, chunksize)
+    buf.expect('{')
+    if buf.skip() == '}': return
+    while True:
+        name = buf.value()
+        buf.expect(':')
+        if name == key and buf.skip() == '[':
+            buf.expect('[')
+            if buf.skip() == ']':
+                buf.pos += 1
+            else:
+                while True:
+                    yield buf.value()
+                    if buf.expect(',]') == ']': break
+        else:
+            value = buf.value()
+            if meta is not None: meta[name] = value
+        if buf.expect(',}') == '}': return
+
+
+def page_uri(uri, offset, pagesize):
+    return uri + '?' + urllib.parse.urlencode({'max':pagesize, 'offset':offset})
+
+def fetch_page(uri, offset, pagesize, timeout=60, retries=retries, backoff=backoff):
+    '''Fetches one page, retrying transient errors (see geolink/retry.py);
+    returns (meta dict, list of features).'''
+    def request():
+        meta = {}
+        with req.urlopen(page_uri(uri, offset, pagesize), timeout=timeout) as response:
+            items = list(iter_items(codecs.getreader('utf-8')(response), meta))
+        return meta, items
+    return retry.call(request, retries, backoff)
+
+
+def features(uri=baseuri, pagesize=500, workers=4, timeout=60, retries=retries, backoff=backoff):
+    '''Yields every feature of the gazetteer, in order, paging through the
+    REST endpoint with at most `workers` requests in flight.'''
+    fetch = lambda offset: fetch_page(uri, offset, pagesize, timeout, retries, backoff)
+    meta, items = fetch(0)
+    total = meta.get('totalCount')
+    print('gazetteer reports', total, 'features')
+    firstid = items[0].get('id') if items else None
+    for item in items:
+        yield item
+    if total is None:
+        ## no total announced: read page after page until a short one
+        offset = len(items)
+        while len(items) == pagesize:
+            meta, items = fetch(offset)
+            for item in items:
+                yield item
+            offset += len(items)
+        return
+    if 0 < len(items) < min(pagesize, total):
+        ## the server caps the page size below what was asked for
+        pagesize = len(items)
+    offsets = iter(range(len(items), total, pagesize) if items else ())
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        ## keep at most `workers` pages in flight and consume them in order
+        pending = collections.deque(pool.submit(fetch, offset)
+                                    for offset in itertools.islice(offsets, workers))
+        while pending:
+            meta, items = pending.popleft().result()
+            offset = next(offsets, None)
+            if offset is not None:
+                pending.append(pool.submit(fetch, offset))
+            if items and firstid is not None and items[0].get('id') == firstid:
+                raise RuntimeError('endpoint %s ignores the offset parameter' % uri)
+            for item in items:
+                yield item
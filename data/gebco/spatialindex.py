@@ -0,0 +1,230 @@
+'''Persistent grid index and bbox / radius / nearest-neighbour queries over
+GEBCO feature geometries.
+
+The index keeps the geometries as a geometry.GeometryBatch plus their
+bounding boxes, and a uniform longitude/latitude grid in compressed sparse
+row form (cell -> geometries whose bbox touches the cell). It is saved as a
+NumPy .npz file. Distances are great-circle distances in km to the nearest
+vertex of a geometry.
+
+A geometry whose vertices fit in a narrower longitude interval across the
+antimeridian than without crossing it (e.g. LINESTRING (179 0, -179 0)) is
+taken to cross it: its bbox wraps, with minx > maxx like a query box
+across the antimeridian, and the grid holds it in the cells of both halves,
+split at +/-180. So it is not returned by every bbox query, as it would be
+with a bbox from -179 to 179.
+
+    python3 spatialindex.py features.idx.npz bbox -30 -60 -10 -40
+    python3 spatialindex.py features.idx.npz radius -25.5 -52.1 100
+    python3 spatialindex.py features.idx.npz nearest -25.5 -52.1 5
+'''
+import sys
+import time
+import argparse
+import numpy as np
+
+import wkt
+import geometry
+
+
+half_circumference_km = np.pi * geometry.earth_radius_km
+km_per_degree = half_circumference_km / 180
+
+
+def wrap_bboxes(batch, bboxes):
+    '''Returns bboxes with the longitude interval of each geometry that
+    crosses the antimeridian wrapped (minx > maxx).'''
+    bboxes = bboxes.copy()
+    f = batch.features
+    ## only a geometry spanning more than 180 degrees can be narrower across the antimeridian
+    for i in np.flatnonzero(bboxes[:, 2] - bboxes[:, 0] > 180):
+        lon = np.sort(batch.coords[f[i]:f[i+1], 0])
+        gaps = np.diff(lon)
+        j = np.argmax(gaps)
+        if gaps[j] > 360 - (lon[-1] - lon[0]):
+            bboxes[i, 0], bboxes[i, 2] = lon[j + 1], lon[j]
+    return bboxes
+
+
+class IndexBuilder(object):
+    '''Collects (feature URI, parsed geometry) pairs while a pipeline runs.
+    WKT strings are parsed with `parse`, e.g. geomcache.GeometryCache.get.'''
+
+    def __init__(self, parse=wkt.parse):
+        self.uris = []
+        self.geoms = []
+        self.parse = parse
+
+    def add(self, uri, geom):
+        if geom is None: return
+        if isinstance(geom, str):
+            geom = self.parse(geom)
+        self.uris.append(str(uri))
+        self.geoms.append(geom)
+
+    def build(self, cellsize=1.0):
+        return SpatialIndex(self.uris, geometry.batch(self.geoms), cellsize)
+
+
+class SpatialIndex(object):
+
+    def __init__(self, uris, batch, cellsize=1.0, bboxes=None, cells=None):
+        self.uris = np.asarray(uris, dtype=str)
+        self.batch = batch
+        self.cellsize = float(cellsize)
+        self.nx = int(np.ceil(360 / self.cellsize))
+        self.ny = int(np.ceil(180 / self.cellsize))
+        self.bboxes = wrap_bboxes(batch, geometry.bboxes(batch)) if bboxes is None else bboxes
+        if cells is None:
+            cells = self._grid()
+        self.cellstart, self.cellitems = cells
+
+    def _cellrange(self, minx, miny, maxx, maxy):
+        x0 = np.clip(np.floor((minx + 180) / self.cellsize), 0, self.nx - 1).astype(np.int64)
+        x1 = np.clip(np.floor((maxx + 180) / self.cellsize), 0, self.nx - 1).astype(np.int64)
+        y0 = np.clip(np.floor((miny + 90) / self.cellsize), 0, self.ny - 1).astype(np.int64)
+        y1 = np.clip(np.floor((maxy + 90) / self.cellsize), 0, self.ny - 1).astype(np.int64)
+        return x0, y0, x1, y1
+
+    def _grid(self):
+        valid = ~np.isnan(self.bboxes[:, 0])
+        items = np.nonzero(valid)[0]
+        b = self.bboxes[valid]
+        ## a wrapped bbox is entered as its halves east and west of the antimeridian
+        wrapped = b[:, 0] > b[:, 2]
+        items = np.concatenate([items, items[wrapped]])
+        minx = np.concatenate([b[:, 0], np.full(wrapped.sum(), -180.0)])
+        maxx = np.concatenate([np.where(wrapped, 180.0, b[:, 2]), b[wrapped, 2]])
+        miny = np.concatenate([b[:, 1], b[wrapped, 1]])
+        maxy = np.concatenate([b[:, 3], b[wrapped, 3]])
+        x0, y0, x1, y1 = self._cellrange(minx, miny, maxx, maxy)
+        width = x1 - x0 + 1
+        n = width * (y1 - y0 + 1)
+        ## one (cell, geometry) pair per cell covered by each bbox, without a Python loop
+        first = np.concatenate([[0], np.cumsum(n)[:-1]])
+        owner = np.repeat(np.arange(len(items)), n)
+        j = np.arange(n.sum()) - first[owner]
+        cell = (y0[owner] + j // width[owner]) * self.nx + x0[owner] + j % width[owner]
+        order = np.argsort(cell, kind='stable')
+        cellitems = items[owner[order]]
+        counts = np.bincount(cell, minlength=self.nx * self.ny)
+        cellstart = np.concatenate([[0], np.cumsum(counts)])
+        return cellstart, cellitems
+
+    def save(self, path):
+        b = self.batch
+        np.savez_compressed(path, uris=self.uris, coords=b.coords, features=b.features, rings=b.rings,
+                            bboxes=self.bboxes, cellsize=self.cellsize,
+                            cellstart=self.cellstart, cellitems=self.cellitems)
+
+    @classmethod
+    def load(cls, path):
+        d = np.load(path)
+        batch = geometry.GeometryBatch(d['coords'], d['features'], d['rings'])
+        return cls(d['uris'], batch, float(d['cellsize']), d['bboxes'], (d['cellstart'], d['cellitems']))
+
+    def _candidates(self, minx, miny, maxx, maxy):
+        '''Indexes of geometries whose bbox intersects the query box.'''
+        if minx > maxx:
+            ## box across the antimeridian
+            return np.union1d(self._candidates(minx, miny, 180, maxy), self._candidates(-180, miny, maxx, maxy))
+        x0, y0, x1, y1 = self._cellrange(minx, miny, maxx, maxy)
+        rows = np.arange(y0, y1 + 1)[:, None] * self.nx
+        cells = (rows + np.arange(x0, x1 + 1)[None, :]).ravel()
+        starts = self.cellstart[cells]
+        ends = self.cellstart[cells + 1]
+        n = ends - starts
+        if n.sum() == 0:
+            return np.empty(0, dtype=np.int64)
+        idx = np.repeat(starts - np.concatenate([[0], np.cumsum(n)[:-1]]), n) + np.arange(n.sum())
+        cand = np.unique(self.cellitems[idx])
+        b = self.bboxes[cand]
+        ## a wrapped bbox intersects the box if either of its halves does
+        xhit = np.where(b[:, 0] > b[:, 2], (b[:, 0] <= maxx) | (b[:, 2] >= minx),
+                        (b[:, 0] <= maxx) & (b[:, 2] >= minx))
+        hit = xhit & (b[:, 1] <= maxy) & (b[:, 3] >= miny)
+        return cand[hit]
+
+    def _distances(self, items, lon, lat):
+        '''Distance in km from (lon, lat) to the nearest vertex of each geometry.'''
+        if len(items) == 0:
+            return np.empty(0)
+        f = self.batch.features
+        n = f[items + 1] - f[items]
+        first = np.concatenate([[0], np.cumsum(n)[:-1]])
+        idx = np.repeat(f[items] - first, n) + np.arange(n.sum())
+        c = np.radians(self.batch.coords[idx])
+        lon, lat = np.radians(lon), np.radians(lat)
+        h = np.sin((c[:, 1] - lat)/2)**2 + np.cos(lat) * np.cos(c[:, 1]) * np.sin((c[:, 0] - lon)/2)**2
+        d = 2 * geometry.earth_radius_km * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+        return np.minimum.reduceat(d, first)
+
+    def _by_feature(self, items, dists):
+        '''(uri, distance) pairs sorted by distance, one per feature URI.'''
+        result = []
+        seen = set()
+        for i in np.argsort(dists, kind='stable'):
+            uri = self.uris[items[i]]
+            if uri not in seen:
+                seen.add(uri)
+                result.append((str(uri), float(dists[i])))
+        return result
+
+    def bbox(self, minx, miny, maxx, maxy):
+        '''URIs of the features whose geometry bbox intersects the box
+        (minx > maxx denotes a box across the antimeridian).'''
+        return list(dict.fromkeys(str(u) for u in self.uris[self._candidates(minx, miny, maxx, maxy)]))
+
+    def radius(self, lon, lat, km):
+        '''(uri, km) of the features with a vertex within km of the point, nearest first.'''
+        dlat = km / km_per_degree
+        miny, maxy = max(lat - dlat, -90), min(lat + dlat, 90)
+        coslat = min(np.cos(np.radians(miny)), np.cos(np.radians(maxy)))
+        if miny == -90 or maxy == 90 or dlat / max(coslat, 1e-9) >= 180:
+            items = self._candidates(-180, miny, 180, maxy)
+        else:
+            dlon = dlat / coslat
+            minx = (lon - dlon + 180) % 360 - 180
+            maxx = (lon + dlon + 180) % 360 - 180
+            items = self._candidates(minx, miny, maxx, maxy)
+        dists = self._distances(items, lon, lat)
+        keep = dists <= km
+        return self._by_feature(items[keep], dists[keep])
+
+    def nearest(self, lon, lat, k=1):
+        '''(uri, km) of the k features nearest to the point.'''
+        km = self.cellsize * km_per_degree
+        while True:
+            result = self.radius(lon, lat, km)
+            if len(result) >= k or km >= half_circumference_km:
+                return result[:k]
+            km *= 2
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Queries a GEBCO feature spatial index.')
+    parser.add_argument('index', help='.npz file written with --index by the GEBCO scripts')
+    sub = parser.add_subparsers(dest='query')
+    q = sub.add_parser('bbox', help='features intersecting a lon/lat box')
+    for a in ('minx', 'miny', 'maxx', 'maxy'): q.add_argument(a, type=float)
+    q = sub.add_parser('radius', help='features within a distance (km) of a point')
+    for a in ('lon', 'lat', 'km'): q.add_argument(a, type=float)
+    q = sub.add_parser('nearest', help='k nearest features to a point')
+    for a in ('lon', 'lat'): q.add_argument(a, type=float)
+    q.add_argument('k', type=int, nargs='?', default=1)
+    args = parser.parse_args()
+    if not args.query:
+        parser.error('a query is required')
+
+    index = SpatialIndex.load(args.index)
+    start = time.perf_counter()
+    if args.query == 'bbox':
+        result = [(uri, None) for uri in index.bbox(args.minx, args.miny, args.maxx, args.maxy)]
+    elif args.query == 'radius':
+        result = index.radius(args.lon, args.lat, args.km)
+    else:
+        result = index.nearest(args.lon, args.lat, args.k)
+    elapsed = time.perf_counter() - start
+    for uri, km in result:
+        print(uri if km is None else '%s\t%.1f km' % (uri, km))
+    print('%d features in %.2f ms' % (len(result), elapsed * 1000), file=sys.stderr)
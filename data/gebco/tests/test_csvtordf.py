@@ -0,0 +1,39 @@
+'''Tests of the geometry typing of gebcofeatures-csvtordf.py.
+
+    python3 -m pytest data/gebco/tests
+'''
+import os
+import sys
+import unittest
+import importlib.util
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+
+spec = importlib.util.spec_from_file_location('csvtordf', os.path.join(os.path.dirname(here), 'gebcofeatures-csvtordf.py'))
+csvtordf = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(csvtordf)
+
+sf = csvtordf.geosfNs
+
+
+class GetGeometryTest(unittest.TestCase):
+
+    def test_types(self):
+        self.assertEqual(csvtordf.getGeometry('POINT (1 2)'), sf.Point)
+        self.assertEqual(csvtordf.getGeometry(' multipoint (1 2, 3 4)'), sf.MultiPoint)
+        self.assertEqual(csvtordf.getGeometry('POLYGON ((0 0, 1 0, 0 1, 0 0))'), sf.Polygon)
+        self.assertEqual(csvtordf.getGeometry('MULTIPOLYGON (((0 0, 1 0, 0 1, 0 0)))'), sf.MultiPolygon)
+
+    def test_crs(self):
+        ## the CRS URI is skipped, not taken for the geometry
+        crs = '<http://www.opengis.net/def/crs/OGC/1.3/CRS84> '
+        self.assertEqual(csvtordf.getGeometry(crs + 'LINESTRING (0 0, 1 1)'), sf.LineString)
+        self.assertEqual(csvtordf.getGeometry(crs + 'MULTILINESTRING ((0 0, 1 1))'), sf.MultiLineString)
+
+    def test_unknown(self):
+        self.assertIsNone(csvtordf.getGeometry('CIRCLE (0 0, 1)'))
+
+
+if __name__ == '__main__':
+    unittest.main()
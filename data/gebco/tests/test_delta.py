@@ -0,0 +1,207 @@
+'''Tests of the delta rebuild (delta.py) and of the delta mode of
+gebcofeatures-restaccess.py against a local stand-in for the gazetteer REST
+endpoint, which serves the features of feature-response.json.
+
+    python3 -m pytest data/gebco/tests
+'''
+import os
+import io
+import sys
+import copy
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+import contextlib
+import urllib.parse
+import importlib.util
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from rdflib import Graph
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+import delta
+
+spec = importlib.util.spec_from_file_location('restaccess', os.path.join(os.path.dirname(here), 'gebcofeatures-restaccess.py'))
+restaccess = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(restaccess)
+
+with open(os.path.join(here, 'feature-response.json'), encoding='utf-8') as f:
+    recorded = json.load(f)
+
+
+def lineid(line):
+    ## test lines start with the feature id: "<id> ..."
+    return line.split(' ', 1)[0].strip('<>') if line.startswith('<') else None
+
+def readLines(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read().splitlines()
+
+
+class PatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'out.nt')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('<1> <p> "a" .\n<2> <p> "b" .\n<2> <q> "b" .\n<3> <p> "c" .\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def triples(self, *values):
+        from rdflib import URIRef, Literal
+        return [(URIRef(fid), URIRef('p'), Literal(v)) for fid, v in values]
+
+    def test_add_change_remove(self):
+        removedpath = os.path.join(self.dir, 'removed.nt')
+        ## 2 changed, 3 removed, 4 added
+        triples = {'2': self.triples(('2', 'B')), '4': self.triples(('4', 'd'))}
+        nremoved, nadded = delta.patch(self.path, 'nt', {}, lineid, triples, {'2', '3'}, removedpath=removedpath)
+        self.assertEqual((nremoved, nadded), (3, 2))
+        self.assertEqual(readLines(self.path), ['<1> <p> "a" .', '<2> <p> "B" .', '<4> <p> "d" .'])
+        self.assertEqual(readLines(removedpath), ['<2> <p> "b" .', '<2> <q> "b" .', '<3> <p> "c" .'])
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+    def test_fresh(self):
+        nremoved, nadded = delta.patch(self.path, 'nt', {}, lineid, {'5': self.triples(('5', 'e'))}, set(), fresh=True)
+        self.assertEqual((nremoved, nadded), (0, 1))
+        self.assertEqual(readLines(self.path), ['<5> <p> "e" .'])
+
+
+class ManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.output = os.path.join(self.dir, 'out.nt')
+        self.path = os.path.join(self.dir, 'out.manifest.json')
+        with open(self.output, 'w') as f:
+            f.write('<1> <p> "a" .\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_trip(self):
+        hashes = {'1': delta.feature_hash({'id': 1}), '2': delta.feature_hash({'id': 2})}
+        delta.save_manifest(hashes, self.path, [self.output])
+        self.assertEqual(delta.load_manifest(self.path, [self.output]), hashes)
+
+    def test_output_changed_or_missing(self):
+        delta.save_manifest({'1': 'x'}, self.path, [self.output])
+        with open(self.output, 'a') as f:
+            f.write('<2> <p> "b" .\n')
+        self.assertEqual(delta.load_manifest(self.path, [self.output]), {})
+        os.remove(self.output)
+        self.assertEqual(delta.load_manifest(self.path, [self.output]), {})
+
+    def test_corrupted(self):
+        for text in ('{"features": {"1": "x"}, "outp', '[]', '{"features": {"1": "x"}}', ''):
+            with open(self.path, 'w') as f:
+                f.write(text)
+            self.assertEqual(delta.load_manifest(self.path, [self.output]), {}, text)
+        self.assertEqual(delta.load_manifest(os.path.join(self.dir, 'missing.json'), [self.output]), {})
+
+    def test_diff(self):
+        added, changed, removed = delta.diff({'1': 'a', '2': 'b', '3': 'c'}, {'1': 'a', '2': 'B', '4': 'd'})
+        self.assertEqual((added, changed, removed), ({'4'}, {'2'}, {'3'}))
+
+    def test_feature_hash(self):
+        self.assertEqual(delta.feature_hash({'a': 1, 'b': [1, 2]}), delta.feature_hash({'b': [1, 2], 'a': 1}))
+        self.assertNotEqual(delta.feature_hash({'a': 1}), delta.feature_hash({'a': 2}))
+
+
+class Handler(BaseHTTPRequestHandler):
+    '''Serves ?max=N&offset=M of the server's `items`.'''
+
+    def do_GET(self):
+        q = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        offset, size = int(q['offset'][0]), int(q['max'][0])
+        items = self.server.items
+        body = json.dumps({'totalCount': len(items), 'items': items[offset:offset + size]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class DeltaRunTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.items = copy.deepcopy(recorded['items'])
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.uri = 'http://127.0.0.1:%d/feature' % self.server.server_port
+        self.dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.dir)
+
+    def convert(self, name, deltamode):
+        path = os.path.join(self.dir, name)
+        os.makedirs(path, exist_ok=True)
+        os.chdir(path)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            if deltamode:
+                restaccess.runDelta(self.uri, pagesize=5, workers=2)
+            else:
+                restaccess.run(self.uri, pagesize=5, workers=2)
+        os.chdir(self.cwd)
+        return out.getvalue()
+
+    def read(self, name, filename):
+        with open(os.path.join(self.dir, name, filename), 'rb') as f:
+            return f.read()
+
+    def assertSameAsFull(self, name):
+        shutil.rmtree(os.path.join(self.dir, 'full'), ignore_errors=True)
+        self.convert('full', False)
+        for filename in ('features.ttl', 'features.rdf'):
+            self.assertEqual(self.read(name, filename), self.read('full', filename), filename)
+        nt = Graph().parse(os.path.join(self.dir, name, 'features.nt'), format='nt')
+        ttl = Graph().parse(os.path.join(self.dir, 'full', 'features.ttl'), format='turtle')
+        self.assertEqual(set(nt), set(ttl))
+        self.assertEqual(len(readLines(os.path.join(self.dir, name, 'features.nt'))), len(nt))
+
+    def test_delta_matches_full_run(self):
+        out = self.convert('delta', True)
+        self.assertIn('rebuilding all features', out)
+        self.assertSameAsFull('delta')
+
+        items = self.server.items
+        items[3]['name'] = 'Renamed ' + items[3]['name']
+        removed = items.pop(7)
+        new = copy.deepcopy(items[0])
+        new['id'] = 99999
+        items.append(new)
+        out = self.convert('delta', True)
+        self.assertIn('1 new, 1 changed, 1 removed', out)
+        self.assertNotIn('rebuilding all features', out)
+        self.assertSameAsFull('delta')
+        removedLines = readLines(os.path.join(self.dir, 'delta', 'features-removed.nt'))
+        self.assertTrue(any('/feature%d>' % removed['id'] in line for line in removedLines))
+        self.assertTrue(any('/feature%d>' % items[3]['id'] in line for line in removedLines))
+        addedLines = readLines(os.path.join(self.dir, 'delta', 'features-added.nt'))
+        self.assertTrue(any('/feature99999>' in line for line in addedLines))
+
+    def test_full_and_delta_runs_alternate(self):
+        self.convert('both', True)
+        self.convert('both', False)
+        self.server.items[0]['name'] = 'Renamed'
+        out = self.convert('both', True)
+        self.assertIn('0 new, 1 changed, 0 removed', out)
+        self.assertSameAsFull('both')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+'''Tests of the on-disk cache of parsed geometries (geomcache.py).
+
+    python3 -m pytest data/gebco/tests
+'''
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+import wkt
+import geomcache
+
+texts = ['POINT (1 2)',
+         'LINESTRING (0 0, 1 1, 2 0)',
+         'POLYGON ((0 0, 1 0, 1 1, 0 0), (0.2 0.2, 0.4 0.2, 0.2 0.4, 0.2 0.2))',
+         'MULTIPOINT (1 2, 3 4)',
+         'MULTIPOLYGON (((0 0, 1 0, 0 1, 0 0)), ((5 5, 6 5, 5 6, 5 5)))']
+
+
+class GeometryCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'features.geomcache')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def assertSameGeometry(self, a, b):
+        self.assertEqual(a.type, b.type)
+        self.assertEqual(list(a.coords), list(b.coords))
+        self.assertEqual(list(a.rings), list(b.rings))
+        self.assertEqual(list(a.parts), list(b.parts))
+
+    def test_round_trip(self):
+        cache = geomcache.GeometryCache(self.path)
+        for text in texts:
+            cache.get(text)
+        cache.save()
+        cache.close()
+
+        cache = geomcache.GeometryCache(self.path)
+        self.assertEqual(len(cache), len(texts))
+        for text in texts:
+            self.assertSameGeometry(cache.get(text), wkt.parse(text))
+        self.assertEqual((cache.hits, cache.misses), (len(texts), 0))
+        self.assertIsNone(cache.lookup('POINT (9 9)'))
+        cache.close()
+
+    def test_hits_and_misses(self):
+        cache = geomcache.GeometryCache(self.path)
+        cache.get(texts[0])
+        cache.get(texts[1])
+        cache.get(texts[0])
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        cache.save()
+        cache.close()
+
+        cache = geomcache.GeometryCache(self.path)
+        cache.get(texts[0])
+        cache.get(texts[2])
+        cache.get(texts[2])
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        cache.save()
+        self.assertEqual(len(cache), 3)
+        cache.close()
+        with self.assertRaises(ValueError):
+            geomcache.GeometryCache(self.path).get('POINT (1)')
+
+    def test_append_and_reopen(self):
+        cache = geomcache.GeometryCache(self.path)
+        cache.get(texts[0])
+        cache.save()
+        geom = cache.get(texts[0])
+        mapped = cache.data
+        cache.get(texts[1])
+        cache.save()
+        ## the geometry read before the save still views the old mapping
+        self.assertIsNot(cache.data, mapped)
+        self.assertSameGeometry(geom, wkt.parse(texts[0]))
+        del geom
+        cache.get(texts[2])
+        mapped = cache.data
+        cache.save()
+        ## nothing views the old mapping any more, so save() unmapped it
+        self.assertTrue(mapped.closed)
+        for text in texts[:3]:
+            self.assertSameGeometry(cache.get(text), wkt.parse(text))
+        cache.close()
+        self.assertIsNone(cache.data)
+
+    def test_interrupted_save_starts_over(self):
+        ## a save that stopped after writing the data file, but before its index
+        with open(self.path + '.bin', 'wb') as f:
+            f.write(b'\x01' * 1000)
+        cache = geomcache.GeometryCache(self.path)
+        self.assertEqual(len(cache), 0)
+        self.assertSameGeometry(cache.get(texts[1]), wkt.parse(texts[1]))
+        self.assertEqual(cache.misses, 1)
+        cache.save()
+        self.assertEqual(os.path.getsize(self.path + '.bin'), len(geomcache._record(wkt.parse(texts[1]))))
+        cache.close()
+
+        cache = geomcache.GeometryCache(self.path)
+        self.assertSameGeometry(cache.get(texts[1]), wkt.parse(texts[1]))
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+'''Tests of the batched centroids, bounding boxes and lengths (geometry.py).
+
+    python3 -m pytest data/gebco/tests
+'''
+import os
+import csv
+import sys
+import itertools
+import unittest
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+import wkt
+import geometry
+
+
+def sequentialCentroid(geom):
+    '''The centroid as the converter computed it before geometry.py: the
+    vertices summed one by one in input order.'''
+    points = wkt.points(geom)
+    sumpoint = list(itertools.accumulate(points, lambda p, q: (p[0] + q[0], p[1] + q[1])))[-1]
+    return (sumpoint[0] / len(points), sumpoint[1] / len(points))
+
+def uriSuffix(centroid):
+    ## as rowTriples in gebcofeatures-csvtordf.py mints the feature URIs
+    return str(round(centroid[0], 2)).replace('.', '_') + '_' + str(round(centroid[1], 2)).replace('.', '_')
+
+
+class CentroidTest(unittest.TestCase):
+
+    def test_gebco_centroid_uris(self):
+        with open(os.path.join(os.path.dirname(here), 'features.csv'), encoding='utf-8') as f:
+            geoms = [wkt.parse(row['Coordinates']) for row in csv.DictReader(f) if row['Coordinates'].strip()]
+        centroids = geometry.centroids(geometry.batch(geoms)).tolist()
+        self.assertEqual([tuple(c) for c in centroids], [sequentialCentroid(g) for g in geoms])
+        self.assertEqual([uriSuffix(c) for c in centroids], [uriSuffix(sequentialCentroid(g)) for g in geoms])
+
+    def test_tie(self):
+        ## 695.825 / 5 only rounds to 139.17 when the longitudes are added in order
+        geom = wkt.parse('LINESTRING (140.1133 18.9533, 139.54 17.9967, 139.1467 17.11, 138.8733 16.5533, 138.1517 15.7217)')
+        centroid = geometry.centroids(geometry.batch([geom]))[0]
+        self.assertEqual(uriSuffix(centroid), uriSuffix(sequentialCentroid(geom)))
+
+    def test_mixed_sizes_and_empty(self):
+        rng = np.random.RandomState(1)
+        geoms = [None]
+        for n in (1, 2, 3, 7, 8, 9, 1000, 5000, 1):
+            xy = rng.uniform(-180, 180, (n, 2))
+            geoms.append(wkt.parse('LINESTRING (%s)' % ', '.join('%r %r' % (x, y) for x, y in xy.tolist())))
+        geoms.append('')
+        centroids = geometry.centroids(geometry.batch(geoms))
+        self.assertTrue(np.isnan(centroids[0]).all() and np.isnan(centroids[-1]).all())
+        self.assertEqual([tuple(c) for c in centroids[1:-1].tolist()], [sequentialCentroid(g) for g in geoms[1:-1]])
+        self.assertEqual(geometry.centroids(geometry.batch([])).shape, (0, 2))
+
+
+class LengthTest(unittest.TestCase):
+
+    def test_points_have_no_length(self):
+        geoms = ['POINT (1 2)', 'MULTIPOINT (1 2, 3 4)', 'MULTIPOINT ((1 2), (3 4))',
+                 'LINESTRING (0 0, 1 0)', 'MULTIPOINT (5 5, 6 6, 7 7)']
+        lengths = geometry.lengths(geometry.batch(geoms))
+        self.assertEqual(list(lengths[[0, 1, 2, 4]]), [0, 0, 0, 0])
+        self.assertAlmostEqual(lengths[3], 111.195, 3)
+
+    def test_rings_are_not_joined(self):
+        square = '(0 0, 1 0, 1 1, 0 1, 0 0)'
+        one, two = geometry.lengths(geometry.batch(['POLYGON (%s)' % square,
+                                                    'MULTIPOLYGON ((%s), ((10 10, 11 10, 11 11, 10 11, 10 10)))' % square]))
+        self.assertGreater(two, 1.9 * one)
+        self.assertLess(two, 2 * one)
+
+
+if __name__ == '__main__':
+    unittest.main()
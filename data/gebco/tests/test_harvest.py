@@ -0,0 +1,132 @@
+'''Tests of harvest.py against a local stand-in for the gazetteer REST
+endpoint, which serves the features of a recorded response
+(feature-response.json) page by page.
+
+    python3 -m pytest data/gebco/tests
+'''
+import os
+import sys
+import json
+import time
+import threading
+import unittest
+import urllib.error
+import urllib.parse
+import importlib.util
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+import harvest
+
+spec = importlib.util.spec_from_file_location('restaccess', os.path.join(os.path.dirname(here), 'gebcofeatures-restaccess.py'))
+restaccess = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(restaccess)
+
+with open(os.path.join(here, 'feature-response.json'), encoding='utf-8') as f:
+    recorded = json.load(f)
+
+
+class Handler(BaseHTTPRequestHandler):
+    '''Serves ?max=N&offset=M from the recorded items. The server's `faults`
+    maps an offset to the statuses to answer with before the page itself.'''
+
+    def do_GET(self):
+        q = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        offset = int(q['offset'][0])
+        size = min(int(q['max'][0]), self.server.cap)
+        with self.server.lock:
+            self.server.requests.append((offset, time.time()))
+            faults = self.server.faults.get(offset)
+            status = faults.pop(0) if faults else 200
+        if status != 200:
+            self.send_response(status)
+            if status == 429:
+                self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+        body = json.dumps({'totalCount': recorded['totalCount'],
+                           'items': recorded['items'][offset:offset + size]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HarvestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.cap = 1000
+        self.server.faults = {}
+        self.server.requests = []
+        self.server.lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.uri = 'http://127.0.0.1:%d/feature' % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def harvest(self, pagesize, workers=3, **kwargs):
+        return list(harvest.features(self.uri, pagesize, workers, timeout=10, **kwargs))
+
+    def offsets(self):
+        return sorted(set(offset for offset, t in self.server.requests))
+
+    def test_pages_in_order(self):
+        items = self.harvest(pagesize=5)
+        self.assertEqual(items, recorded['items'])
+        self.assertEqual(self.offsets(), [0, 5, 10, 15, 20])
+
+    def test_total_count(self):
+        meta, items = harvest.fetch_page(self.uri, 0, 5)
+        self.assertEqual(meta, {'totalCount': 23})
+        self.assertEqual(len(items), 5)
+
+    def test_capped_page_size(self):
+        self.server.cap = 4
+        self.assertEqual(self.harvest(pagesize=10), recorded['items'])
+        self.assertEqual(self.offsets(), [0, 4, 8, 12, 16, 20])
+
+    def test_matches_single_page(self):
+        paged = self.harvest(pagesize=3, workers=4)
+        self.server.requests = []
+        single = self.harvest(pagesize=100)
+        self.assertEqual(self.offsets(), [0])
+        self.assertEqual(paged, single)
+        triples = lambda features: [t for f in features for t in restaccess.featureTriples(f)]
+        self.assertEqual(triples(paged), triples(single))
+
+    def test_retry_with_backoff(self):
+        self.server.faults = {5: [503, 500], 10: [429]}
+        items = self.harvest(pagesize=5, backoff=0.1)
+        self.assertEqual(items, recorded['items'])
+        times = [t for offset, t in self.server.requests if offset == 5]
+        self.assertEqual(len(times), 3)
+        ## waits backoff, then 2 * backoff
+        self.assertGreaterEqual(times[1] - times[0], 0.1)
+        self.assertGreaterEqual(times[2] - times[1], 0.2)
+        ## 429 with Retry-After: 0 is retried at once
+        self.assertEqual(len([1 for offset, t in self.server.requests if offset == 10]), 2)
+
+    def test_gives_up_after_retries(self):
+        self.server.faults = {5: [502] * 5}
+        with self.assertRaises(urllib.error.HTTPError) as cm:
+            self.harvest(pagesize=5, retries=2, backoff=0.01)
+        self.assertEqual(cm.exception.code, 502)
+        self.assertEqual(len([1 for offset, t in self.server.requests if offset == 5]), 3)
+
+    def test_client_errors_are_not_retried(self):
+        self.server.faults = {0: [404]}
+        with self.assertRaises(urllib.error.HTTPError):
+            self.harvest(pagesize=5, backoff=0.01)
+        self.assertEqual(len(self.server.requests), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
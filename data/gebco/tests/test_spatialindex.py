@@ -0,0 +1,124 @@
+'''Tests of the grid spatial index and its queries (spatialindex.py).
+
+    python3 -m pytest data/gebco/tests
+'''
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+import spatialindex
+
+features = [
+    ('point', 'POINT (10 10)'),
+    ('line', 'LINESTRING (20 20, 22 21)'),
+    ('polygon', 'POLYGON ((-30 -60, -10 -60, -10 -40, -30 -40, -30 -60))'),
+    ('pacific', 'LINESTRING (179.5 0, -179.5 0.5)'),
+    ('fiji', 'MULTIPOINT (177 -17, -179.9 -16.5, 178.5 -18)'),
+    ('wide', 'LINESTRING (-100 30, 0 30, 100 30)'),
+    ('near', 'POINT (10.5 10)'),
+]
+
+
+def build(cellsize=1.0):
+    builder = spatialindex.IndexBuilder()
+    for uri, text in features:
+        builder.add(uri, text)
+    builder.add('none', None)
+    return builder.build(cellsize)
+
+
+class BboxTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = build()
+
+    def test_bboxes(self):
+        b = dict(zip(self.index.uris, self.index.bboxes.tolist()))
+        self.assertEqual(b['line'], [20, 20, 22, 21])
+        ## across the antimeridian: minx > maxx
+        self.assertEqual(b['pacific'], [179.5, 0, -179.5, 0.5])
+        self.assertEqual(b['fiji'], [177, -18, -179.9, -16.5])
+        ## spans 200 degrees, but crosses 0 rather than the antimeridian
+        self.assertEqual(b['wide'], [-100, 30, 100, 30])
+
+    def test_bbox_query(self):
+        self.assertEqual(sorted(self.index.bbox(9, 9, 11, 11)), ['near', 'point'])
+        self.assertEqual(self.index.bbox(21, 20.5, 30, 25), ['line'])
+        self.assertEqual(self.index.bbox(-20, -50, -15, -45), ['polygon'])
+        ## edges are inclusive
+        self.assertEqual(self.index.bbox(22, 21, 25, 25), ['line'])
+        self.assertEqual(self.index.bbox(50, 50, 60, 60), [])
+
+    def test_antimeridian_features(self):
+        ## a feature across the antimeridian is not in every box between its ends
+        self.assertEqual(self.index.bbox(0, -5, 10, 5), [])
+        self.assertEqual(self.index.bbox(-50, -20, 50, 5), [])
+        self.assertEqual(self.index.bbox(179, -1, 180, 1), ['pacific'])
+        self.assertEqual(self.index.bbox(-180, -1, -179, 1), ['pacific'])
+        self.assertEqual(self.index.bbox(176, -20, 177.5, -15), ['fiji'])
+        self.assertEqual(self.index.bbox(-179.95, -17, -179.8, -16), ['fiji'])
+        ## a box across the antimeridian
+        self.assertEqual(sorted(self.index.bbox(170, -20, -170, 5)), ['fiji', 'pacific'])
+
+    def test_wide_feature(self):
+        self.assertEqual(self.index.bbox(-50, 25, -40, 35), ['wide'])
+        self.assertEqual(self.index.bbox(170, 25, -170, 35), [])
+
+
+class DistanceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = build()
+
+    def test_radius(self):
+        result = self.index.radius(10, 10, 100)
+        self.assertEqual([uri for uri, km in result], ['point', 'near'])
+        self.assertAlmostEqual(result[0][1], 0, 6)
+        ## 0.5 degrees of longitude at 10 N
+        self.assertAlmostEqual(result[1][1], 0.5 * spatialindex.km_per_degree * np.cos(np.radians(10)), 0)
+        self.assertEqual(self.index.radius(10, 10, 50), [('point', 0.0)])
+
+    def test_radius_across_antimeridian(self):
+        result = self.index.radius(180, 0, 100)
+        self.assertEqual([uri for uri, km in result], ['pacific'])
+        self.assertAlmostEqual(result[0][1], 0.5 * spatialindex.km_per_degree, 0)
+
+    def test_nearest(self):
+        self.assertEqual([uri for uri, km in self.index.nearest(10.4, 10, 2)], ['near', 'point'])
+        self.assertEqual([uri for uri, km in self.index.nearest(-179, 0.2)], ['pacific'])
+        ## the search widens until k features are found
+        self.assertEqual(len(self.index.nearest(0, -89, 5)), 5)
+        self.assertEqual(len(self.index.nearest(0, 0, 100)), len(features))
+
+
+class SaveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_trip(self):
+        index = build(cellsize=5.0)
+        path = os.path.join(self.dir, 'features.idx.npz')
+        index.save(path)
+        loaded = spatialindex.SpatialIndex.load(path)
+        self.assertEqual(loaded.cellsize, 5.0)
+        self.assertEqual(list(loaded.uris), list(index.uris))
+        for name in ('bboxes', 'cellstart', 'cellitems'):
+            self.assertTrue(np.array_equal(getattr(loaded, name), getattr(index, name)), name)
+        for name in ('coords', 'features', 'rings'):
+            self.assertTrue(np.array_equal(getattr(loaded.batch, name), getattr(index.batch, name)), name)
+        self.assertEqual(sorted(loaded.bbox(170, -20, -170, 5)), ['fiji', 'pacific'])
+        self.assertEqual(loaded.radius(10, 10, 100), index.radius(10, 10, 100))
+        self.assertEqual(loaded.nearest(-179, 0.2, 3), index.nearest(-179, 0.2, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
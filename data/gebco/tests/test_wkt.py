@@ -0,0 +1,86 @@
+'''Tests of the WKT parser (wkt.py) on well-formed and malformed input.
+
+    python3 -m pytest data/gebco/tests
+'''
+import os
+import csv
+import sys
+import unittest
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+import wkt
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_well_formed(self):
+        cases = [
+            ('POINT (1 2)', 'Point', [(1, 2)]),
+            ('point(-1.5e1 +.5)', 'Point', [(-15, 0.5)]),
+            ('LINESTRING (0 0, 1 1, 2 0)', 'LineString', [(0, 0), (1, 1), (2, 0)]),
+            ('POLYGON ((0 0, 1 0, 1 1, 0 0), (0.2 0.2, 0.4 0.2, 0.2 0.4, 0.2 0.2))', 'Polygon',
+             [[(0, 0), (1, 0), (1, 1), (0, 0)], [(0.2, 0.2), (0.4, 0.2), (0.2, 0.4), (0.2, 0.2)]]),
+            ('MULTIPOINT (1 2, 3 4)', 'MultiPoint', [[(1, 2), (3, 4)]]),
+            ('MULTIPOINT ((1 2), (3 4))', 'MultiPoint', [[(1, 2)], [(3, 4)]]),
+            ('MULTILINESTRING ((0 0, 1 1), (2 2, 3 3))', 'MultiLineString', [[(0, 0), (1, 1)], [(2, 2), (3, 3)]]),
+            ('MULTIPOLYGON (((0 0, 1 0, 0 1, 0 0)), ((5 5, 6 5, 5 6, 5 5)))', 'MultiPolygon',
+             [[[(0, 0), (1, 0), (0, 1), (0, 0)]], [[(5, 5), (6, 5), (5, 6), (5, 5)]]]),
+            ('POLYGON EMPTY', 'Polygon', []),
+        ]
+        for text, sftype, nested in cases:
+            geom = wkt.parse(text)
+            self.assertEqual(geom.type, sftype, text)
+            self.assertEqual(wkt.to_nested(geom), nested, text)
+
+    def test_parts(self):
+        geom = wkt.parse('MULTIPOLYGON (((0 0, 1 0, 0 1, 0 0), (0.1 0.1, 0.2 0.1, 0.1 0.2, 0.1 0.1)), ((5 5, 6 5, 5 6, 5 5)))')
+        self.assertEqual(list(geom.rings), [0, 4, 8, 12])
+        self.assertEqual(list(geom.parts), [0, 2, 3])
+
+    def test_malformed(self):
+        for text in [
+            '',
+            '(1 2)',
+            'POINT',
+            'POINT 1 2',
+            'POINT (1)',
+            'POINT (1 2 3)',
+            'POINT (1.2.3)',
+            'POINT (1-2)',
+            'POINT ()',
+            'POINT (1 2',
+            'POINT (1 2))',
+            'POINT (1 2) (3 4)',
+            'POINT (1 2), 3 4',
+            'POINT (1 ; 2)',
+            'LINESTRING (0 0 1 1)',
+            'LINESTRING (0 0,, 1 1)',
+            'LINESTRING (0 0, 1 1,)',
+            'LINESTRING (, 0 0, 1 1)',
+            'LINESTRING (0, 0 1, 1)',
+            'LINESTRING (0 0, (1 1))',
+            'LINESTRING ((0 0, 1 1))',
+            'POLYGON (0 0, 1 0, 0 1, 0 0)',
+            'POLYGON ((0 0, 1 0, 0 1, 0 0) (0 0, 1 0, 0 1, 0 0))',
+            'POLYGON ((0 0, 1 0, 0 1, 0 0), 5 5)',
+            'MULTIPOLYGON ((0 0, 1 0, 0 1, 0 0))',
+            'MULTIPOLYGON (((0 0, 1 0, 0 1, 0 0)) ((5 5, 6 5, 5 6, 5 5)))',
+            'POINT EMPTY (1 2)',
+            'POINT (1 EMPTY)',
+            'CIRCLE (1 2, 3)',
+            'POINT (1 2) POINT (3 4)',
+        ]:
+            with self.assertRaises(ValueError, msg=text):
+                wkt.parse(text)
+
+    def test_gebco_features(self):
+        with open(os.path.join(os.path.dirname(here), 'features.csv'), encoding='utf-8') as f:
+            geoms = [row[column] for row in csv.DictReader(f)
+                     for column in ('Coordinates', 'Secondary Coordinates') if row[column].strip()]
+        self.assertGreater(len(geoms), 3000)
+        for text in geoms:
+            self.assertEqual(wkt.parse(text).type, wkt.sniff_type(text))
+
+if __name__ == '__main__':
+    unittest.main()
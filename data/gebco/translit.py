@@ -0,0 +1,61 @@
+'''Transliteration of feature names to ASCII for use in URIs.
+
+A letter whose Unicode name reads "<script> CAPITAL|SMALL LETTER <X> <...>"
+(e.g. LATIN SMALL LETTER E WITH ACUTE) is replaced by X, lower-cased for
+small letters; every other character is kept. The mapping is computed at
+most once per code point and memoized in the table handed to
+str.translate, so converting a name costs one C-level translate call.
+'''
+import re
+import unicodedata
+
+
+_letter_re = re.compile(r"(CAPITAL|SMALL)\s+LETTER\s+(\w+)\s+\w+")
+
+## separator for batch translation; must map to itself
+_sep = '\n'
+
+
+class _Table(dict):
+    '''str.translate table: code point -> replacement, filled on first lookup.'''
+
+    def __missing__(self, cp):
+        try:
+            name = unicodedata.name(chr(cp))
+        except ValueError:
+            name = ''
+        result = _letter_re.search(name)
+        if result is None:
+            value = cp
+        elif result.group(1) == 'SMALL':
+            value = result.group(2).lower()
+        else:
+            value = result.group(2)
+        self[cp] = value
+        return value
+
+
+class Transliterator(object):
+    '''extra maps characters to fixed replacements, e.g. {'&':'and'}.'''
+
+    def __init__(self, extra=None):
+        self.table = _Table()
+        for c, r in (extra or {}).items():
+            self.table[ord(c)] = r
+
+    def __call__(self, text):
+        return text.translate(self.table)
+
+    def transliterate_all(self, texts):
+        '''Transliterates a list of strings with a single translate call.'''
+        texts = list(texts)
+        if any(_sep in t for t in texts):
+            return [self(t) for t in texts]
+        result = _sep.join(texts).translate(self.table).split(_sep)
+        if len(result) != len(texts):
+            ## a replacement introduced the separator; fall back to one call per string
+            return [self(t) for t in texts]
+        return result
+
+
+unicode_to_ascii = Transliterator()
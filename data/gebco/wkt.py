@@ -0,0 +1,153 @@
+'''Linear-time WKT parser shared by the GEBCO feature scripts.
+
+The text is tokenized and parsed in a single pass that keeps an explicit
+stack of open parentheses instead of recursing, so the cost is linear in
+the number of coordinates and long MULTIPOLYGON coastlines cannot hit the
+recursion limit.
+
+A parsed geometry keeps its coordinates in one flat buffer
+(x0, y0, x1, y1, ...) together with two offset arrays:
+
+    rings  point offsets of each coordinate sequence (ring, linestring or
+           point), len(rings) == number of sequences + 1
+    parts  ring offsets of each part (polygon of a multipolygon, linestring
+           of a multilinestring, ...), len(parts) == number of parts + 1
+'''
+import re
+import collections
+from array import array
+
+
+## simple features (sf:) local names, keyed by the upper-case WKT tag
+sf_types = {'POINT':'Point', 'LINESTRING':'LineString', 'POLYGON':'Polygon',
+            'MULTIPOINT':'MultiPoint', 'MULTILINESTRING':'MultiLineString',
+            'MULTIPOLYGON':'MultiPolygon'}
+
+## number of open parentheses at which a part of each geometry type is closed
+part_depth = {'POINT':1, 'LINESTRING':1, 'POLYGON':1,
+              'MULTIPOINT':2, 'MULTILINESTRING':2, 'MULTIPOLYGON':2}
+
+## depths of the parentheses that hold coordinates
+leaf_depths = {'POINT':(1,), 'LINESTRING':(1,), 'POLYGON':(2,),
+               'MULTIPOINT':(1, 2), 'MULTILINESTRING':(2,), 'MULTIPOLYGON':(3,)}
+
+Geometry = collections.namedtuple('Geometry', ['type', 'coords', 'rings', 'parts'])
+
+num_pattern = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+tokenizer = re.compile('(' + num_pattern + r')|([A-Za-z]+)|([(),])|(\S)')
+leading_tag = re.compile(r'\s*([A-Za-z]+)')
+
+
+def _malformed(m, text):
+    return ValueError('malformed WKT at %r (offset %d) in: %.60s' % (m.group(0), m.start(), text))
+
+
+def parse(text):
+    '''Parses a WKT string into a Geometry.
+
+    The token sequence is checked as it is read: each coordinate sequence
+    is `x y [, x y]*`, sequences and parts are separated by commas, and
+    coordinates sit at the nesting depth of the geometry type. Raises
+    ValueError on unsupported or malformed input.'''
+    tag = None
+    coords = array('d')
+    rings = array('l', [0])
+    parts = array('l', [0])
+    stack = []      # len(coords) at each open parenthesis
+    leaf = False    # True while no parenthesis was opened inside the innermost open one
+    prev = None     # the previous token: 'tag', 'num', 'EMPTY', '(', ')' or ','
+    ordinates = 0   # ordinates read of the current point
+    end = -1        # end of the previous number
+    for m in tokenizer.finditer(text):
+        num, word, punct, other = m.groups()
+        if num is not None:
+            if prev == 'num':
+                if ordinates == 2 or m.start() == end:
+                    raise _malformed(m, text)
+                ordinates += 1
+            elif prev in ('(', ',') and leaf:
+                ordinates = 1
+            else:
+                raise _malformed(m, text)
+            coords.append(float(num))
+            end = m.end()
+        elif punct == '(':
+            if tag is None:
+                raise ValueError('no geometry tag in WKT: %.60s' % text)
+            if prev not in ('tag', '(', ',') or leaf and len(coords) > stack[-1]:
+                raise _malformed(m, text)
+            stack.append(len(coords))
+            leaf = True
+        elif punct == ')':
+            if not stack:
+                raise ValueError('unbalanced parentheses in WKT: %.60s' % text)
+            if prev == 'num' and ordinates != 2:
+                raise ValueError('odd number of ordinates in WKT: %.60s' % text)
+            if prev not in ('num', 'EMPTY', ')'):
+                raise _malformed(m, text)
+            depth = len(stack)
+            start = stack.pop()
+            if leaf:
+                if len(coords) > start and depth not in leaf_depths[tag]:
+                    raise ValueError('coordinates nested %d deep in %s WKT: %.60s' % (depth, tag, text))
+                rings.append(len(coords) // 2)
+                leaf = False
+            if depth == part_depth[tag] and parts[-1] != len(rings) - 1:
+                parts.append(len(rings) - 1)
+        elif punct == ',':
+            if not stack or prev not in ('num', 'EMPTY', ')') or prev == 'num' and ordinates != 2:
+                raise _malformed(m, text)
+        elif word is not None:
+            word = word.upper()
+            if tag is None and word in sf_types:
+                tag = word
+                prev = 'tag'
+                continue
+            if word != 'EMPTY':
+                raise ValueError('unsupported WKT token %r in: %.60s' % (word, text))
+            if prev not in ('tag', '(', ','):
+                raise _malformed(m, text)
+        else:
+            raise _malformed(m, text)
+        prev = 'num' if num is not None else word or punct
+    if tag is None:
+        raise ValueError('no geometry tag in WKT: %.60s' % text)
+    if stack:
+        raise ValueError('unbalanced parentheses in WKT: %.60s' % text)
+    if prev == 'tag':
+        raise ValueError('no coordinates or EMPTY in WKT: %.60s' % text)
+    if parts[-1] != len(rings) - 1:
+        ## e.g. MULTIPOINT (1 2, 3 4), where the points are not parenthesized
+        parts.append(len(rings) - 1)
+    return Geometry(sf_types[tag], coords, rings, parts)
+
+
+def sniff_type(text):
+    '''Returns the sf: local name of a WKT string from its leading tag only,
+    without parsing the coordinates.
+
+    Raises ValueError if the text does not start with a supported tag.'''
+    m = leading_tag.match(text)
+    tag = m.group(1).upper() if m else None
+    if tag not in sf_types:
+        raise ValueError('no geometry tag in WKT: %.60s' % text)
+    return sf_types[tag]
+
+
+def points(geom):
+    '''Returns the coordinates of a Geometry as a list of (x, y) tuples.'''
+    c = geom.coords
+    return list(zip(c[0::2], c[1::2]))
+
+
+def to_nested(geom):
+    '''Returns the coordinates of a Geometry nested the way the old
+    recursive-descent evaluator did: a list of pairs for a single
+    sequence, a list of those per ring, and per part for multipolygons.'''
+    pts = points(geom)
+    seqs = [pts[geom.rings[i]:geom.rings[i+1]] for i in range(len(geom.rings) - 1)]
+    if geom.type in ('Point', 'LineString'):
+        return seqs[0] if seqs else []
+    if geom.type == 'MultiPolygon':
+        return [seqs[geom.parts[i]:geom.parts[i+1]] for i in range(len(geom.parts) - 1)]
+    return seqs
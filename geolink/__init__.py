@@ -0,0 +1,5 @@
+'''Shared code for the GeoLink data and vocabulary generators.
+
+The generator scripts under data/ and voc/ are run from their own
+directory; they put the repository root on sys.path to import this package.
+'''
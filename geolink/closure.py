@@ -0,0 +1,243 @@
+'''Transitive closure of a class hierarchy, stored as interval labels.
+
+A Closure is built once from the (child, parent) edges of a hierarchy, e.g.
+rdfs:subClassOf and rdf:type links, and then answers "is a an ancestor of
+d?" without walking the graph:
+
+    closure = Closure(edges)
+    closure.is_ancestor(glbase + 'Instrument', l22member)
+    for d in closure.descendants(l05member): ...
+    closure.save('closure.json')
+
+Labels follow Agrawal, Borgida and Jagadish (1989). A depth-first walk over
+a spanning forest numbers the nodes in post-order, so the descendants of a
+node in the forest are exactly the numbers of the interval [first number of
+its subtree, its own number]. A node reached over a non-tree edge (a second
+parent) adds the child's intervals to the parent's; overlapping and
+adjacent intervals are merged. A node of a tree has a single interval and an
+ancestor test is two comparisons; otherwise it is a binary search over the
+node's few intervals. Nodes on a cycle (e.g. equivalent classes) are
+ancestors of each other and share one number.
+
+Nodes are IRIs as strings; queries accept rdflib terms too.
+'''
+import os
+import json
+import bisect
+
+
+def _merge(intervals):
+    merged = []
+    for lo, hi in sorted(tuple(iv) for iv in intervals):
+        if merged and lo <= merged[-1][1] + 1:
+            if hi > merged[-1][1]:
+                merged[-1][1] = hi
+        else:
+            merged.append([lo, hi])
+    return merged
+
+
+def _components(n, children):
+    '''Strongly connected components of the graph on range(n), Tarjan's
+    algorithm without recursion. Returns (component of each node, number of
+    components).'''
+    index = [None] * n
+    low = [0] * n
+    comp = [None] * n
+    stack, onstack = [], [False] * n
+    counter = ncomps = 0
+    for root in range(n):
+        if index[root] is not None:
+            continue
+        work = [(root, 0)]
+        while work:
+            v, i = work.pop()
+            if i == 0:
+                index[v] = low[v] = counter
+                counter += 1
+                stack.append(v)
+                onstack[v] = True
+            for j in range(i, len(children[v])):
+                w = children[v][j]
+                if index[w] is None:
+                    work.append((v, j + 1))
+                    work.append((w, 0))
+                    break
+                if onstack[w]:
+                    low[v] = min(low[v], index[w])
+            else:
+                if low[v] == index[v]:
+                    while True:
+                        w = stack.pop()
+                        onstack[w] = False
+                        comp[w] = ncomps
+                        if w == v:
+                            break
+                    ncomps += 1
+                if work:
+                    u = work[-1][0]
+                    low[u] = min(low[u], low[v])
+    return comp, ncomps
+
+
+class Closure(object):
+
+    def __init__(self, edges=()):
+        '''edges are (child, parent) pairs.'''
+        self.nodes = []
+        self.ids = {}           # node -> its index in nodes
+        self.parents = []       # node index -> indexes of its parents
+        self.info = {}          # saved with the closure, e.g. what it was built from
+        for child, parent in edges:
+            c, p = self._id(child), self._id(parent)
+            if p not in self.parents[c]:
+                self.parents[c].append(p)
+        self._label()
+
+    def _id(self, node):
+        node = str(node)
+        if node not in self.ids:
+            self.ids[node] = len(self.nodes)
+            self.nodes.append(node)
+            self.parents.append([])
+        return self.ids[node]
+
+    def _label(self):
+        n = len(self.nodes)
+        children = [[] for _ in range(n)]
+        for c, ps in enumerate(self.parents):
+            for p in ps:
+                children[p].append(c)
+        comp, ncomps = _components(n, children)
+        ## the DAG of the components
+        compchildren = [set() for _ in range(ncomps)]
+        hasparent = [False] * ncomps
+        for p in range(n):
+            for c in children[p]:
+                if comp[c] != comp[p]:
+                    compchildren[comp[p]].add(comp[c])
+                    hasparent[comp[c]] = True
+        compchildren = [sorted(cs) for cs in compchildren]
+        ## post-order numbers over a spanning forest; roots first in node order
+        post = [None] * ncomps
+        first = [None] * ncomps
+        order = []
+        counter = 0
+        for root in comp:
+            if hasparent[root] or first[root] is not None:
+                continue
+            first[root] = counter
+            work = [(root, 0)]
+            while work:
+                v, i = work.pop()
+                for j in range(i, len(compchildren[v])):
+                    w = compchildren[v][j]
+                    if first[w] is None:
+                        first[w] = counter
+                        work.append((v, j + 1))
+                        work.append((w, 0))
+                        break
+                else:
+                    post[v] = counter
+                    counter += 1
+                    order.append(v)
+        ## children are numbered before their parents, so their intervals are done
+        self.intervals = [None] * ncomps
+        for v in order:
+            ivs = [(first[v], post[v])]
+            for w in compchildren[v]:
+                ivs.extend(self.intervals[post[w]])
+            self.intervals[post[v]] = _merge(ivs)
+        self.post = [post[comp[v]] for v in range(n)]
+        self._index()
+
+    def _index(self):
+        self.bypost = [[] for _ in self.intervals]
+        for v, p in enumerate(self.post):
+            self.bypost[p].append(v)
+        self.starts = [[lo for lo, hi in ivs] for ivs in self.intervals]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, node):
+        return str(node) in self.ids
+
+    def _reaches(self, a, d):
+        p = self.post[d]
+        ivs = self.intervals[self.post[a]]
+        if len(ivs) == 1:
+            return ivs[0][0] <= p <= ivs[0][1]
+        i = bisect.bisect_right(self.starts[self.post[a]], p) - 1
+        return i >= 0 and p <= ivs[i][1]
+
+    def is_ancestor(self, a, d, proper=True):
+        '''True if d is a (proper, unless proper=False) descendant of a.
+        Unknown nodes are nobody's ancestors or descendants but their own.'''
+        a, d = str(a), str(d)
+        if a == d:
+            return not proper
+        if a not in self.ids or d not in self.ids:
+            return False
+        return self._reaches(self.ids[a], self.ids[d])
+
+    def is_descendant(self, d, a, proper=True):
+        return self.is_ancestor(a, d, proper)
+
+    def descendants(self, a):
+        '''The proper descendants of a, in post-order.'''
+        a = self.ids.get(str(a))
+        if a is None:
+            return
+        for lo, hi in self.intervals[self.post[a]]:
+            for p in range(lo, hi + 1):
+                for v in self.bypost[p]:
+                    if v != a:
+                        yield self.nodes[v]
+
+    def ancestors(self, d):
+        '''The proper ancestors of d.'''
+        d = self.ids.get(str(d))
+        if d is None:
+            return
+        seen = set([d])
+        work = [d]
+        while work:
+            for p in self.parents[work.pop()]:
+                if p not in seen:
+                    seen.add(p)
+                    work.append(p)
+                    yield self.nodes[p]
+
+    def pairs(self):
+        '''Yields (descendant, ancestor) for every proper pair of the closure.'''
+        for node in self.nodes:
+            for d in self.descendants(node):
+                yield (d, node)
+
+    def as_dict(self):
+        return {'nodes': self.nodes, 'parents': self.parents, 'post': self.post,
+                'intervals': [[x for iv in ivs for x in iv] for ivs in self.intervals],
+                'info': self.info}
+
+    @classmethod
+    def from_dict(cls, d):
+        closure = cls()
+        closure.nodes = list(d['nodes'])
+        closure.ids = dict((node, i) for i, node in enumerate(closure.nodes))
+        closure.parents = d['parents']
+        closure.post = d['post']
+        closure.intervals = [[list(ivs[i:i + 2]) for i in range(0, len(ivs), 2)] for ivs in d['intervals']]
+        closure.info = d.get('info', {})
+        closure._index()
+        return closure
+
+    def save(self, path):
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.as_dict(), f, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,116 @@
+'''Persistent cache of parsed RDF source files.
+
+Parsing RDF/XML with rdflib is slow. load() keeps the parsed triples of each
+source file in a pickle under a .graphcache directory next to the source.
+When the source is loaded again it rebuilds the graph from the pickle
+instead of parsing the file again.
+
+A cache entry is valid while the source has the size and modification time
+recorded in it. If only the modification time changed (e.g. after a fresh
+checkout), the SHA-1 of the content decides, and a matching entry is kept
+with the new time.
+
+The pickles are written and read only by this module; do not point it at
+cache directories from untrusted sources.
+'''
+import os
+import pickle
+import hashlib
+from rdflib import Graph
+
+
+version = 1
+cachedirname = '.graphcache'
+
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_path(path, cachedir=None):
+    if cachedir is None:
+        cachedir = os.path.join(os.path.dirname(os.path.abspath(path)), cachedirname)
+    return os.path.join(cachedir, os.path.basename(path) + '.pickle')
+
+
+def _read_header(cpath):
+    try:
+        with open(cpath, 'rb') as f:
+            header = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if not isinstance(header, dict) or header.get('version') != version:
+        return None
+    return header
+
+def _read(cpath):
+    with open(cpath, 'rb') as f:
+        header = pickle.load(f)
+        namespaces = pickle.load(f)
+        triples = pickle.load(f)
+    return header, namespaces, triples
+
+def _write(cpath, header, namespaces, triples):
+    os.makedirs(os.path.dirname(cpath), exist_ok=True)
+    tmp = cpath + '.tmp'
+    with open(tmp, 'wb') as f:
+        for obj in (header, namespaces, triples):
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, cpath)
+
+
+def _graph(namespaces, triples):
+    g = Graph()
+    for prefix, ns in namespaces:
+        g.bind(prefix, ns, override=False)
+    g.addN((s, p, o, g) for s, p, o in triples)
+    return g
+
+
+def _load(path, format, cachedir, stats):
+    '''Returns (namespaces, triples, parsed Graph or None).'''
+    st = os.stat(path)
+    cpath = cache_path(path, cachedir)
+    header = _read_header(cpath)
+    sha1 = None
+    if header is not None and header['size'] == st.st_size:
+        if header['mtime_ns'] != st.st_mtime_ns:
+            sha1 = file_sha1(path)
+            if sha1 != header['sha1']:
+                header = None
+        if header is not None:
+            header, namespaces, triples = _read(cpath)
+            if header['mtime_ns'] != st.st_mtime_ns:
+                header['mtime_ns'] = st.st_mtime_ns
+                _write(cpath, header, namespaces, triples)
+            if stats is not None: stats['hits'] = stats.get('hits', 0) + 1
+            return namespaces, triples, None
+
+    g = Graph()
+    g.parse(path, format=format)
+    header = {'version': version, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+              'sha1': sha1 or file_sha1(path)}
+    namespaces = [(p, str(ns)) for p, ns in g.namespaces()]
+    triples = list(g)
+    _write(cpath, header, namespaces, triples)
+    if stats is not None: stats['misses'] = stats.get('misses', 0) + 1
+    return namespaces, triples, g
+
+
+def load(path, format=None, cachedir=None, stats=None):
+    '''Returns an rdflib Graph of the RDF file at path, from the cache if it
+    is up to date, otherwise parsed (and the cache refreshed).
+
+    If a dict is given as stats, its 'hits' or 'misses' count is incremented.'''
+    namespaces, triples, g = _load(path, format, cachedir, stats)
+    return g if g is not None else _graph(namespaces, triples)
+
+
+def load_triples(path, format=None, cachedir=None, stats=None):
+    '''Like load, but returns the list of (s, p, o) triples without building
+    a Graph, for consumers that make one pass over them.'''
+    return _load(path, format, cachedir, stats)[1]
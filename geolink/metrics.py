@@ -0,0 +1,184 @@
+'''Per-stage metrics of a generator run, saved as one JSON file per run.
+
+    metrics = Metrics('gebcofeatures-csvtordf')
+    with metrics.stage('parse') as st:
+        ...
+        st.triples_out += n
+    metrics.save('csvtordf-metrics.json')
+
+The generators use the stage names fetch, parse, transform, write (adding
+derived triples to a graph or streaming them to a file) and serialize.
+For each stage the file records the wall time, CPU time (user + system),
+peak RSS, triples in and out and bytes written. A stage may be entered
+many times, e.g. once per chunk of input, and its numbers add up. Stages
+nest exclusively: while an inner stage runs the outer one is paused, so
+reading rows inside a transform loop is not counted twice. timed() wraps
+an iterator, so that the time spent in a generator that is consumed inside
+another stage is counted as its own stage.
+
+Peak RSS is the high-water mark of the process while the stage ran. On
+Linux the mark is reset when a stage is entered (/proc/self/clear_refs).
+Elsewhere it is the peak of the process up to the end of the stage.
+
+Also importable from Python 2, for the DataONE formats script.
+'''
+import os
+import sys
+import json
+import time
+import platform
+import collections
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+## stages are listed in this order, others after them in the order first entered
+order = ['fetch', 'parse', 'transform', 'write', 'serialize']
+
+_clock = getattr(time, 'perf_counter', time.time)
+_reset = {'fd': None, 'enabled': sys.platform.startswith('linux')}
+
+
+def cpu_time():
+    t = os.times()
+    return t[0] + t[1]
+
+def peak_rss():
+    '''High-water mark of the resident set size in bytes, or None.'''
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+def reset_peak_rss():
+    '''Resets the high-water mark that peak_rss reports, where the OS allows it.'''
+    if not _reset['enabled']:
+        return
+    try:
+        if _reset['fd'] is None:
+            _reset['fd'] = os.open('/proc/self/clear_refs', os.O_WRONLY)
+        os.write(_reset['fd'], b'5')
+    except (IOError, OSError):
+        _reset['enabled'] = False
+
+
+class Stage(object):
+
+    fields = ['calls', 'wall', 'cpu', 'peak_rss', 'triples_in', 'triples_out', 'bytes_written']
+
+    def __init__(self, name, part=None):
+        self.name = name
+        self.part = part
+        self.calls = 0
+        self.wall = self.cpu = 0.0
+        self.peak_rss = None
+        self.triples_in = self.triples_out = self.bytes_written = 0
+        self._start = None
+
+    def wrote(self, *paths):
+        '''Adds the sizes of files written by the stage.'''
+        for p in paths:
+            self.bytes_written += os.path.getsize(p)
+
+    def _resume(self):
+        reset_peak_rss()
+        self._start = (_clock(), cpu_time())
+
+    def _pause(self):
+        wall, cpu = self._start
+        self.wall += _clock() - wall
+        self.cpu += cpu_time() - cpu
+        rss = peak_rss()
+        if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+            self.peak_rss = rss
+
+    def as_dict(self):
+        d = collections.OrderedDict([('name', self.name)])
+        if self.part is not None:
+            d['part'] = self.part
+        for f in self.fields:
+            d[f] = getattr(self, f)
+        return d
+
+
+class Metrics(object):
+
+    def __init__(self, script=None):
+        self.script = script
+        self.stages = collections.OrderedDict()   # (name, part) -> Stage
+        self.stack = []
+        self.info = collections.OrderedDict()     # other numbers worth keeping, e.g. cache hits
+        self.started = time.time()
+        self._start = (_clock(), cpu_time())
+
+    def get(self, name, part=None):
+        key = (name, part)
+        if key not in self.stages:
+            self.stages[key] = Stage(name, part)
+        return self.stages[key]
+
+    @contextmanager
+    def stage(self, name, part=None):
+        st = self.get(name, part)
+        if self.stack:
+            self.stack[-1]._pause()
+        st.calls += 1
+        st._resume()
+        self.stack.append(st)
+        try:
+            yield st
+        finally:
+            self.stack.pop()._pause()
+            if self.stack:
+                self.stack[-1]._resume()
+
+    def timed(self, name, iterable, part=None):
+        '''Yields the items of iterable, counting the time spent producing
+        them (e.g. by a generator that fetches pages) as the stage `name`.'''
+        it = iter(iterable)
+        while True:
+            with self.stage(name, part):
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+            yield item
+
+    def merge(self, stages):
+        '''Adds stage dicts (from as_dict(), e.g. measured in a worker process).'''
+        for d in stages:
+            st = self.get(d['name'], d.get('part'))
+            for f in Stage.fields:
+                if f == 'peak_rss':
+                    if d[f] is not None and (st.peak_rss is None or d[f] > st.peak_rss):
+                        st.peak_rss = d[f]
+                else:
+                    setattr(st, f, getattr(st, f) + d[f])
+
+    def ordered(self):
+        '''The stages grouped by part, in pipeline order within each part.'''
+        parts = list(collections.OrderedDict.fromkeys(part for name, part in self.stages))
+        rank = lambda name: order.index(name) if name in order else len(order)
+        return [self.stages[k] for k in sorted(self.stages, key=lambda k: (parts.index(k[1]), rank(k[0])))]
+
+    def as_dict(self):
+        wall, cpu = self._start
+        return collections.OrderedDict([
+            ('script', self.script),
+            ('argv', sys.argv[1:]),
+            ('started', time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.started))),
+            ('python', platform.python_version()),
+            ('wall', _clock() - wall),
+            ('cpu', cpu_time() - cpu),
+            ('peak_rss', max([st.peak_rss for st in self.stages.values() if st.peak_rss is not None] + [peak_rss() or 0])),
+            ('stages', [st.as_dict() for st in self.ordered()]),
+            ('info', self.info)])
+
+    def save(self, path):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.as_dict(), f, indent=1)
+        getattr(os, 'replace', os.rename)(tmp, path)
@@ -0,0 +1,171 @@
+'''Export of generator output as gzip-compressed N-Quads for bulk loading.
+
+The triplestore keeps each source in its own named graph under
+http://data.geolink.org/id/ (see data/dataone/queries.sparql). An export
+tags every triple with the graph it is loaded into and writes the quads to
+chunks name-00001.nq.gz, name-00002.nq.gz, ... of at most chunksize bytes
+of N-Quads each (before compression), so a reload can feed the chunks to
+several loader threads instead of reading one huge file:
+
+    with Chunks('nquads', 'dataone', graph_uri('dataone')) as out:
+        for t in triples:
+            out.add(t)
+    manifest = Manifest('nquads')
+    manifest.set('dataone', out.entry(sources))
+    manifest.save()
+
+Blank node labels are scoped to the file a loader reads, so a blank node
+whose statements end up in two chunks would load as two nodes. Blank nodes
+are therefore replaced by skolem IRIs of the graph
+(<graph>/.well-known/genid/<label>, RDF 1.1 section 3.5).
+
+manifest.json lists, for each export, its graph, the source files it was
+made from and every chunk with its number of quads, size and SHA-1; it is
+what loaders read to find the files, and what tells a rerun that an export
+is still up to date.
+'''
+import io
+import os
+import re
+import gzip
+import json
+import time
+from rdflib import URIRef, BNode
+
+from geolink.graphcache import file_sha1
+from geolink.serialize import nt_term
+
+
+base = 'http://data.geolink.org/id/'
+manifestname = 'manifest.json'
+chunkname = '%s-%05d.nq.gz'
+
+
+def graph_uri(name):
+    '''The named graph of a source, e.g. graph_uri('dataone'); full IRIs
+    are returned as they are.'''
+    return name if ':' in name else base + name
+
+
+def chunk_pattern(name):
+    return re.compile('^' + re.escape(name) + r'-\d{5}\.nq\.gz(\.tmp)?$')
+
+
+class Chunks(object):
+    '''Writes triples as quads of one named graph to gzip-compressed chunks,
+    starting a new chunk once the current one holds chunksize bytes. Chunks
+    are written to .tmp files, which close() renames, replacing the chunks of
+    an earlier export of the same name; until then that export is intact.'''
+
+    def __init__(self, outdir, name, graph, chunksize=256 << 20, level=6):
+        self.outdir = outdir
+        self.name = name
+        self.graph = URIRef(graph)
+        self.chunksize = chunksize
+        self.level = level
+        self.genid = str(graph).rstrip('/') + '/.well-known/genid/'
+        self.context = ' ' + nt_term(self.graph) + ' .\n'
+        self.chunks = []        # entries of the complete chunks
+        self.count = 0
+        self.out = None
+        os.makedirs(outdir, exist_ok=True)
+
+    def term(self, term):
+        if isinstance(term, BNode):
+            return '<' + self.genid + term + '>'
+        return nt_term(term)
+
+    def _open(self):
+        self.path = os.path.join(self.outdir, chunkname % (self.name, len(self.chunks) + 1))
+        self.gz = gzip.open(self.path + '.tmp', 'wb', compresslevel=self.level)
+        self.out = io.BufferedWriter(self.gz, 1 << 20)
+        self.size = self.quads = 0
+
+    def _close(self):
+        self.out.close()
+        tmp = self.path + '.tmp'
+        self.chunks.append({'file': os.path.basename(self.path), 'quads': self.quads, 'bytes': self.size,
+                            'compressed': os.path.getsize(tmp), 'sha1': file_sha1(tmp)})
+        self.out = None
+
+    def add(self, triple):
+        s, p, o = triple
+        line = ('%s %s %s%s' % (self.term(s), nt_term(p), self.term(o), self.context)).encode('utf-8')
+        if self.out is not None and self.size + len(line) > self.chunksize:
+            self._close()
+        if self.out is None:
+            self._open()
+        self.out.write(line)
+        self.size += len(line)
+        self.quads += 1
+        self.count += 1
+
+    def close(self):
+        if self.out is not None:
+            self._close()
+        written = set(c['file'] for c in self.chunks)
+        for name in written:
+            path = os.path.join(self.outdir, name)
+            os.replace(path + '.tmp', path)
+        pattern = chunk_pattern(self.name)
+        for name in os.listdir(self.outdir):
+            if pattern.match(name) and name not in written:
+                os.remove(os.path.join(self.outdir, name))
+
+    def abort(self):
+        '''Removes the chunks written so far; an earlier export is left as it is.'''
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+        pattern = chunk_pattern(self.name)
+        for name in os.listdir(self.outdir):
+            if pattern.match(name) and name.endswith('.tmp'):
+                os.remove(os.path.join(self.outdir, name))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def entry(self, sources=(), **info):
+        '''The manifest entry of the export; sources are the paths it was
+        made from, recorded relative to outdir with their SHA-1.'''
+        entry = {'graph': str(self.graph), 'quads': self.count, 'chunks': self.chunks,
+                 'sources': [{'path': os.path.relpath(p, self.outdir), 'sha1': file_sha1(p)} for p in sources]}
+        entry.update(info)
+        return entry
+
+
+class Manifest(object):
+    '''manifest.json of an export directory: export name -> entry.'''
+
+    def __init__(self, outdir):
+        self.path = os.path.join(outdir, manifestname)
+        self.exports = {}
+        if os.path.isfile(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                self.exports = json.load(f)['exports']
+
+    def get(self, name):
+        return self.exports.get(name)
+
+    def set(self, name, entry):
+        self.exports[name] = entry
+
+    def files(self):
+        '''(file, graph) of every chunk, largest first, the order in which
+        to hand them to parallel loaders.'''
+        chunks = [(c['bytes'], c['file'], e['graph']) for e in self.exports.values() for c in e['chunks']]
+        return [(f, g) for size, f, g in sorted(chunks, key=lambda c: (-c[0], c[1]))]
+
+    def save(self):
+        manifest = {'format': 'application/n-quads', 'compression': 'gzip',
+                    'updated': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                    'exports': self.exports, 'load': self.files()}
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(self.path + '.tmp', self.path)
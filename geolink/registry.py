@@ -0,0 +1,143 @@
+'''Persistent registry of minted URIs, kept in SQLite.
+
+A generator that mints URIs for harvested things (e.g. DataONE formats)
+must never change a URI once published, nor mint two for the same thing.
+The registry maps each key (e.g. a format id) to its number and URI:
+
+    registry = Registry('formats-registry.db', ns['ecglvoc_format'], width=3)
+    for record in registry.mint_all([(fmt, {'name': name}) ...]):
+        print(record['uri'])    # only the newly minted ones
+
+Lookups go through the unique index on the key. Numbers come from a
+counter that is incremented in the same transaction as the insert, and
+each transaction takes the write lock up front (BEGIN IMMEDIATE), so
+concurrent runs wait for each other and cannot mint the same number or
+mint twice for one key. The database is in WAL mode with synchronous=FULL:
+once mint_all() returns, the new URIs survive a crash.
+
+Also importable from Python 2, for the DataONE formats script.
+'''
+import json
+import sqlite3
+from contextlib import contextmanager
+
+
+schema = '''
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS minted (
+    idx INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    uri TEXT NOT NULL UNIQUE,
+    data TEXT NOT NULL
+);
+INSERT OR IGNORE INTO meta VALUES ('counter', '0');
+'''
+
+
+class Registry(object):
+
+    def __init__(self, path, base, width=0, timeout=60.0):
+        '''URIs are base + the number, left-padded with zeros to width.'''
+        self.path = path
+        self.base = base
+        self.width = width
+        self.db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.db.text_factory = str
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=FULL')
+        with self.transaction():
+            for statement in schema.split(';'):
+                if statement.strip():
+                    self.db.execute(statement)
+
+    def close(self):
+        self.db.close()
+
+    @contextmanager
+    def transaction(self):
+        '''Holds the write lock until the block ends; commits unless it raises.'''
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            yield self.db
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        self.db.execute('COMMIT')
+
+    def uri(self, idx):
+        return self.base + str(idx).rjust(self.width, '0')
+
+    def meta(self, name, default=None):
+        row = self.db.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, name, value):
+        self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (name, str(value)))
+
+    @property
+    def counter(self):
+        '''The number of the last URI minted.'''
+        return int(self.meta('counter'))
+
+    def _record(self, row):
+        record = json.loads(row[3])
+        record.update(idx=row[0], key=row[1], uri=row[2])
+        return record
+
+    def get(self, key):
+        '''The record of key (its data and idx, key and uri), or None.'''
+        row = self.db.execute('SELECT idx, key, uri, data FROM minted WHERE key = ?', (key,)).fetchone()
+        return self._record(row) if row else None
+
+    def __contains__(self, key):
+        return self.db.execute('SELECT 1 FROM minted WHERE key = ?', (key,)).fetchone() is not None
+
+    def __len__(self):
+        return self.db.execute('SELECT count(*) FROM minted').fetchone()[0]
+
+    def records(self):
+        '''All records in the order they were minted.'''
+        for row in self.db.execute('SELECT idx, key, uri, data FROM minted ORDER BY idx'):
+            yield self._record(row)
+
+    def mint_all(self, items):
+        '''Mints a URI for each (key, data) of items whose key has none yet,
+        in one transaction. data is a dict saved with the record, but only
+        when it is minted. Returns the new records.'''
+        new = []
+        with self.transaction() as db:
+            counter = self.counter
+            for key, data in items:
+                if key in self:
+                    continue
+                counter += 1
+                db.execute('INSERT INTO minted VALUES (?, ?, ?, ?)',
+                           (counter, key, self.uri(counter), json.dumps(data, sort_keys=True)))
+                new.append(self.get(key))
+            self.set_meta('counter', counter)
+        return new
+
+    def mint(self, key, data=None):
+        '''Returns the record of key, minting it if needed.'''
+        self.mint_all([(key, data or {})])
+        return self.get(key)
+
+    def load(self, records, meta=None):
+        '''Fills an empty registry with records minted elsewhere (dicts with
+        idx, key and uri), e.g. from the CSV file it replaces, and sets the
+        meta values in the same transaction. Returns False, loading nothing,
+        if the registry is not empty, e.g. another run loaded it first.'''
+        with self.transaction() as db:
+            if len(self):
+                return False
+            counter = 0
+            for record in records:
+                data = dict((k, v) for k, v in record.items() if k not in ('idx', 'key', 'uri'))
+                idx = int(record['idx'])
+                db.execute('INSERT INTO minted VALUES (?, ?, ?, ?)',
+                           (idx, record['key'], record['uri'], json.dumps(data, sort_keys=True)))
+                counter = max(counter, idx)
+            self.set_meta('counter', counter)
+            for name, value in (meta or {}).items():
+                self.set_meta(name, value)
+        return True
@@ -0,0 +1,48 @@
+'''Retries of HTTP requests that fail transiently, shared by the harvesters.
+
+A request that fails with 429 (too many requests), a 5xx status or a
+dropped connection is retried up to `retries` times, waiting backoff,
+2 * backoff, 4 * backoff, ... seconds in between, or as long as the server
+asks for in a Retry-After header:
+
+    meta, items = retry.call(lambda: fetch(uri, offset), retries=4, backoff=1.0)
+
+Other errors, e.g. 404, are raised at once.
+'''
+import time
+import http.client
+import urllib.error
+
+
+retries = 4
+backoff = 1.0
+
+## errors of urlopen() and of reading the response that may pass
+transient = (urllib.error.URLError, http.client.HTTPException, ConnectionError, TimeoutError)
+
+
+def delay(error, attempt, backoff=backoff):
+    '''Seconds to wait before retrying after error, or None if it is not
+    worth retrying.'''
+    if isinstance(error, urllib.error.HTTPError):
+        if error.code != 429 and error.code < 500:
+            return None
+        after = error.headers.get('Retry-After') if error.headers else None
+        if after and after.strip().isdigit():
+            return float(after)
+    return backoff * 2 ** attempt
+
+
+def call(request, retries=retries, backoff=backoff):
+    '''Returns request(), calling it again after a transient error until it
+    succeeds or has been retried `retries` times.'''
+    attempt = 0
+    while True:
+        try:
+            return request()
+        except transient as e:
+            wait = delay(e, attempt, backoff)
+            if wait is None or attempt >= retries:
+                raise
+            attempt += 1
+        time.sleep(wait)
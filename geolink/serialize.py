@@ -0,0 +1,242 @@
+'''Single-pass, streaming RDF serializers.
+
+Each writer takes triples one at a time and writes them straight to an open
+text file, so no serialized document is ever held in memory:
+
+    NTriplesWriter   one statement per line
+    TurtleWriter     prefixed names; consecutive statements about the same
+                     subject are grouped with ';' and ',' unless group=False,
+                     in which case every statement is on its own line
+    RDFXMLWriter     one rdf:Description per run of statements with the same
+                     subject
+
+Outputs fans one traversal of the triples out to several files, e.g.
+
+    with Outputs('features', ['xml', 'turtle'], prefixes) as out:
+        write_graph(g, out)
+
+where g is an rdflib Graph or a triplebuffer.TripleBuffer.
+'''
+import re
+from xml.sax.saxutils import escape
+from rdflib import URIRef, Literal, BNode
+from rdflib.namespace import RDF
+
+from geolink.triplebuffer import TripleBuffer
+
+
+_nt_escapes = {'\\':'\\\\', '"':'\\"', '\n':'\\n', '\r':'\\r', '\t':'\\t'}
+_nt_escape_re = re.compile(r'[\\"\n\r\t]')
+_iri_escape_re = re.compile(r'[\x00-\x20<>"{}|^`\\]')
+## conservative subsets of the Turtle PN_LOCAL and XML NCName productions
+_ttl_local_re = re.compile(r'^[A-Za-z_][A-Za-z0-9_\-]*$')
+_xml_name_re = re.compile(r'^[A-Za-z_][A-Za-z0-9_.\-]*$')
+_xml_split_re = re.compile(r'^(.*?)([A-Za-z_][A-Za-z0-9_.\-]*)$')
+
+extensions = {'xml':'.rdf', 'turtle':'.ttl', 'nt':'.nt'}
+
+
+def _escape_string(s):
+    return _nt_escape_re.sub(lambda m: _nt_escapes[m.group(0)], s)
+
+def _escape_iri(s):
+    return _iri_escape_re.sub(lambda m: '\\u%04X' % ord(m.group(0)), s)
+
+def _attr(s):
+    return escape(s, {'"':'&quot;'})
+
+
+def nt_term(term):
+    '''Formats an rdflib term in N-Triples syntax (also valid Turtle).'''
+    if isinstance(term, URIRef):
+        return '<' + _escape_iri(term) + '>'
+    if isinstance(term, Literal):
+        s = '"' + _escape_string(term) + '"'
+        if term.language:
+            return s + '@' + term.language
+        if term.datatype:
+            return s + '^^<' + _escape_iri(term.datatype) + '>'
+        return s
+    if isinstance(term, BNode):
+        return '_:' + term
+    raise TypeError('cannot serialize %r' % (term,))
+
+
+def _sorted_prefixes(prefixes):
+    ## longest namespace first, so that nested namespaces get the most specific prefix
+    return sorted(((str(ns), p) for p, ns in (prefixes or {}).items()), key=lambda x: -len(x[0]))
+
+
+class NTriplesWriter(object):
+
+    def __init__(self, out):
+        self.out = out
+        self.count = 0
+
+    def add(self, triple):
+        s, p, o = triple
+        self.out.write('%s %s %s .\n' % (nt_term(s), nt_term(p), nt_term(o)))
+        self.count += 1
+
+    def close(self):
+        pass
+
+
+class TurtleWriter(object):
+    '''prefixes maps prefix names to namespace URIs; header=False skips the
+    @prefix lines, e.g. when appending to an existing flat file.'''
+
+    def __init__(self, out, prefixes=None, group=True, header=True):
+        self.out = out
+        self.group = group
+        self.count = 0
+        self.subject = self.predicate = None
+        self.prefixes = _sorted_prefixes(prefixes)
+        if header:
+            for ns, p in sorted(self.prefixes, key=lambda x: x[1]):
+                out.write('@prefix %s: <%s> .\n' % (p, ns))
+            out.write('\n')
+
+    def term(self, term):
+        if isinstance(term, URIRef):
+            for ns, p in self.prefixes:
+                if term.startswith(ns) and _ttl_local_re.match(term[len(ns):]):
+                    return p + ':' + term[len(ns):]
+        ## literal datatypes are just not abbreviated
+        return nt_term(term)
+
+    def add(self, triple):
+        s, p, o = triple
+        if not self.group:
+            self.out.write('%s %s %s .\n' % (self.term(s), self.term(p), self.term(o)))
+        elif s == self.subject and p == self.predicate:
+            self.out.write(',\n        %s' % self.term(o))
+        elif s == self.subject:
+            self.out.write(' ;\n    %s %s' % (self.term(p), self.term(o)))
+        else:
+            if self.subject is not None: self.out.write(' .\n\n')
+            self.out.write('%s %s %s' % (self.term(s), self.term(p), self.term(o)))
+        self.subject, self.predicate = s, p
+        self.count += 1
+
+    def close(self):
+        if self.group and self.subject is not None:
+            self.out.write(' .\n')
+        self.subject = self.predicate = None
+
+
+class RDFXMLWriter(object):
+
+    def __init__(self, out, prefixes=None):
+        self.out = out
+        self.count = 0
+        self.subject = None
+        ## the empty (default) prefix cannot qualify RDF/XML property elements
+        self.prefixes = dict((ns, p) for ns, p in _sorted_prefixes(prefixes) if p and p != 'xml')
+        self.prefixes[str(RDF)] = 'rdf'
+        out.write('<?xml version="1.0" encoding="utf-8"?>\n<rdf:RDF')
+        for ns, p in sorted(self.prefixes.items(), key=lambda x: x[1]):
+            out.write('\n   xmlns:%s="%s"' % (p, _attr(ns)))
+        out.write('\n>\n')
+
+    def _node(self, term):
+        if isinstance(term, BNode):
+            nodeid = term if _xml_name_re.match(term) else 'b' + term
+            return 'rdf:nodeID="%s"' % _attr(nodeid)
+        return 'rdf:about="%s"' % _attr(term)
+
+    def _tag(self, uri):
+        m = _xml_split_re.match(uri)
+        if not m or not m.group(1):
+            raise ValueError('cannot use %s as an RDF/XML property element' % uri)
+        ns, local = m.groups()
+        if ns in self.prefixes:
+            return self.prefixes[ns] + ':' + local, ''
+        ## declared on the element itself, so the header never has to change
+        return 'ns0:' + local, ' xmlns:ns0="%s"' % _attr(ns)
+
+    def add(self, triple):
+        s, p, o = triple
+        if s != self.subject:
+            if self.subject is not None: self.out.write('  </rdf:Description>\n')
+            self.out.write('  <rdf:Description %s>\n' % self._node(s))
+            self.subject = s
+        tag, decl = self._tag(p)
+        if isinstance(o, URIRef):
+            self.out.write('    <%s%s rdf:resource="%s"/>\n' % (tag, decl, _attr(o)))
+        elif isinstance(o, BNode):
+            self.out.write('    <%s%s %s/>\n' % (tag, decl, self._node(o)))
+        else:
+            if o.language:
+                decl += ' xml:lang="%s"' % _attr(o.language)
+            elif o.datatype:
+                decl += ' rdf:datatype="%s"' % _attr(o.datatype)
+            self.out.write('    <%s%s>%s</%s>\n' % (tag, decl, escape(o), tag))
+        self.count += 1
+
+    def close(self):
+        if self.subject is not None: self.out.write('  </rdf:Description>\n')
+        self.subject = None
+        self.out.write('</rdf:RDF>\n')
+
+
+def writer(out, format, prefixes=None):
+    '''Returns the streaming writer for 'xml', 'turtle' or 'nt' on an open file.'''
+    if format == 'xml':
+        return RDFXMLWriter(out, prefixes)
+    if format == 'turtle':
+        return TurtleWriter(out, prefixes)
+    if format == 'nt':
+        return NTriplesWriter(out)
+    raise ValueError('unsupported format %r' % format)
+
+
+class Outputs(object):
+    '''Opens foutname.rdf/.ttl/.nt for the given formats and writes every
+    added triple to all of them in the same pass.'''
+
+    def __init__(self, foutname, formats, prefixes=None):
+        self.files = []
+        self.writers = []
+        self.names = []
+        for f in formats:
+            name = foutname + extensions[f]
+            fh = open(name, mode='w', encoding='utf-8')
+            self.files.append(fh)
+            self.names.append(name)
+            self.writers.append(writer(fh, f, prefixes))
+        self.count = 0
+
+    def add(self, triple):
+        for w in self.writers:
+            w.add(triple)
+        self.count += 1
+
+    def close(self):
+        for w in self.writers:
+            w.close()
+        for fh in self.files:
+            fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def graph_triples(g):
+    '''Yields the triples of an rdflib Graph grouped by subject (URIs before
+    blank nodes), so that the writers can group statements. A
+    triplebuffer.TripleBuffer yields them in the same order itself.'''
+    if isinstance(g, TripleBuffer):
+        for t in g.triples():
+            yield t
+        return
+    for s in sorted(set(g.subjects()), key=lambda n: (isinstance(n, BNode), str(n))):
+        for p, o in sorted(g.predicate_objects(s), key=lambda x: (str(x[0]), str(x[1]))):
+            yield (s, p, o)
+
+def write_graph(g, out):
+    for t in graph_triples(g):
+        out.add(t)
@@ -0,0 +1,67 @@
+'''Append-only buffer for generated triples that are only serialized.
+
+rdflib's default memory store keeps several indexes per triple so that the
+graph can be queried. The generators never query their output; they add
+triples and then write them out once. TripleBuffer takes the place of the
+Graph at the add() call sites and keeps just the triples:
+
+    g = TripleBuffer()
+    g.add((s, p, o))
+    ...
+    with serialize.Outputs('features', ['xml', 'turtle'], prefixes) as out:
+        serialize.write_graph(g, out)
+
+Equal terms are interned, so a term that occurs in many triples (a
+predicate, a class, a namespace URI) is stored once, and each triple is a
+record of three references. Duplicates are kept until the triples are read
+back; triples() drops them and groups by subject, like
+serialize.graph_triples does for a Graph.
+'''
+from rdflib import BNode
+
+
+class _Record(object):
+    __slots__ = ('s', 'p', 'o')
+
+    def __init__(self, s, p, o):
+        self.s = s
+        self.p = p
+        self.o = o
+
+
+class TripleBuffer(object):
+
+    def __init__(self):
+        self.terms = {}         # term -> its interned instance
+        self.records = []
+        self.namespaces = {}    # prefix -> namespace, as bound
+        self._distinct = None   # (number of records, number of distinct triples)
+
+    def bind(self, prefix, namespace):
+        self.namespaces[prefix] = namespace
+
+    def add(self, triple):
+        s, p, o = triple
+        terms = self.terms
+        self.records.append(_Record(terms.setdefault(s, s), terms.setdefault(p, p), terms.setdefault(o, o)))
+
+    def __len__(self):
+        '''Number of distinct triples, like len() of a Graph.'''
+        if self._distinct is None or self._distinct[0] != len(self.records):
+            self._distinct = (len(self.records), len(set((r.s, r.p, r.o) for r in self.records)))
+        return self._distinct[1]
+
+    def triples(self):
+        '''Yields the distinct triples grouped by subject (URIs before blank
+        nodes), sorted like serialize.graph_triples.'''
+        bysubject = {}
+        for r in self.records:
+            bysubject.setdefault(r.s, []).append(r)
+        for s in sorted(bysubject, key=lambda n: (isinstance(n, BNode), str(n))):
+            seen = set()
+            for r in sorted(bysubject[s], key=lambda r: (str(r.p), str(r.o))):
+                if (r.p, r.o) not in seen:
+                    seen.add((r.p, r.o))
+                    yield (s, r.p, r.o)
+
+    __iter__ = triples
@@ -0,0 +1,1026 @@
+'''Converts NERC Vocabulary Server (NVS) collections to GeoLink OWL ontologies.
+
+One converter for all collections, driven by the `configs` table below.
+Each collection is read from <id>-source.rdf (the RDF/XML export of the
+collection from vocab.nerc.ac.uk) and written as Turtle to <id>.owl.
+
+Most collections are taxonomies of types: every member becomes a punned
+class and individual of the collection's member class (e.g.
+glbase:InstrumentType), with a typecasting axiom on the collection's
+property, and SKOS broader/narrower links become rdfs:subClassOf. A
+collection may name an upper collection whose ontology it imports; members
+may then also be subclasses of upper members. Instance collections (C17)
+instead type each member with its broader upper member.
+
+A run converts any number of collections in one process and parses each
+source graph only once, e.g. L05-source.rdf for both L05 and L22:
+
+    python3 nvsowl.py               # all collections
+    python3 nvsowl.py L05 L22
+
+The collections form a DAG through their upper collections (L22 on L05, C17
+on L06, P02 on P03). The command line builds it with a process pool:
+independent collections are converted in parallel, a dependent collection
+gets the member set of its upper collection from the job that converted it,
+and outputs whose inputs (sources, settings and this converter) did not
+change since the last build, as recorded in .nvsbuild.json, are skipped.
+
+    python3 nvsowl.py --jobs 4
+    python3 nvsowl.py --force L22   # rebuild even if up to date
+
+Large ontologies such as C17 can be written as shards of bounded size, each
+a small ontology of its own, and an <id>.owl index ontology that imports
+them, so renderers and the vocabulary server can load each part separately:
+
+    python3 nvsowl.py --shard-size 20000 C17    # C17.owl, C17-1.owl, C17-2.owl, ...
+
+With --incremental, <id>.owl is kept in sync with its source instead: the
+new source is compared with the snapshot of the last sync (<id>.sync.json)
+and only the axioms of added, changed and removed concepts are rewritten.
+What changed is reported in <id>.changes.json.
+
+    python3 nvsowl.py --incremental L22
+
+With --closure, the transitive closure of the hierarchy across all converted
+collections (e.g. every L22 member under its L05 categories and
+glbase:Instrument) is saved as interval labels in nvs-closure.json, for
+constant-time ancestor tests from Python with hierarchyClosure();
+--closure-ttl also materializes it as triples in nvs-closure.ttl:
+
+    python3 nvsowl.py --closure-ttl
+
+--metrics PATH saves the wall and CPU time, peak memory, triples and bytes
+written of the parse, transform and serialize stages of each collection as
+JSON (see geolink/metrics.py).
+
+Parsed sources are cached in .graphcache/ (see geolink/graphcache.py), so
+later runs skip the RDF/XML parsing until a source file changes; --no-cache
+always parses.
+
+Instance collections can be very large (C17 lists every ICES platform), and
+each member only needs its own properties and the upper member set. They are
+therefore read with the SAX reader in nvsstream.py and written with the
+streaming Turtle writer of geolink/serialize.py member by member, so memory
+stays bounded and output starts before the source is fully read. A source
+that lists its members only by reference is converted through rdflib instead.
+'''
+import os
+import sys
+import json
+import hashlib
+import argparse
+import itertools
+import collections
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from rdflib import Graph, OWL, URIRef, RDF, RDFS, Literal, Namespace, BNode
+from rdflib.namespace import SKOS, DC, DCTERMS, XSD
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from geolink import graphcache, serialize
+from geolink.closure import Closure
+from geolink.metrics import Metrics
+from geolink.triplebuffer import TripleBuffer
+import nvsstream
+
+
+rootURIString = "http://schema.geolink.org/1.0/voc/nvs/"
+idschemeOntoNs = Namespace("http://schema.geolink.org/1.0/voc/identifierscheme#")
+glbaseNS = Namespace('http://schema.geolink.org/1.0/base/main#')
+## the identifier scheme is assumed to already be defined in identifierscheme.owl
+idscheme = idschemeOntoNs.sdn
+ontologyCreator = "EarthCube GeoLink project"
+
+Collection = collections.namedtuple('Collection', ['id', 'upper', 'memberclass', 'property',
+                                                   'superclass', 'comment', 'instances'])
+## id           NVS collection id, also the name of the source and output files
+## upper        id of the upper collection whose ontology is imported, or None
+## memberclass  glbase local name of the class the members are instances of
+## property     glbase local name of the property of the typecasting axiom
+## superclass   (collection id or None for glbase, local name) of the default
+##              superclass of members without a broader member
+## comment      rdfs:comment of the ontology
+## instances    True if the members are individuals typed by their broader upper member
+
+configs = collections.OrderedDict((c.id, c) for c in [
+    Collection('L05', None, 'InstrumentType', 'hasInstrumentType', (None, 'Instrument'),
+               "This ontology captures SeaDataNet device categories from the NERC vocabulary server", False),
+    Collection('L22', 'L05', 'InstrumentType', 'hasInstrumentType', (None, 'Instrument'),
+               "This ontology captures SeaDataNet device catalog from the NERC vocabulary server with mapping to SeaDataNet device categories", False),
+    Collection('L06', None, 'PlatformType', 'hasPlatformType', (None, 'Platform'),
+               "This ontology captures SeaVoX platform categories (e.g., vessel, mooring, etc.) as hosted in the NERC vocabulary server", False),
+    Collection('C17', 'L06', None, None, (None, 'Platform'),
+               "This ontology captures ICES platform instances from the NERC vocabulary server", True),
+    Collection('P03', None, 'MeasurementType', 'hasMeasurementType', ('P03', 'SeaDataNetParameter'),
+               "This ontology captures SeaDataNet Agreed Parameter Groups from the NERC vocabulary server", False),
+    Collection('P02', 'P03', 'MeasurementType', 'hasMeasurementType', ('P03', 'SeaDataNetParameter'),
+               "This ontology captures SeaDataNet device catalog from the NERC vocabulary server with mapping to SeaDataNet device categories", False),
+])
+
+
+def ontologyNs(cid):
+    return Namespace(rootURIString + cid + '#')
+
+def sourcePath(datapath, cid):
+    return os.path.join(datapath, cid + "-source.rdf")
+
+
+Concept = collections.namedtuple('Concept', ['label', 'definition', 'date', 'identifier', 'deprecated',
+                                             'broader', 'narrower', 'sameas'])
+## the first value of each single-valued property (None if absent), like Graph.value,
+## and tuples of all broader, narrower and owl:sameAs targets
+
+## predicates the conversion reads; all other source triples are ignored
+indexedPredicates = frozenset([SKOS.prefLabel, SKOS.definition, DCTERMS.date, DCTERMS.identifier,
+                               OWL.deprecated, SKOS.broader, SKOS.narrower, OWL.sameAs,
+                               DCTERMS.title, DCTERMS.creator, OWL.versionInfo])
+
+
+def conceptOf(values):
+    '''The Concept of a member given its properties (predicate -> list of values).'''
+    first = lambda p: values[p][0] if p in values else None
+    return Concept(first(SKOS.prefLabel), first(SKOS.definition), first(DCTERMS.date),
+                   first(DCTERMS.identifier), first(OWL.deprecated),
+                   tuple(values.get(SKOS.broader, ())), tuple(values.get(SKOS.narrower, ())),
+                   tuple(values.get(OWL.sameAs, ())))
+
+
+class CollectionIndex(object):
+    '''Everything the conversion needs from a source, gathered in one pass
+    over its triples: the collection URI with its dates, titles, creator and
+    version,
+    the members in source order (and as a set) and a Concept per member.'''
+
+    def __init__(self, triples):
+        collectionURIs = []
+        memberships = []
+        values = collections.defaultdict(lambda: collections.defaultdict(list))
+        ntriples = 0
+        for s, p, o in triples:
+            ntriples += 1
+            if p in indexedPredicates:
+                values[s][p].append(o)
+            elif p == SKOS.member:
+                memberships.append((s, o))
+            elif p == RDF.type and o == SKOS.Collection:
+                collectionURIs.append(s)
+        self.ntriples = ntriples
+        self.uri = collectionURIs[0] if collectionURIs else None
+        col = values.get(self.uri, {})
+        self.dates = col.get(DCTERMS.date, [])
+        self.titles = col.get(DCTERMS.title, [])
+        self.creator = col.get(DCTERMS.creator, [None])[0]
+        self.version = col.get(OWL.versionInfo, [None])[0]
+        self.members = list(dict.fromkeys(o for s, o in memberships if s == self.uri))
+        self.memberset = frozenset(self.members)
+        self.concepts = dict((m, conceptOf(values.get(m, {}))) for m in self.members)
+
+
+class Sources(object):
+    '''Reads and indexes sources on first use and keeps the indexes for later
+    collections. With cache=True parsed triples are also kept on disk across runs.'''
+
+    def __init__(self, datapath="./", cache=True, metrics=None):
+        self.datapath = datapath
+        self.cache = cache
+        self.indexes = {}
+        self.stats = {}
+        self.metrics = metrics or Metrics('nvsowl')
+
+    def available(self, cid):
+        return cid in self.indexes or os.path.isfile(sourcePath(self.datapath, cid))
+
+    def get(self, cid):
+        if cid not in self.indexes:
+            path = sourcePath(self.datapath, cid)
+            with self.metrics.stage('parse', cid) as st:
+                if self.cache:
+                    triples = graphcache.load_triples(path, stats=self.stats)
+                else:
+                    triples = Graph()
+                    triples.parse(path)
+                idx = CollectionIndex(triples)
+                st.triples_in += idx.ntriples
+            print(path, "has %s statements." % idx.ntriples)
+            self.indexes[cid] = idx
+        return self.indexes[cid]
+
+
+def prefixes(config):
+    return {'': ontologyNs(config.id), 'glbase': glbaseNS, 'owl': OWL, 'dcterms': DCTERMS, 'dc': DC,
+            'skos': SKOS, 'idscheme': idschemeOntoNs, 'rdf': RDF, 'rdfs': RDFS, 'xsd': XSD}
+
+def newOntology(config):
+    owloutput = TripleBuffer()
+    for prefix, ns in prefixes(config).items():
+        owloutput.bind(prefix, ns)
+    return owloutput
+
+def ontologyURI(cid):
+    return URIRef(rootURIString + cid)
+
+def headerTriples(config, uri, dates, titles):
+    ontology = ontologyURI(config.id)
+    yield (ontology, RDF.type, OWL.Ontology)
+    yield (ontology, RDFS.seeAlso, uri)
+    for m in dates:
+        yield (ontology, DCTERMS.date, m)
+    for m in titles:
+        yield (ontology, RDFS.label, m)
+        yield (ontology, DCTERMS.title, m)
+    yield (ontology, DCTERMS.creator, Literal(ontologyCreator, lang='en'))
+    yield (ontology, RDFS.comment, Literal(config.comment, lang='en'))
+    ## importing upper collection ontology
+    if config.upper:
+        yield (ontology, OWL.imports, ontologyURI(config.upper))
+
+def descriptionTriples(concept, member, colcreator):
+    '''Label, definition, date, creator, deprecation status and identifier of
+    a member. The creator is left out if colcreator is None.'''
+    ## add deprecation status if any
+    if concept.deprecated:
+        yield (member, OWL.deprecated, concept.deprecated)
+    yield (member, RDFS.label, concept.label) # add the pref-label as rdfs:label in the ontology
+    yield (member, RDFS.comment, concept.definition) # add skos definition as rdfs:comment in the onto
+    yield (member, DCTERMS.date, concept.date) # add original definition date of the member to onto
+    if colcreator is not None:
+        yield (member, DCTERMS.creator, colcreator)
+    # add identifier
+    bn = BNode()
+    yield (member, glbaseNS.hasIdentifier, bn)
+    yield (bn, glbaseNS.hasIdentifierValue, concept.identifier)
+    yield (bn, glbaseNS.hasIdentifierScheme, idscheme)
+
+def superclassOf(config):
+    supns, supname = config.superclass
+    return (ontologyNs(supns) if supns else glbaseNS)[supname]
+
+def typeHeaderTriples(config):
+    prop = glbaseNS[config.property]
+    ## adding object property glbase:has<Type>, glbase:hasIdentifier,
+    ## glbase:hasIdentifierScheme, glbase:hasIdentifierValue
+    yield (prop, RDF.type, OWL.ObjectProperty)
+    yield (glbaseNS.hasIdentifier, RDF.type, OWL.ObjectProperty)
+    yield (glbaseNS.hasIdentifierScheme, RDF.type, OWL.ObjectProperty)
+    yield (glbaseNS.hasIdentifierValue, RDF.type, OWL.DatatypeProperty)
+    ## adding the default superclass and the member class
+    yield (superclassOf(config), RDF.type, OWL.Class)
+    yield (glbaseNS[config.memberclass], RDF.type, OWL.Class)
+
+def typeTriples(config, idx, member, upperMembers):
+    '''The member becomes a punned class and individual of the member class.'''
+    concept = idx.concepts[member]
+    memberclass = glbaseNS[config.memberclass]
+    prop = glbaseNS[config.property]
+    yield (member, RDF.type, OWL.NamedIndividual)
+    yield (member, RDF.type, OWL.Class)
+    yield (member, RDF.type, memberclass)
+
+    ## add typecasting axiom
+    bn1 = BNode()
+    bn2 = BNode()
+    lst = BNode()
+    yield (bn1, RDF.type, OWL.Restriction)
+    yield (bn1, OWL.onProperty, prop)
+    yield (bn1, OWL.someValuesFrom, bn2)
+    yield (bn2, RDF.type, OWL.Class)
+    yield (bn2, OWL.oneOf, lst)
+    yield (lst, RDF.first, member)
+    yield (lst, RDF.rest, RDF.nil)
+    yield (bn1, RDFS.subClassOf, member)
+
+    for t in descriptionTriples(concept, member, idx.creator):
+        yield t
+
+    ## get equivclass
+    for equivcls in concept.sameas:
+        if equivcls in idx.memberset:
+            yield (member, OWL.equivalentClass, equivcls)
+    ## get subclass
+    for subcls in concept.narrower:
+        if subcls in idx.memberset:
+            yield (subcls, RDFS.subClassOf, member)
+    ## get superclass
+    isSubclassedToDefaultSuperClass = True
+    for supcls in concept.broader:
+        if supcls in idx.memberset:
+            yield (member, RDFS.subClassOf, supcls)
+            isSubclassedToDefaultSuperClass = False
+        elif supcls in upperMembers:
+            yield (supcls, RDF.type, OWL.Class)
+            yield (member, RDFS.subClassOf, supcls)
+            isSubclassedToDefaultSuperClass = False
+
+    if isSubclassedToDefaultSuperClass:
+        yield (member, RDFS.subClassOf, superclassOf(config))
+
+def instanceHeaderTriples(superclass):
+    ## adding object property glbase:hasIdentifier,
+    ## glbase:hasIdentifierScheme, glbase:hasIdentifierValue
+    yield (glbaseNS.hasIdentifier, RDF.type, OWL.ObjectProperty)
+    yield (glbaseNS.hasIdentifierScheme, RDF.type, OWL.ObjectProperty)
+    yield (glbaseNS.hasIdentifierValue, RDF.type, OWL.DatatypeProperty)
+    yield (superclass, RDF.type, OWL.Class)
+
+def instanceTriples(concept, member, upperMembers, superclass, colcreator, declared):
+    '''The member becomes an individual of its broader upper members. Upper
+    members used as types are declared as classes once; `declared` holds
+    those already done.'''
+    yield (member, RDF.type, OWL.NamedIndividual)
+    typeFound = False
+    for membertype in concept.broader:
+        if membertype and membertype in upperMembers:
+            if membertype not in declared:
+                declared.add(membertype)
+                yield (membertype, RDF.type, OWL.Class)
+            yield (member, RDF.type, membertype)
+            typeFound = True
+    if not typeFound:
+        yield (member, RDF.type, superclass)
+    for t in descriptionTriples(concept, member, colcreator):
+        yield t
+
+def members(idx):
+    '''The set of members of an indexed collection; this is all a dependent
+    collection needs of its upper collection.'''
+    return idx.memberset
+
+def declarationTriples(config):
+    if config.instances:
+        return instanceHeaderTriples(superclassOf(config))
+    return typeHeaderTriples(config)
+
+def memberTriples(config, idx, member, upperMembers, declared):
+    if config.instances:
+        return instanceTriples(idx.concepts[member], member, upperMembers, superclassOf(config),
+                               idx.creator, declared)
+    return typeTriples(config, idx, member, upperMembers)
+
+def writeIndexed(out, config, idx, upperMembers):
+    '''Writes the ontology of an indexed collection to an ontology output.'''
+    out.declare(declarationTriples(config))
+    declared = set()
+    for member in idx.members:
+        out.addMember(memberTriples(config, idx, member, upperMembers, declared))
+    out.add(headerTriples(config, idx.uri, idx.dates, idx.titles))
+
+def convert(config, idx, upperMembers=frozenset()):
+    '''Returns the OWL ontology (a TripleBuffer) of a collection given its
+    CollectionIndex and, if it has one, the members of its upper collection.'''
+    out = BufferedOntology(newOntology(config))
+    writeIndexed(out, config, idx, upperMembers)
+    return out.buffer
+
+
+def writeOntology(owloutput, path, outformat='turtle'):
+    with open(path, 'w', newline='\n', encoding='utf-8') as fout:
+        out = serialize.writer(fout, outformat, owloutput.namespaces)
+        serialize.write_graph(owloutput, out)
+        out.close()
+    print('Saved ' + path + " in " + outformat)
+    return out.count
+
+
+####### Ontology outputs #######
+## The conversion writes to an output with three methods: declare() for the
+## property and class declarations, addMember() for the triples of one
+## member, and add() for the ontology header. After close(), the file
+## outputs have the number of triples written in `count` and the files
+## written in `paths`.
+
+class BufferedOntology(object):
+    '''Collects the ontology in a TripleBuffer.'''
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def add(self, triples):
+        for t in triples:
+            self.buffer.add(t)
+
+    declare = addMember = add
+
+
+class OntologyFile(object):
+    '''Streams the ontology as Turtle to one file, which replaces path on close().'''
+
+    def __init__(self, config, path):
+        self.path = path
+        self.tmp = path + '.tmp'
+        self.fout = open(self.tmp, 'w', newline='\n', encoding='utf-8')
+        self.out = serialize.TurtleWriter(self.fout, prefixes(config))
+
+    def add(self, triples):
+        for t in triples:
+            self.out.add(t)
+
+    declare = addMember = add
+
+    def close(self):
+        self.out.close()
+        self.fout.close()
+        os.replace(self.tmp, self.path)
+        self.count = self.out.count
+        self.paths = [self.path]
+        print('Saved ' + self.path + ' in turtle')
+
+    def abort(self):
+        self.fout.close()
+        os.remove(self.tmp)
+
+
+def shardPath(datapath, cid, n):
+    return os.path.join(datapath, '%s-%d.owl' % (cid, n))
+
+def removeShards(datapath, cid, keep=0):
+    '''Removes the shards of an earlier sharded build beyond the first `keep`.'''
+    n = keep + 1
+    while os.path.isfile(shardPath(datapath, cid, n)):
+        os.remove(shardPath(datapath, cid, n))
+        n += 1
+
+class ShardedOntology(object):
+    '''Streams the ontology as Turtle shard ontologies <id>-1.owl, <id>-2.owl,
+    ... of at most `shardsize` triples each (a member is never split, so a
+    single member larger than that gets a shard of its own), and writes
+    <id>.owl as a small index ontology with the header and declarations that
+    owl:imports the shards. Each shard repeats the declarations and refers to
+    the index with dcterms:isPartOf, so it can be loaded on its own. All files
+    replace the previous ones on close().'''
+
+    def __init__(self, config, datapath, shardsize):
+        self.config = config
+        self.datapath = datapath
+        self.shardsize = shardsize
+        self.declarations = []
+        self.header = []
+        self.shards = []        # temporary paths of the shards written so far
+        self.fout = self.out = None
+        self.count = 0
+
+    def declare(self, triples):
+        self.declarations.extend(triples)
+
+    def add(self, triples):
+        self.header.extend(triples)
+
+    def _newShard(self):
+        self._closeShard()
+        n = len(self.shards) + 1
+        shard = ontologyURI('%s-%d' % (self.config.id, n))
+        tmp = shardPath(self.datapath, self.config.id, n) + '.tmp'
+        self.shards.append(tmp)
+        self.fout = open(tmp, 'w', newline='\n', encoding='utf-8')
+        self.out = serialize.TurtleWriter(self.fout, prefixes(self.config))
+        for t in [(shard, RDF.type, OWL.Ontology),
+                  (shard, DCTERMS.isPartOf, ontologyURI(self.config.id)),
+                  (shard, RDFS.label, Literal('%s part %d' % (self.config.id, n), lang='en'))] + self.declarations:
+            self.out.add(t)
+
+    def _closeShard(self):
+        if self.out is not None:
+            self.out.close()
+            self.fout.close()
+            self.count += self.out.count
+            self.fout = self.out = None
+
+    def addMember(self, triples):
+        triples = list(triples)
+        if self.out is None or (self.out.count + len(triples) > self.shardsize
+                                and self.out.count > 3 + len(self.declarations)):
+            self._newShard()
+        for t in triples:
+            self.out.add(t)
+
+    def close(self):
+        self._closeShard()
+        index = os.path.join(self.datapath, self.config.id + '.owl')
+        with open(index + '.tmp', 'w', newline='\n', encoding='utf-8') as fout:
+            out = serialize.TurtleWriter(fout, prefixes(self.config))
+            for t in self.header + self.declarations:
+                out.add(t)
+            for n in range(1, len(self.shards) + 1):
+                out.add((ontologyURI(self.config.id), OWL.imports, ontologyURI('%s-%d' % (self.config.id, n))))
+            out.close()
+        self.count += out.count
+        for tmp in self.shards:
+            os.replace(tmp, tmp[:-len('.tmp')])
+        os.replace(index + '.tmp', index)
+        self.paths = [index] + [tmp[:-len('.tmp')] for tmp in self.shards]
+        removeShards(self.datapath, self.config.id, len(self.shards))
+        print('Saved ' + index + ' in turtle, importing %d shards' % len(self.shards))
+
+    def abort(self):
+        self._closeShard()
+        for tmp in self.shards:
+            os.remove(tmp)
+
+
+def openOntology(config, datapath, shardsize=None):
+    '''The streaming output for a collection: sharded if shardsize is given.'''
+    if shardsize:
+        return ShardedOntology(config, datapath, shardsize)
+    return OntologyFile(config, os.path.join(datapath, config.id + ".owl"))
+
+
+class NotStreamable(Exception):
+    '''The source cannot be converted with the streaming reader.'''
+
+def streamInstances(out, config, sourcepath, upperMembers, metrics=None):
+    '''Converts an instance collection member by member while its source is
+    read with nvsstream. The collection's creator is taken from the part of
+    the collection element read so far; members read before it appears are
+    held back until it is read (or the source ends), so that each member is
+    written whole, creator included, to one shard. Raises NotStreamable if
+    the source lists members by reference only. Returns the member set.
+    Reading the source counts as the parse stage of metrics.'''
+    superclass = superclassOf(config)
+    reader = nvsstream.Reader(sourcepath)
+    metrics = metrics or Metrics()
+    memberlist = []
+    held = []           # (member, concept) read before the collection's creator
+    creator = None
+    declared = set()
+    write = lambda member, concept: out.addMember(
+        instanceTriples(concept, member, upperMembers, superclass, creator, declared))
+    out.declare(instanceHeaderTriples(superclass))
+    parsed = metrics.get('parse', config.id)
+    for member, values in metrics.timed('parse', reader, config.id):
+        parsed.triples_in += sum(len(v) for v in values.values())
+        memberlist.append(member)
+        if creator is None:
+            creators = reader.head[1].get(DCTERMS.creator) if reader.head else None
+            if not creators:
+                held.append((member, conceptOf(values)))
+                continue
+            creator = creators[0]
+            for m, concept in held:
+                write(m, concept)
+            held = []
+        write(member, conceptOf(values))
+    if reader.collection is None or reader.references:
+        raise NotStreamable(sourcepath + ' lists its members by reference')
+    uri, values = reader.collection
+    creator = values.get(DCTERMS.creator, [None])[0]
+    for m, concept in held:
+        write(m, concept)
+    out.add(headerTriples(config, uri, values.get(DCTERMS.date, []), values.get(DCTERMS.title, [])))
+    print(sourcepath, "has %s members." % len(memberlist))
+    return frozenset(memberlist)
+
+def convertCollection(config, sources, upperMembers=None, shardsize=None, incremental=False):
+    '''Converts one collection to <id>.owl next to its source (or to shards
+    and their index, given a shardsize; or synced, if incremental) and
+    returns its member set. upperMembers is read from the upper collection's
+    source if not given. Instance collections are streamed unless already
+    indexed or synced.'''
+    metrics = sources.metrics
+    if upperMembers is None:
+        upperMembers = members(sources.get(config.upper)) if config.upper else frozenset()
+    if incremental:
+        idx = sources.get(config.id)
+        with metrics.stage('transform', config.id) as st:
+            syncCollection(config, idx, upperMembers, sources.datapath)
+            st.wrote(os.path.join(sources.datapath, config.id + ".owl"))
+        removeShards(sources.datapath, config.id)
+        return members(idx)
+    if config.instances and config.id not in sources.indexes:
+        ## streamed: the output is written while converting, so the transform
+        ## stage includes serializing
+        out = openOntology(config, sources.datapath, shardsize)
+        with metrics.stage('transform', config.id) as st:
+            try:
+                memberset = streamInstances(out, config, sourcePath(sources.datapath, config.id), upperMembers, metrics)
+            except BaseException as e:
+                out.abort()
+                if not isinstance(e, NotStreamable):
+                    raise
+                print(str(e) + '; reading it with rdflib instead')
+                memberset = None
+            else:
+                out.close()
+                st.triples_out += out.count
+                st.wrote(*out.paths)
+        if memberset is not None:
+            if not shardsize: removeShards(sources.datapath, config.id)
+            forgetSync(sources.datapath, config.id)
+            return memberset
+    idx = sources.get(config.id)
+    if shardsize:
+        out = ShardedOntology(config, sources.datapath, shardsize)
+        with metrics.stage('transform', config.id) as st:
+            try:
+                writeIndexed(out, config, idx, upperMembers)
+            except BaseException:
+                out.abort()
+                raise
+            out.close()
+            st.triples_out += out.count
+            st.wrote(*out.paths)
+    else:
+        path = os.path.join(sources.datapath, config.id + ".owl")
+        with metrics.stage('transform', config.id) as st:
+            owloutput = convert(config, idx, upperMembers)
+            st.triples_out += len(owloutput)
+        with metrics.stage('serialize', config.id) as st:
+            st.triples_in += len(owloutput)
+            st.triples_out += writeOntology(owloutput, path)
+            st.wrote(path)
+        removeShards(sources.datapath, config.id)
+    forgetSync(sources.datapath, config.id)
+    return members(idx)
+
+
+####### Incremental sync #######
+## A synced <id>.owl is written in sections, each introduced by a "#@ <name>"
+## comment line: "#@ header" for the ontology header and declarations, and
+## "#@ <member URI>" for the self-contained triples of one member. Next to it,
+## <id>.sync.json records for every member the date, deprecation status and
+## a hash of everything its triples are derived from. A later sync compares
+## the new source with that snapshot and only re-derives the sections of
+## added and changed members, copying the others line by line.
+
+sectionmark = '#@ '
+
+def syncPath(datapath, cid):
+    return os.path.join(datapath, cid + '.sync.json')
+
+def changesPath(datapath, cid):
+    return os.path.join(datapath, cid + '.changes.json')
+
+def forgetSync(datapath, cid):
+    '''Removes the sync snapshot of an output that is written in full.'''
+    if os.path.isfile(syncPath(datapath, cid)):
+        os.remove(syncPath(datapath, cid))
+
+def syncKey(config):
+    '''Changes with the collection settings and the converter code; a
+    snapshot with another key is not patched but rewritten.'''
+    return hashlib.sha1((repr(tuple(config)) + '\n' + converterHash()).encode('utf-8')).hexdigest()
+
+def termText(term):
+    return '' if term is None else serialize.nt_term(term)
+
+def isDeprecated(concept):
+    return concept.deprecated is not None and str(concept.deprecated).lower() == 'true'
+
+def memberHash(idx, member, upperMembers):
+    '''Hash of the concept of a member, of whether the concepts it refers to
+    are members of the collection (=) or of the upper collection (^), and of
+    the collection creator: all its triples depend on.'''
+    c = idx.concepts[member]
+    parts = [termText(v) for v in (c.label, c.definition, c.date, c.identifier, c.deprecated, idx.creator)]
+    ## sorted, since the order of multiple values is not kept by the source graph
+    for refs in (c.broader, c.narrower, c.sameas):
+        parts.append(' '.join(sorted(termText(r) + ('=' if r in idx.memberset else '^' if r in upperMembers else '')
+                                     for r in refs)))
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+def writeSection(fout, config, name, triples):
+    fout.write(sectionmark + name + '\n')
+    out = serialize.TurtleWriter(fout, prefixes(config), header=False)
+    for t in triples:
+        out.add(t)
+    out.close()
+    fout.write('\n')
+
+def readSections(path):
+    '''Yields (name, lines) for the sections of a synced ontology; the
+    prefix lines before the first section come with the name None.'''
+    name, lines = None, []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.startswith(sectionmark):
+                yield name, lines
+                name, lines = line[len(sectionmark):].rstrip('\n'), []
+            else:
+                lines.append(line)
+    yield name, lines
+
+def syncCollection(config, idx, upperMembers, datapath):
+    '''Brings <id>.owl up to date with an indexed source, rewriting only the
+    sections of added, changed and removed members if the existing output
+    was synced by the same converter. Saves the snapshot and a report of the
+    changes (<id>.changes.json) and returns the report.'''
+    path = os.path.join(datapath, config.id + '.owl')
+    snapshot = {}
+    if os.path.isfile(syncPath(datapath, config.id)):
+        with open(syncPath(datapath, config.id), encoding='utf-8') as f:
+            snapshot = json.load(f)
+    key = syncKey(config)
+    full = snapshot.get('key') != key or not os.path.isfile(path)
+    old = {} if full else snapshot['members']
+    entries = collections.OrderedDict()
+    for m in idx.members:
+        c = idx.concepts[m]
+        entries[str(m)] = {'hash': memberHash(idx, m, upperMembers), 'date': None if c.date is None else str(c.date),
+                           'deprecated': isDeprecated(c)}
+    added = [m for m in idx.members if str(m) not in old]
+    changed = [m for m in idx.members if str(m) in old and old[str(m)]['hash'] != entries[str(m)]['hash']]
+    removed = sorted(set(old) - set(entries))
+
+    tmp = path + '.tmp'
+    with open(tmp, 'w', newline='\n', encoding='utf-8') as fout:
+        serialize.TurtleWriter(fout, prefixes(config))
+        writeSection(fout, config, 'header', itertools.chain(
+            headerTriples(config, idx.uri, idx.dates, idx.titles), declarationTriples(config)))
+        if not full:
+            keep = set(old) - set(str(m) for m in changed) - set(removed)
+            copied = set()
+            for name, lines in readSections(path):
+                if name in keep:
+                    fout.write(sectionmark + name + '\n')
+                    fout.writelines(lines)
+                    copied.add(name)
+        for m in (idx.members if full else added + changed):
+            writeSection(fout, config, str(m), memberTriples(config, idx, m, upperMembers, set()))
+    if not full and copied != keep:
+        ## the output was not written by a sync (or was edited); start over
+        os.remove(tmp)
+        os.remove(syncPath(datapath, config.id))
+        return syncCollection(config, idx, upperMembers, datapath)
+    os.replace(tmp, path)
+
+    version = None if idx.version is None else str(idx.version)
+    report = collections.OrderedDict([
+        ('collection', config.id),
+        ('version', [snapshot.get('version'), version]),
+        ('rewritten', full),
+        ('added', [str(m) for m in added]),
+        ('changed', [{'uri': str(m), 'date': [old[str(m)]['date'], entries[str(m)]['date']]} for m in changed]),
+        ('deprecated', [str(m) for m in changed if entries[str(m)]['deprecated'] and not old[str(m)]['deprecated']]),
+        ('removed', removed)])
+    for p, obj in ((syncPath(datapath, config.id), {'key': key, 'version': version, 'members': entries}),
+                   (changesPath(datapath, config.id), report)):
+        with open(p + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(obj, f, indent=0)
+        os.replace(p + '.tmp', p)
+    print('Synced %s%s: %d added, %d changed (%d newly deprecated), %d removed, %d unchanged'
+          % (path, ' (rewritten)' if full else '', len(added), len(changed), len(report['deprecated']),
+             len(removed), len(entries) - len(added) - len(changed)))
+    return report
+
+
+def run(ids=None, datapath="./", sources=None, cache=True, shardsize=None, incremental=False, metricspath=None):
+    '''Converts the given collections (all by default) to <id>.owl in
+    datapath, sharded if a shardsize is given, synced if incremental. Collections whose source, or whose upper collection's source,
+    is missing are skipped. Returns the ids converted. Saves the stage
+    metrics of the run to metricspath if given.'''
+    ids = list(ids or configs)
+    sources = sources or Sources(datapath, cache)
+    done = []
+    for cid in ids:
+        config = configs[cid]
+        missing = [c for c in (cid, config.upper) if c and not sources.available(c)]
+        if missing:
+            print('Skipping ' + cid + ': no ' + ', '.join(sourcePath(datapath, c) for c in missing))
+            continue
+        convertCollection(config, sources, shardsize=shardsize, incremental=incremental)
+        done.append(cid)
+    if metricspath:
+        sources.metrics.info['converted'] = done
+        sources.metrics.info['cache'] = sources.stats
+        sources.metrics.save(metricspath)
+    return done
+
+
+####### Subclass closure #######
+## The converted ontologies only assert direct links (an L22 member is a
+## subclass of its L05 member, which is a subclass of glbase:Instrument; a
+## C17 platform is typed with its L06 member). The closure over all
+## collections is kept in nvs-closure.json as interval labels (see
+## geolink/closure.py), so consumers can test "is this a kind of X" without
+## recursive queries, and can be materialized as triples in nvs-closure.ttl.
+
+closurefilename = 'nvs-closure.json'
+closurettlname = 'nvs-closure.ttl'
+
+def ontologyPaths(datapath, cid):
+    '''The files of a converted collection: <id>.owl and its shards, if any.'''
+    paths = [os.path.join(datapath, cid + '.owl')]
+    n = 1
+    while os.path.isfile(shardPath(datapath, cid, n)):
+        paths.append(shardPath(datapath, cid, n))
+        n += 1
+    return paths
+
+def ontologyFormat(path):
+    ''''xml' or 'turtle': the converter writes Turtle, but older ontologies
+    committed as .owl (e.g. P02.owl) are RDF/XML.'''
+    with open(path, 'rb') as f:
+        head = f.read(64).lstrip(b'\xef\xbb\xbf \t\r\n')
+    return 'xml' if head.startswith(b'<?xml') or head.startswith(b'<rdf:RDF') else 'turtle'
+
+def hierarchyEdges(path, individuals):
+    '''Yields the (child, parent) links of a converted ontology between named
+    terms: rdfs:subClassOf, owl:equivalentClass (both ways) and the rdf:type of
+    individuals that are not classes, which are added to `individuals`. The
+    parsed triples are cached like the sources, so only the ontologies that
+    changed since the closure was last built are parsed again.'''
+    triples = graphcache.load_triples(path, format=ontologyFormat(path))
+    classes = set(s for s, p, o in triples if p == RDF.type and o == OWL.Class)
+    for s, p, o in triples:
+        if not isinstance(s, URIRef) or not isinstance(o, URIRef):
+            continue
+        if p == RDFS.subClassOf:
+            yield (s, o)
+        elif p == OWL.equivalentClass:
+            yield (s, o)
+            yield (o, s)
+        elif p == RDF.type and s not in classes and not o.startswith(str(OWL)):
+            individuals.add(str(s))
+            yield (s, o)
+
+def closureInputs(datapath):
+    '''sha1 of the ontology files of every converted collection.'''
+    inputs = collections.OrderedDict()
+    for cid in configs:
+        if os.path.isfile(os.path.join(datapath, cid + '.owl')):
+            for path in ontologyPaths(datapath, cid):
+                inputs[os.path.basename(path)] = graphcache.file_sha1(path)
+    return inputs
+
+def buildClosure(datapath, inputs=None):
+    '''Computes the closure of the hierarchy across all converted collections
+    in datapath. Its info records the input files and the individuals.'''
+    inputs = inputs or closureInputs(datapath)
+    individuals = set()
+    edges = itertools.chain.from_iterable(hierarchyEdges(os.path.join(datapath, f), individuals) for f in inputs)
+    closure = Closure(edges)
+    closure.info = {'inputs': inputs, 'individuals': sorted(individuals)}
+    return closure
+
+def hierarchyClosure(datapath="./", rebuild=False):
+    '''The Closure of all converted collections in datapath, from
+    nvs-closure.json if it is up to date, else computed and saved there.
+
+        closure = hierarchyClosure('voc/nvs')
+        closure.is_ancestor(glbaseNS.Instrument, 'http://vocab.nerc.ac.uk/collection/L22/current/TOOL0022/')
+        set(closure.descendants('http://vocab.nerc.ac.uk/collection/L06/current/31/'))
+    '''
+    path = os.path.join(datapath, closurefilename)
+    inputs = closureInputs(datapath)
+    if not rebuild and os.path.isfile(path):
+        closure = Closure.load(path)
+        if closure.info.get('inputs') == inputs:
+            return closure
+    closure = buildClosure(datapath, inputs)
+    closure.save(path)
+    print('Saved ' + path + ' (%d terms from %d files)' % (len(closure), len(inputs)))
+    return closure
+
+def writeClosure(closure, path):
+    '''Materializes the closure as Turtle: every term gets rdfs:subClassOf (or,
+    for individuals, rdf:type) links to all its ancestors.'''
+    individuals = set(closure.info.get('individuals', ()))
+    with open(path + '.tmp', 'w', newline='\n', encoding='utf-8') as fout:
+        out = serialize.TurtleWriter(fout, {'rdf': RDF, 'rdfs': RDFS, 'glbase': glbaseNS})
+        for d, a in sorted(closure.pairs()):
+            out.add((URIRef(d), RDF.type if d in individuals else RDFS.subClassOf, URIRef(a)))
+        out.close()
+    os.replace(path + '.tmp', path)
+    print('Saved ' + path + ' with %d triples' % out.count)
+    return out.count
+
+
+####### Dependency-aware parallel build #######
+
+stampfilename = '.nvsbuild.json'
+
+def converterHash():
+    here = os.path.dirname(os.path.abspath(__file__))
+    return '+'.join(graphcache.file_sha1(os.path.join(here, f)) for f in ('nvsowl.py', 'nvsstream.py'))
+
+def inputKey(cid, datapath, converter, shardsize=None, incremental=False):
+    '''Hash of everything an output depends on: the collection settings, the
+    converter code, the output layout and the source files of the collection
+    and its upper one.'''
+    config = configs[cid]
+    parts = [repr(tuple(config)), converter, repr(shardsize), repr(incremental)]
+    for c in (cid, config.upper):
+        if c: parts.append(graphcache.file_sha1(sourcePath(datapath, c)))
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+def loadStamps(datapath):
+    path = os.path.join(datapath, stampfilename)
+    if not os.path.isfile(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def saveStamps(stamps, datapath):
+    path = os.path.join(datapath, stampfilename)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(stamps, f, sort_keys=True, indent=0)
+    os.replace(path + '.tmp', path)
+
+def convertJob(cid, datapath, cache, upperMembers, wantMembers, shardsize=None, incremental=False):
+    '''Converts one collection in a worker process. upperMembers is None if
+    the upper collection was not converted in this build; its members are
+    then read from its (cached) source. Returns the collection's own member
+    set if a dependent needs it, and the metrics of its stages.'''
+    sources = Sources(datapath, cache)
+    memberset = convertCollection(configs[cid], sources, upperMembers, shardsize, incremental)
+    return (memberset if wantMembers else None), [st.as_dict() for st in sources.metrics.ordered()]
+
+def build(ids=None, datapath="./", jobs=None, cache=True, force=False, shardsize=None, incremental=False,
+          metricspath=None, closure=False, closurettl=False):
+    '''Converts the given collections (all by default) in dependency order,
+    up to `jobs` at a time, skipping those whose output is up to date.
+    Then updates nvs-closure.json if closure is set, and also writes
+    nvs-closure.ttl if closurettl is set. Returns (ids converted, ids
+    failed). Saves the stage metrics of all jobs to metricspath if given.'''
+    ids = list(ids or configs)
+    metrics = Metrics('nvsowl')
+    stamps = loadStamps(datapath)
+    converter = converterHash()
+    pending = collections.OrderedDict()    # id -> input key, for the outputs to rebuild
+    for cid in ids:
+        config = configs[cid]
+        missing = [c for c in (cid, config.upper) if c and not os.path.isfile(sourcePath(datapath, c))]
+        if missing:
+            print('Skipping ' + cid + ': no ' + ', '.join(sourcePath(datapath, c) for c in missing))
+            continue
+        key = inputKey(cid, datapath, converter, shardsize, incremental)
+        if not force and stamps.get(cid) == key and os.path.isfile(os.path.join(datapath, cid + ".owl")):
+            print(cid + '.owl is up to date')
+            continue
+        pending[cid] = key
+
+    dependents = dict((cid, [d for d in pending if configs[d].upper == cid]) for cid in pending)
+    upperMembers = {}
+    done, failed = [], []
+    with ProcessPoolExecutor(jobs) as pool:
+        running = {}
+        def submit(cid):
+            f = pool.submit(convertJob, cid, datapath, cache,
+                            upperMembers.get(configs[cid].upper), bool(dependents[cid]), shardsize, incremental)
+            running[f] = cid
+        for cid in pending:
+            if configs[cid].upper not in pending:
+                submit(cid)
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for f in finished:
+                cid = running.pop(f)
+                try:
+                    result, stages = f.result()
+                except Exception as e:
+                    print('Failed to convert ' + cid + ': ' + repr(e))
+                    failed.append(cid)
+                    failed.extend(dependents[cid])
+                    continue
+                metrics.merge(stages)
+                if result is not None:
+                    upperMembers[cid] = result
+                stamps[cid] = pending[cid]
+                saveStamps(stamps, datapath)
+                done.append(cid)
+                for d in dependents[cid]:
+                    submit(d)
+    try:
+        if closure or closurettl:
+            with metrics.stage('closure') as st:
+                hierarchy = hierarchyClosure(datapath)
+                st.wrote(os.path.join(datapath, closurefilename))
+                if closurettl:
+                    st.triples_out += writeClosure(hierarchy, os.path.join(datapath, closurettlname))
+                    st.wrote(os.path.join(datapath, closurettlname))
+    finally:
+        ## the conversions are done; keep their metrics even if the closure fails
+        if metricspath:
+            metrics.info['jobs'] = jobs
+            metrics.info['converted'] = done
+            metrics.info['failed'] = failed
+            metrics.info['skipped'] = [cid for cid in ids if cid not in pending]
+            metrics.save(metricspath)
+    return done, failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Converts NVS collections to GeoLink OWL ontologies.')
+    parser.add_argument('ids', nargs='*', metavar='ID', help='collections to convert (default: all of %s)' % ', '.join(configs))
+    parser.add_argument('--datapath', default='./', help='directory of the <id>-source.rdf files and the <id>.owl outputs')
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help='parse the sources even if a cached graph is up to date')
+    parser.add_argument('--jobs', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--force', action='store_true', help='convert even if the output is up to date')
+    parser.add_argument('--shard-size', dest='shardsize', type=int, default=None, metavar='TRIPLES',
+                        help='write each ontology as shards of at most TRIPLES triples and an index ontology importing them')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only rewrite the members that changed since the last incremental run (see <id>.changes.json)')
+    parser.add_argument('--closure', action='store_true',
+                        help='update the hierarchy closure of all converted collections in nvs-closure.json')
+    parser.add_argument('--closure-ttl', dest='closurettl', action='store_true',
+                        help='as --closure, and materialize the closure as triples in nvs-closure.ttl')
+    parser.add_argument('--metrics', dest='metricspath', metavar='PATH',
+                        help='save per-stage timings, memory and sizes of the run as JSON to PATH')
+    args = parser.parse_args()
+    unknown = [c for c in args.ids if c not in configs]
+    if unknown:
+        parser.error('unknown collection(s): ' + ', '.join(unknown))
+    if args.shardsize is not None and args.shardsize < 1:
+        parser.error('--shard-size must be positive')
+    if args.shardsize and args.incremental:
+        parser.error('--incremental cannot be combined with --shard-size')
+    done, failed = build(args.ids, args.datapath, args.jobs, args.cache, args.force, args.shardsize, args.incremental,
+                         args.metricspath, args.closure, args.closurettl)
+    if failed:
+        sys.exit('not converted: ' + ', '.join(failed))
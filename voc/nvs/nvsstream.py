@@ -0,0 +1,157 @@
+'''Streaming reader for NVS collection exports (RDF/XML), built on SAX.
+
+vocab.nerc.ac.uk exports a collection as one skos:Collection element whose
+skos:member properties each contain the full skos:Concept element:
+
+    <skos:Collection rdf:about="http://vocab.nerc.ac.uk/collection/C17/current/">
+        <dc:title>...</dc:title>
+        <skos:member>
+            <skos:Concept rdf:about="http://vocab.nerc.ac.uk/collection/C17/current/06AQ/">
+                <skos:prefLabel xml:lang="en">...</skos:prefLabel>
+                <skos:broader rdf:resource="http://vocab.nerc.ac.uk/collection/L06/current/31/"/>
+                ...
+
+iter_concepts() reads such a file incrementally and yields one (concept URI,
+properties) pair as soon as each member element is closed, so the file is
+never held in memory as a graph. Properties are a dict predicate -> list of
+rdflib terms, in document order.
+
+Only the RDF/XML features NVS exports use are understood: rdf:Description
+and typed node elements with rdf:about or rdf:nodeID, and property elements
+with rdf:resource, rdf:nodeID, a nested node element, or text with
+xml:lang / rdf:datatype. Members that the collection only references with
+skos:member rdf:resource="..." are counted in `reader.references`; a caller
+that needs them must read the file with a full RDF parser instead.
+'''
+import collections
+import xml.sax
+from xml.sax.handler import feature_namespaces
+from rdflib import URIRef, Literal, BNode, RDF
+from rdflib.namespace import SKOS
+
+
+rdfns = str(RDF)
+xmlns = 'http://www.w3.org/XML/1998/namespace'
+
+_Node = collections.namedtuple('_Node', ['subject', 'values', 'lang', 'member'])
+_Property = collections.namedtuple('_Property', ['predicate', 'resource', 'nested', 'lang', 'datatype', 'text', 'parent'])
+
+
+class _Handler(xml.sax.handler.ContentHandler):
+
+    def __init__(self):
+        xml.sax.handler.ContentHandler.__init__(self)
+        self.stack = []
+        self.head = None            # (URI, values) of the top-level node, filled in as it is read
+        self.collection = None      # (URI, values) once the collection element is closed
+        self.concepts = []          # completed members not yet handed out
+        self.references = 0         # skos:member properties of the collection without a nested node
+
+    def _lang(self, attrs):
+        lang = attrs.get((xmlns, 'lang'))
+        if lang is None and self.stack:
+            lang = self.stack[-1].lang
+        return lang
+
+    def startElementNS(self, name, qname, attrs):
+        ns, local = name
+        if name == (rdfns, 'RDF'):
+            return
+        top = self.stack[-1] if self.stack else None
+        if top is None or isinstance(top, _Property):
+            ## node element
+            if (rdfns, 'about') in attrs:
+                subject = URIRef(attrs[(rdfns, 'about')])
+            elif (rdfns, 'nodeID') in attrs:
+                subject = BNode(attrs[(rdfns, 'nodeID')])
+            else:
+                subject = BNode()
+            values = collections.defaultdict(list)
+            if name != (rdfns, 'Description'):
+                values[RDF.type].append(URIRef((ns or '') + local))
+            ## a member is a node in a skos:member property of the top-level node
+            member = top is not None and len(self.stack) == 2 and top.predicate == SKOS.member
+            if top is not None:
+                top.nested.append(subject)
+            else:
+                self.head = (subject, values)
+            self.stack.append(_Node(subject, values, self._lang(attrs), member))
+        else:
+            ## property element of the node on top
+            if (rdfns, 'resource') in attrs:
+                resource = URIRef(attrs[(rdfns, 'resource')])
+            elif (rdfns, 'nodeID') in attrs:
+                resource = BNode(attrs[(rdfns, 'nodeID')])
+            else:
+                resource = None
+            datatype = attrs.get((rdfns, 'datatype'))
+            self.stack.append(_Property(URIRef((ns or '') + local), resource, [], self._lang(attrs),
+                                        URIRef(datatype) if datatype else None, [], top))
+
+    def characters(self, content):
+        if self.stack and isinstance(self.stack[-1], _Property):
+            self.stack[-1].text.append(content)
+
+    def endElementNS(self, name, qname):
+        if name == (rdfns, 'RDF'):
+            return
+        frame = self.stack.pop()
+        if isinstance(frame, _Property):
+            if frame.resource is not None:
+                obj = frame.resource
+            elif frame.nested:
+                obj = frame.nested[0]
+            else:
+                text = ''.join(frame.text)
+                if frame.datatype is not None:
+                    obj = Literal(text, datatype=frame.datatype)
+                else:
+                    obj = Literal(text, lang=frame.lang)
+            frame.parent.values[frame.predicate].append(obj)
+            if frame.predicate == SKOS.member and not self.stack[1:] and not frame.nested:
+                self.references += 1
+        elif frame.member:
+            self.concepts.append((frame.subject, frame.values))
+        elif not self.stack and SKOS.Collection in frame.values.get(RDF.type, ()):
+            self.collection = (frame.subject, frame.values)
+
+
+class Reader(object):
+    '''Iterates over the members of the collection in an NVS RDF/XML export.
+
+    During the iteration, `head` is the (URI, properties) pair of the
+    top-level node with the properties read so far; NVS exports give the
+    collection's own properties before its members. After the iteration,
+    `collection` is the (URI, properties) pair of the skos:Collection (None
+    if there was none at the top level) and `references` the number of
+    members given only by reference.'''
+
+    def __init__(self, path, chunksize=1 << 16):
+        self.path = path
+        self.chunksize = chunksize
+        self.head = None
+        self.collection = None
+        self.references = 0
+
+    def __iter__(self):
+        handler = _Handler()
+        parser = xml.sax.make_parser()
+        parser.setFeature(feature_namespaces, True)
+        parser.setContentHandler(handler)
+        with open(self.path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.chunksize), b''):
+                parser.feed(chunk)
+                self.head = handler.head
+                for concept in handler.concepts:
+                    yield concept
+                del handler.concepts[:]
+        parser.close()
+        for concept in handler.concepts:
+            yield concept
+        self.collection = handler.collection
+        self.references = handler.references
+
+
+def iter_concepts(path):
+    '''Yields (URI, properties) for each member of the collection in path.'''
+    return iter(Reader(path))
@@ -0,0 +1,236 @@
+'''Tests of the incremental sync and of the streamed instance conversion of
+nvsowl.py on small generated collections.
+
+    python3 -m pytest voc/nvs/tests
+'''
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from xml.sax.saxutils import escape
+from rdflib import Graph, URIRef, Literal, RDF, OWL
+from rdflib.compare import isomorphic
+from rdflib.namespace import DCTERMS
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+import nvsowl
+
+nvs = 'http://vocab.nerc.ac.uk/collection/'
+creator = 'SeaDataNet and MarineXML Vocabulary Content Governance Group'
+
+
+def memberURI(cid, n):
+    return '%s%s/current/%s/' % (nvs, cid, n)
+
+def concept(cid, n, label=None, broader=(), narrower=(), deprecated=False, date='2016-01-07 02:00:02.0'):
+    return dict(uri=memberURI(cid, n), n=n, label=label or 'Member %s' % n, broader=broader,
+                narrower=narrower, deprecated=deprecated, date=date)
+
+def writeSource(datapath, cid, concepts, version=1, creatorFirst=True, note=''):
+    '''Writes <cid>-source.rdf like an NVS export of the concepts, with the
+    collection's creator before its members or after them, and a skos:note
+    (which the conversion ignores) on each member if given.'''
+    col = ['        <dc:creator>%s</dc:creator>\n' % creator]
+    lines = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n',
+             '<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"\n'
+             '         xmlns:skos="http://www.w3.org/2004/02/skos/core#"\n'
+             '         xmlns:dc="http://purl.org/dc/terms/"\n'
+             '         xmlns:owl="http://www.w3.org/2002/07/owl#">\n',
+             '    <skos:Collection rdf:about="%s%s/current/">\n' % (nvs, cid),
+             '        <dc:title>Collection %s</dc:title>\n' % cid,
+             '        <dc:date>2016-01-07 02:00:02.0</dc:date>\n',
+             '        <owl:versionInfo>%d</owl:versionInfo>\n' % version]
+    if creatorFirst:
+        lines += col
+    for c in concepts:
+        lines += ['        <skos:member>\n',
+                  '            <skos:Concept rdf:about="%s">\n' % c['uri'],
+                  '                <dc:identifier>SDN:%s::%s</dc:identifier>\n' % (cid, c['n']),
+                  '                <skos:prefLabel xml:lang="en">%s</skos:prefLabel>\n' % escape(c['label']),
+                  '                <skos:definition xml:lang="en">%s</skos:definition>\n' % escape(c['label']),
+                  '                <dc:date>%s</dc:date>\n' % c['date'],
+                  '                <owl:deprecated>%s</owl:deprecated>\n' % str(c['deprecated']).lower()]
+        if note:
+            lines += ['                <skos:note>%s</skos:note>\n' % note]
+        lines += ['                <skos:broader rdf:resource="%s"/>\n' % b for b in c['broader']]
+        lines += ['                <skos:narrower rdf:resource="%s"/>\n' % b for b in c['narrower']]
+        lines += ['            </skos:Concept>\n', '        </skos:member>\n']
+    if not creatorFirst:
+        lines += col
+    lines += ['    </skos:Collection>\n', '</rdf:RDF>\n']
+    with open(nvsowl.sourcePath(datapath, cid), 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+
+def readOntology(*paths):
+    g = Graph()
+    for path in paths:
+        g.parse(path, format='turtle')
+    return g
+
+
+class SyncTest(unittest.TestCase):
+    '''An incremental run must give the same ontology as a full conversion
+    of the same source, whatever was synced before.'''
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.full = tempfile.mkdtemp()
+        self.members = [concept('L05', 'A'), concept('L05', 'B', broader=[memberURI('L05', 'A')]),
+                        concept('L05', 'C', narrower=[memberURI('L05', 'B')]), concept('L05', 'D')]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        shutil.rmtree(self.full)
+
+    def sync(self, members, **kwargs):
+        '''Syncs L05 with a source of the members and checks the output
+        against a full conversion; returns the report of the changes.'''
+        writeSource(self.dir, 'L05', members, **kwargs)
+        writeSource(self.full, 'L05', members, **kwargs)
+        nvsowl.run(['L05'], self.dir, cache=False, incremental=True)
+        nvsowl.run(['L05'], self.full, cache=False)
+        synced = readOntology(os.path.join(self.dir, 'L05.owl'))
+        self.assertTrue(isomorphic(synced, readOntology(os.path.join(self.full, 'L05.owl'))))
+        with open(nvsowl.changesPath(self.dir, 'L05'), encoding='utf-8') as f:
+            return json.load(f)
+
+    def sections(self):
+        return dict(nvsowl.readSections(os.path.join(self.dir, 'L05.owl')))
+
+    def test_first_sync(self):
+        report = self.sync(self.members)
+        self.assertTrue(report['rewritten'])
+        ## in the order of the parsed graph
+        self.assertEqual(sorted(report['added']), [c['uri'] for c in self.members])
+        with open(nvsowl.syncPath(self.dir, 'L05'), encoding='utf-8') as f:
+            snapshot = json.load(f)
+        self.assertEqual(sorted(snapshot['members']), [c['uri'] for c in self.members])
+        self.assertEqual(snapshot['version'], '1')
+
+    def test_unchanged(self):
+        self.sync(self.members)
+        before = self.sections()
+        report = self.sync(self.members)
+        self.assertFalse(report['rewritten'])
+        self.assertEqual((report['added'], report['changed'], report['removed']), ([], [], []))
+        self.assertEqual(self.sections(), before)
+
+    def test_edit_add_remove(self):
+        self.sync(self.members)
+        before = self.sections()
+        a, b, c, d = self.members
+        b = concept('L05', 'B', label='Member B & more', broader=[memberURI('L05', 'A')], date='2016-02-01 00:00:00.0')
+        e = concept('L05', 'E', broader=[memberURI('L05', 'D')])
+        report = self.sync([a, b, d, e], version=2)
+        self.assertFalse(report['rewritten'])
+        self.assertEqual(report['version'], ['1', '2'])
+        self.assertEqual(report['added'], [e['uri']])
+        self.assertEqual(report['changed'], [{'uri': b['uri'], 'date': ['2016-01-07 02:00:02.0', '2016-02-01 00:00:00.0']}])
+        self.assertEqual(report['removed'], [c['uri']])
+        ## only the sections of the edited and added members were written again
+        after = self.sections()
+        self.assertEqual(after[a['uri']], before[a['uri']])
+        self.assertEqual(after[d['uri']], before[d['uri']])
+        self.assertNotIn(c['uri'], after)
+
+    def test_removed_narrower(self):
+        ## B is a subclass of C through C's skos:narrower; without C it falls back to its broader A
+        self.sync(self.members)
+        a, b, c, d = self.members
+        report = self.sync([a, b, d])
+        self.assertEqual(report['removed'], [c['uri']])
+
+    def test_deprecated(self):
+        self.sync(self.members)
+        a, b, c, d = self.members
+        report = self.sync([concept('L05', 'A', deprecated=True), b, c, d])
+        self.assertEqual(report['deprecated'], [a['uri']])
+        self.assertEqual([m['uri'] for m in report['changed']], [a['uri']])
+
+    def test_creator_changed(self):
+        ## the creator is part of every member, so all are changed
+        self.sync(self.members)
+        global creator
+        saved, creator = creator, 'ICES'
+        try:
+            report = self.sync(self.members)
+        finally:
+            creator = saved
+        self.assertEqual(len(report['changed']), len(self.members))
+
+    def test_edited_output(self):
+        ## a member section missing from the output makes the sync start over
+        self.sync(self.members)
+        path = os.path.join(self.dir, 'L05.owl')
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text.replace(nvsowl.sectionmark + self.members[0]['uri'] + '\n', '# edited\n'))
+        report = self.sync(self.members + [concept('L05', 'E')])
+        self.assertTrue(report['rewritten'])
+
+    def test_full_run_forgets_sync(self):
+        self.sync(self.members)
+        nvsowl.run(['L05'], self.dir, cache=False)
+        self.assertFalse(os.path.isfile(nvsowl.syncPath(self.dir, 'L05')))
+        report = self.sync(self.members)
+        self.assertTrue(report['rewritten'])
+
+
+class StreamTest(unittest.TestCase):
+    '''The streamed conversion of an instance collection must give the same
+    ontology as the conversion of its index. Long notes make the source
+    span several chunks of the streaming reader, so that members are read
+    before a creator given after them.'''
+
+    note = 'x' * 10000
+
+    upper = frozenset(URIRef(memberURI('L06', n)) for n in ('31', '32'))
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.members = [concept('C17', '%02d' % i, broader=[memberURI('L06', '31' if i % 2 else '32')])
+                        for i in range(12)]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def convert(self, streamed, shardsize=None):
+        sources = nvsowl.Sources(self.dir, cache=False)
+        if not streamed:
+            sources.get('C17')
+        nvsowl.convertCollection(nvsowl.configs['C17'], sources, self.upper, shardsize)
+        paths = nvsowl.ontologyPaths(self.dir, 'C17')
+        return [readOntology(p) for p in paths]
+
+    def check(self, shardsize=None):
+        streamed = self.convert(True, shardsize)
+        indexed = self.convert(False, shardsize)
+        self.assertTrue(isomorphic(sum(streamed, Graph()), sum(indexed, Graph())))
+        ## every member is written whole to one file, creator included
+        for c in self.members:
+            member = URIRef(c['uri'])
+            files = [g for g in streamed if (member, RDF.type, OWL.NamedIndividual) in g]
+            self.assertEqual(len(files), 1)
+            self.assertIn((member, DCTERMS.creator, Literal(creator)), files[0])
+        return streamed
+
+    def test_creator_first(self):
+        writeSource(self.dir, 'C17', self.members, note=self.note)
+        self.check()
+
+    def test_creator_last(self):
+        writeSource(self.dir, 'C17', self.members, creatorFirst=False, note=self.note)
+        self.check()
+
+    def test_creator_last_sharded(self):
+        writeSource(self.dir, 'C17', self.members, creatorFirst=False, note=self.note)
+        shards = self.check(shardsize=40)
+        self.assertGreater(len(shards), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
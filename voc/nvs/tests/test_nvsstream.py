@@ -0,0 +1,112 @@
+'''Tests of the streaming reader of NVS collection exports (nvsstream.py)
+on C17-sample.rdf, a small collection with nested members, a member given
+by reference, rdf:nodeID, xml:lang and rdf:datatype.
+
+    python3 -m pytest voc/nvs/tests
+'''
+import os
+import sys
+import tempfile
+import unittest
+from rdflib import Graph, URIRef, Literal, BNode, RDF, OWL, XSD
+from rdflib.namespace import SKOS, DCTERMS
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+import nvsstream
+
+sample = os.path.join(here, 'C17-sample.rdf')
+c17 = 'http://vocab.nerc.ac.uk/collection/C17/current/'
+platform = URIRef('http://vocab.nerc.ac.uk/collection/L06/current/31/')
+
+expected = [
+    (URIRef(c17 + '06AQ/'), {
+        RDF.type: [SKOS.Concept],
+        DCTERMS.identifier: [Literal('SDN:C17::06AQ')],
+        SKOS.prefLabel: [Literal('Polarstern', lang='en')],
+        SKOS.altLabel: [Literal('Polarstern', lang='de')],
+        SKOS.definition: [Literal('Research vessel & icebreaker')],
+        DCTERMS.date: [Literal('2015-03-02 10:04:55.0')],
+        OWL.deprecated: [Literal('false', datatype=XSD.boolean)],
+        SKOS.broader: [platform],
+        OWL.sameAs: [BNode('ship1')]}),
+    ## xml:lang is inherited from the node element; a nested node that is
+    ## not a member is only referred to
+    (URIRef(c17 + '06AR/'), {
+        RDF.type: [SKOS.Concept],
+        SKOS.prefLabel: [Literal('Walther Herwig III', lang='en')],
+        SKOS.broader: [platform],
+        SKOS.related: [BNode('old')]}),
+    (BNode('unnamed'), {
+        RDF.type: [SKOS.Concept],
+        SKOS.prefLabel: [Literal('Unnamed ship', lang='en')]}),
+]
+
+
+class ReaderTest(unittest.TestCase):
+
+    def read(self, **kwargs):
+        reader = nvsstream.Reader(sample, **kwargs)
+        concepts = [(uri, dict(values)) for uri, values in reader]
+        return reader, concepts
+
+    def test_members(self):
+        reader, concepts = self.read()
+        self.assertEqual(concepts, expected)
+
+    def test_collection(self):
+        reader, concepts = self.read()
+        uri, values = reader.collection
+        self.assertEqual(uri, URIRef(c17))
+        self.assertEqual(values[RDF.type], [SKOS.Collection])
+        self.assertEqual(values[DCTERMS.title], [Literal('ICES Platform Codes')])
+        self.assertEqual(values[DCTERMS.creator], [Literal('International Council for the Exploration of the Sea')])
+        self.assertEqual(values[OWL.versionInfo], [Literal('12', datatype=XSD.integer)])
+        self.assertEqual(values[SKOS.member], [URIRef(c17 + '06AQ/'), URIRef(c17 + '06AR/'),
+                                               URIRef(c17 + '06AS/'), BNode('unnamed')])
+        self.assertEqual(reader.references, 1)
+
+    def test_head(self):
+        ## the collection's properties before the members are known when the first member is yielded
+        reader = nvsstream.Reader(sample, chunksize=64)
+        self.assertIsNone(reader.head)
+        uri, values = next(iter(reader))
+        self.assertEqual(reader.head[0], URIRef(c17))
+        self.assertEqual(reader.head[1][DCTERMS.title], [Literal('ICES Platform Codes')])
+        self.assertIsNone(reader.collection)
+
+    def test_chunksize(self):
+        for chunksize in (1, 7, 64):
+            reader, concepts = self.read(chunksize=chunksize)
+            self.assertEqual(concepts, expected)
+            self.assertEqual(reader.collection[0], URIRef(c17))
+            self.assertEqual(reader.references, 1)
+
+    def test_same_as_rdflib(self):
+        ## the properties of members with a URI are the triples a full parse gives them
+        g = Graph()
+        g.parse(sample, format='xml')
+        for uri, values in nvsstream.iter_concepts(sample):
+            if isinstance(uri, BNode): continue
+            streamed = set((p, o) for p, objects in values.items() for o in objects if not isinstance(o, BNode))
+            parsed = set((p, o) for p, o in g.predicate_objects(uri) if not isinstance(o, BNode))
+            self.assertEqual(streamed, parsed)
+
+    def test_no_collection(self):
+        ## a file without a top-level skos:Collection yields no members
+        fd, path = tempfile.mkstemp(suffix='.rdf')
+        with os.fdopen(fd, 'w') as f:
+            f.write('<rdf:RDF xmlns:rdf="%s" xmlns:skos="%s">'
+                    '<skos:Concept rdf:about="%s06AQ/"><skos:prefLabel>Polarstern</skos:prefLabel></skos:Concept>'
+                    '</rdf:RDF>' % (str(RDF), str(SKOS), c17))
+        try:
+            reader = nvsstream.Reader(path)
+            self.assertEqual(list(reader), [])
+            self.assertIsNone(reader.collection)
+            self.assertEqual(reader.head[0], URIRef(c17 + '06AQ/'))
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    unittest.main()